@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import itertools
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+# Logging for the API. Request threads only put records on a queue; a
+# listener thread formats them and writes to stderr, so a slow disk or a
+# busy log file never blocks a request.
+# Messages use %-style arguments, which are only formatted for records that
+# pass the level check. Per-row messages go through a Sampler, which logs
+# one call in LOG_SAMPLE_<LEVEL> and skips the rest before a record exists.
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# "text" for people, "json" for log shippers (one object per line)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+# Records waiting for the writer thread; beyond this they are dropped and counted
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+ROOT_LOGGER = "suit"
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def sample_every(level):
+    """N of "log one in N" for sampled messages at ``level`` (LOG_SAMPLE_DEBUG etc.)"""
+    name = logging.getLevelName(level)
+    default = "100" if level <= logging.DEBUG else "1"
+    return max(1, int(os.getenv(f'LOG_SAMPLE_{name}', default)))
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with ``extra`` fields as keys"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _AsyncHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the writer falls behind"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class Sampler:
+    """Logs one call in ``every`` at ``level``, for messages emitted once per row.
+
+    Calls made while ``level`` is disabled cost one cached level check.
+    """
+
+    def __init__(self, logger, level=logging.DEBUG, every=None):
+        self.logger = logger
+        self.level = level
+        self.every = every or sample_every(level)
+        self._calls = itertools.count()
+
+    def __call__(self, msg, *args, exc_info=False):
+        if self.logger.isEnabledFor(self.level) and next(self._calls) % self.every == 0:
+            self.logger.log(self.level, msg, *args, exc_info=exc_info, extra={"sample_every": self.every},
+                            stacklevel=2)
+
+
+_handler = None
+_listener = None
+_lock = threading.Lock()
+
+
+def _formatter():
+    if LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
+
+def _start():
+    global _handler, _listener
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(_formatter())
+    _listener = QueueListener(log_queue, stream, respect_handler_level=False)
+    _listener.start()
+    handler = _AsyncHandler(log_queue)
+    root = logging.getLogger(ROOT_LOGGER)
+    if _handler is not None:
+        root.removeHandler(_handler)
+    root.addHandler(handler)
+    _handler = handler
+
+
+def _restart_in_child():
+    # The writer thread does not survive fork; each worker gets its own
+    global _listener
+    _listener = None
+    _start()
+
+
+def configure():
+    """Route the ``suit`` loggers through the background writer; safe to call more than once"""
+    with _lock:
+        if _handler is not None:
+            return
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+        _start()
+        atexit.register(shutdown)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def get_logger(name):
+    """Logger under the ``suit`` hierarchy, configured on first use"""
+    configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def shutdown():
+    """Write out queued records and stop the writer thread"""
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception:
+            pass
+    if _handler is not None and _handler.dropped:
+        print(f"{_handler.dropped} log records were dropped because the log queue was full", file=sys.stderr)
@@ -0,0 +1,4 @@
+"""Benchmarks for the shirt order backend.
+
+Run them from the backend directory, e.g. ``python -m benchmarks.compression``.
+"""
@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import platform
+import tempfile
+import statistics
+import subprocess
+
+import httpx
+
+from benchmarks.generator import generate_order
+
+# Load test for the order API: get_shirt_orders, create_shirt_order and
+# bulk_update_shirt_orders at a fixed concurrency, in process against the
+# SQLite stand-in (benchmarks/standin.py) or over HTTP against a running
+# server (--url). Results are saved as JSON so commits can be compared:
+#
+#   python -m benchmarks.api --rows 100000 --concurrency 8 --output results/HEAD.json
+#   python -m benchmarks.api --rows 100000 --compare results/base.json
+
+SIZES = {"1k": 1000, "100k": 100000, "1m": 1000000}
+SCENARIOS = ("page", "list", "create", "bulk_update")
+DEFAULT_SCENARIOS = ("page", "create", "bulk_update")
+PAGE_SIZE = 100
+
+
+def _rows(value):
+    return SIZES.get(value.lower()) or int(value)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _percentile(sorted_ms, p):
+    if not sorted_ms:
+        return None
+    index = min(len(sorted_ms) - 1, max(0, round(p / 100 * len(sorted_ms)) - 1))
+    return round(sorted_ms[index], 2)
+
+
+def summarize(latencies_ms, errors, elapsed):
+    """Throughput and latency percentiles of one scenario run"""
+    ordered = sorted(latencies_ms)
+    return {
+        "requests": len(ordered) + errors,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(ordered), 2) if ordered else None,
+        "p50_ms": _percentile(ordered, 50),
+        "p95_ms": _percentile(ordered, 95),
+        "p99_ms": _percentile(ordered, 99),
+        "max_ms": round(ordered[-1], 2) if ordered else None,
+    }
+
+
+def _json_order(order):
+    """A generated order as the grid would post it"""
+    return {
+        key: (value.isoformat() if isinstance(value, datetime.date)
+              else float(value) if hasattr(value, "as_tuple") else value)
+        for key, value in order.items()
+    }
+
+
+class Workload:
+    """Builds the requests of each scenario from a seeded random stream"""
+
+    def __init__(self, rows, seed):
+        self.rows = rows
+        self.rng = random.Random(seed)
+        self.today = datetime.date.today()
+
+    def request(self, scenario):
+        if scenario == "page":
+            # A page starting at a random position, as a scrolled grid asks for
+            start = self.rng.randrange(max(1, self.rows - PAGE_SIZE))
+            params = {"limit": PAGE_SIZE}
+            if start:
+                from main import encode_cursor
+                params["cursor"] = encode_cursor("id", start, start)
+            return "GET", "/api/shirt-orders", {"params": params}
+        if scenario == "list":
+            return "GET", "/api/shirt-orders", {}
+        if scenario == "create":
+            return "POST", "/api/shirt-orders", {"json": _json_order(generate_order(self.rng, self.today))}
+        if scenario == "bulk_update":
+            # A typical grid save: a few edited rows, one new row, one delete
+            ids = self.rng.sample(range(1, self.rows + 1), 6)
+            edited = [{"id": order_id, "定制金额": round(self.rng.uniform(199, 999), 2),
+                       "接待人员": self.rng.choice(("王顾问", "李顾问"))} for order_id in ids[:5]]
+            return "POST", "/api/shirt-orders/bulk-update", {"json": {
+                "editedOrders": edited,
+                "newOrders": [_json_order(generate_order(self.rng, self.today))],
+                "deletedOrders": [ids[5]],
+            }}
+        raise ValueError(f"unknown scenario: {scenario}")
+
+
+async def run_scenario(client, workload, scenario, concurrency, requests, warmup):
+    """Send ``requests`` requests from ``concurrency`` workers; returns the summary"""
+    latencies = []
+    errors = 0
+    remaining = requests + warmup
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            measured = remaining < requests
+            method, path, kwargs = workload.request(scenario)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                body = response.json()
+                ok = response.status_code == 200 and body.get("success", True)
+            except (httpx.HTTPError, ValueError):
+                ok = False
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if not measured:
+                continue
+            if ok:
+                latencies.append(elapsed_ms)
+            else:
+                errors += 1
+
+    # Warm-up requests are not timed; the clock starts with the first measured one
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def _standin_client(args):
+    """In-process client for main.app on the SQLite backend, over a copy of a stand-in database"""
+    # storage and main read their configuration at import. Writes during a
+    # run change the data, so every run works on a fresh copy
+    work_path = os.path.join(tempfile.mkdtemp(prefix="suit_bench_"), "orders.db")
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = work_path
+    os.environ.setdefault("ORDER_CACHE_DIR", os.path.dirname(work_path))
+    from benchmarks import standin
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    path = os.path.join(args.data_dir, f"orders_{args.rows}_{args.seed}.sqlite3")
+    if args.rebuild or not os.path.exists(path):
+        print(f"Generating {args.rows} orders into {path}", file=sys.stderr)
+        seconds = standin.build_database(path, args.rows, args.seed)
+        print(f"Loaded in {seconds:.1f} s", file=sys.stderr)
+    with open(path, "rb") as src, open(work_path, "wb") as dst:
+        dst.write(src.read())
+
+    import main
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://standin",
+                             timeout=300)
+
+
+async def run(args):
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=300)
+    else:
+        client = _standin_client(args)
+    workload = Workload(args.rows, args.seed)
+    results = {}
+    async with client:
+        for scenario in args.scenarios:
+            print(f"{scenario}: {args.requests} requests, concurrency {args.concurrency}", file=sys.stderr)
+            results[scenario] = await run_scenario(client, workload, scenario, args.concurrency,
+                                                   args.requests, args.warmup)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "target": args.url or "standin",
+            "rows": args.rows,
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "scenarios": results,
+    }
+
+
+def compare(report, baseline):
+    """Print per-scenario changes against an earlier report"""
+    print(f"\nvs {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')})")
+    for scenario, result in report["scenarios"].items():
+        before = baseline["scenarios"].get(scenario)
+        if not before:
+            continue
+        changes = []
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            if before.get(key) and result.get(key) is not None:
+                changes.append(f"{key} {(result[key] - before[key]) / before[key] * 100:+.1f}%")
+        print(f"  {scenario:<12} {', '.join(changes)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput and latency of the order API")
+    parser.add_argument("--rows", type=_rows, default=1000, help="orders in the stand-in: 1k, 100k, 1m or a number")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per scenario")
+    parser.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS),
+                        help=f"comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process stand-in")
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(__file__), "data"),
+                        help="where generated stand-in databases are cached")
+    parser.add_argument("--rebuild", action="store_true", help="regenerate the stand-in database")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    report = asyncio.run(run(args))
+    print(f"{'scenario':<12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for scenario, r in report["scenarios"].items():
+        print(f"{scenario:<12} {r['throughput_rps']:>8} {r['p50_ms']!s:>8} {r['p95_ms']!s:>8} "
+              f"{r['p99_ms']!s:>8} {r['errors']:>7}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
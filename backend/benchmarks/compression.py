@@ -0,0 +1,110 @@
+import sys
+import json
+import time
+import zlib
+import argparse
+import statistics
+
+from fastapi.encoders import jsonable_encoder
+
+import columnar
+import compression
+from benchmarks.generator import generate_orders
+from statements import ORDER_COLUMNS
+
+# CPU cost versus bytes saved for each available encoding and level, on the
+# same order-list payloads the API sends (JSON and columnar).
+
+LEVELS = {
+    "gzip": (1, 6, 9),
+    "br": (1, 4, 6, 11),
+    "zstd": (1, 3, 9, 19),
+}
+
+
+def _decompressor(encoding):
+    if encoding == "gzip":
+        return lambda data: zlib.decompress(data, 31)
+    if encoding == "br":
+        return compression.brotli.decompress
+    return lambda data: compression.zstandard.ZstdDecompressor().decompress(data, max_output_size=1 << 30)
+
+
+def _compressor(encoding, level):
+    if encoding == "gzip":
+        return compression.GzipCompressor(level)
+    if encoding == "br":
+        return compression.BrotliCompressor(level)
+    return compression.ZstdCompressor(level)
+
+
+def _median_ms(func, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def payloads(rows, seed=42):
+    """Encoded order-list bodies as the API would send them"""
+    orders = generate_orders(rows, seed)
+    as_json = json.dumps({"success": True, "orders": jsonable_encoder(orders), "count": len(orders)},
+                         ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    packed = columnar.encode_columnar(ORDER_COLUMNS, [[order[col] for col in ORDER_COLUMNS] for order in orders])
+    as_columnar = json.dumps({"success": True, "columnar": packed, "count": len(orders)},
+                             ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return {"json": as_json, "columnar": as_columnar}
+
+
+def run(rows=2000, runs=5):
+    results = []
+    for name, body in payloads(rows).items():
+        for encoding in compression.ENCODINGS:
+            decompress = _decompressor(encoding)
+            for level in LEVELS[encoding]:
+                def compress():
+                    compressor = _compressor(encoding, level)
+                    return compressor.compress(body) + compressor.finish()
+                compress_ms, data = _median_ms(compress, runs)
+                decompress_ms, restored = _median_ms(lambda: decompress(data), runs)
+                assert restored == body
+                results.append({
+                    "payload": name,
+                    "encoding": encoding,
+                    "level": level,
+                    "raw_bytes": len(body),
+                    "compressed_bytes": len(data),
+                    "ratio": round(len(body) / len(data), 2),
+                    "compress_ms": round(compress_ms, 2),
+                    "decompress_ms": round(decompress_ms, 2),
+                    "compress_mb_per_s": round(len(body) / 1e6 / (compress_ms / 1000), 1),
+                })
+    return {"rows": rows, "runs": runs, "results": results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compression CPU cost vs bytes saved on order payloads")
+    parser.add_argument("--rows", type=int, default=2000, help="orders per payload")
+    parser.add_argument("--runs", type=int, default=5, help="repetitions per measurement (median reported)")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    report = run(args.rows, args.runs)
+    missing = [name for name in ("br", "zstd") if name not in compression.ENCODINGS]
+    if missing:
+        print(f"Not installed, skipped: {', '.join(missing)}", file=sys.stderr)
+    print(f"{'payload':<9} {'encoding':<5} {'level':>5} {'raw KB':>9} {'out KB':>8} {'ratio':>6} "
+          f"{'comp ms':>8} {'decomp ms':>9} {'MB/s':>7}")
+    for r in report["results"]:
+        print(f"{r['payload']:<9} {r['encoding']:<5} {r['level']:>5} {r['raw_bytes'] / 1024:>9.1f} "
+              f"{r['compressed_bytes'] / 1024:>8.1f} {r['ratio']:>6} {r['compress_ms']:>8} "
+              f"{r['decompress_ms']:>9} {r['compress_mb_per_s']:>7}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import random
+import decimal
+import datetime
+
+from schema import TABLE_COLUMNS
+
+# Synthetic but realistic shirt orders: Chinese names, mobile numbers, body
+# measurements drawn around typical values, and the garment sections a
+# customer did not order left empty.
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘蒋蔡余杜叶程苏魏吕丁任沈姚卢"
+GIVEN_CHARS = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀英华慧建志平刚桂兰霞鹏辉玲宇浩凯文博俊峰斌晨"
+STAFF = ["王顾问", "李顾问", "张顾问", "陈顾问", "刘顾问", "赵店长"]
+SOURCES = ["门店", "朋友推荐", "小红书", "大众点评", "老客户", "抖音", "婚庆合作"]
+
+# Garment sections: share of orders that include them
+SECTIONS = {"西装": 0.85, "西裤": 0.75, "马甲": 0.3, "衬衫": 0.55}
+
+# (mean, standard deviation) in cm, matched on the measurement name
+MEASUREMENTS = [
+    ("领围", 40, 2), ("肩宽", 46, 2.5), ("袖长", 61, 2.5), ("袖肥", 38, 3), ("袖口", 26, 1.5),
+    ("胸围", 102, 8), ("中腰", 92, 9), ("肚围", 92, 9), ("臀围", 102, 7), ("下摆", 98, 7),
+    ("前衣长", 74, 3), ("后衣长", 72, 3), ("前腰节", 42, 2), ("后腰节", 41, 2), ("肩斜", 4.5, 1),
+    ("背胸差", 2, 1), ("前胸宽", 38, 2), ("后背宽", 40, 2), ("袖笼差", 2, 1), ("袖笼深", 24, 2),
+    ("袖笼围", 46, 3), ("裤腰围", 84, 8), ("大腿圈", 60, 5), ("膝围", 44, 3), ("小腿圈", 38, 3),
+    ("小腿高", 34, 2), ("裤长", 102, 4), ("遮档", 28, 2), ("腰高", 4, 0.5), ("领型", 3, 1),
+]
+
+CHOICES = {
+    "定制工艺": ["全定制", "半定制", "MTM"],
+    "工艺": ["全毛衬", "半毛衬", "粘合衬"],
+    "西裤裤前褶": ["无褶", "单褶", "双褶"],
+    "西裤皮带袢": ["有", "无"],
+    "西裤卷边": ["卷边", "不卷边"],
+    "西裤调山袢": ["有", "无"],
+    "西装面料": ["VBC羊毛", "Loro Piana", "Zegna", "国产精纺", "Holland"],
+    "马甲排数": ["单排", "双排"],
+    "马甲口袋": ["两袋", "三袋", "无"],
+    "马甲背面": ["同面料", "里布"],
+    "马甲领子": ["无领", "青果领", "平驳领"],
+    "马甲侧面开叉": ["开叉", "不开叉"],
+    "衬衫面料": ["纯棉", "Thomas Mason", "Alumo", "免烫棉"],
+    "款式备注": [None, None, None, "加宽袖口", "插花眼", "手工锁眼", "双开衩"],
+    "体型备注": [None, None, "溜肩", "驼背", "挺胸", "啤酒肚", "高低肩"],
+    "里布": ["铜氨丝", "涤纶", "真丝"],
+    "客户来源": SOURCES,
+    "接待人员": STAFF,
+    "定制顾问": STAFF,
+}
+
+_TWO_PLACES = decimal.Decimal("0.01")
+
+
+def _section(column):
+    for section in SECTIONS:
+        if column.startswith(section):
+            return section
+    return None
+
+
+def _measurement(rng, column):
+    for key, mean, sd in MEASUREMENTS:
+        if key in column:
+            return decimal.Decimal(str(max(0.5, rng.gauss(mean, sd)))).quantize(_TWO_PLACES)
+    return decimal.Decimal(str(rng.uniform(10, 90))).quantize(_TWO_PLACES)
+
+
+def chinese_name(rng):
+    given = rng.choice(GIVEN_CHARS) + (rng.choice(GIVEN_CHARS) if rng.random() < 0.7 else "")
+    return rng.choice(SURNAMES) + given
+
+
+def mobile_number(rng):
+    return f"1{rng.choice('3456789')}{rng.randrange(10 ** 9):09d}"
+
+
+def generate_order(rng, today=None):
+    """One order dict keyed by TABLE_COLUMNS (without ``id``)"""
+    today = today or datetime.date.today()
+    ordered = today - datetime.timedelta(days=rng.randrange(730))
+    due = ordered + datetime.timedelta(days=rng.randrange(20, 46))
+    delivered = due + datetime.timedelta(days=rng.randrange(-5, 6)) if due < today else None
+    sections = {section for section, share in SECTIONS.items() if rng.random() < share}
+    order = {}
+    for column, type_def in TABLE_COLUMNS.items():
+        if column == "id":
+            continue
+        section = _section(column)
+        if section is not None and section not in sections:
+            order[column] = None
+        elif column in CHOICES:
+            order[column] = rng.choice(CHOICES[column])
+        elif type_def.startswith("INT"):
+            order[column] = rng.randrange(1, 5) if column == "马甲扣数" else rng.choice((1, 1, 1, 2))
+        elif type_def.startswith("DECIMAL"):
+            order[column] = _measurement(rng, column)
+        else:
+            order[column] = None
+    order.update({
+        "姓名": chinese_name(rng),
+        "电话": mobile_number(rng),
+        "身高": decimal.Decimal(str(rng.gauss(172, 7))).quantize(_TWO_PLACES),
+        "体重_KG": decimal.Decimal(str(rng.gauss(70, 10))).quantize(_TWO_PLACES),
+        "使用时间": due + datetime.timedelta(days=rng.randrange(3, 60)) if rng.random() < 0.4 else None,
+        "下单日期": ordered,
+        "到店交付日期": due,
+        "实际交付日期": delivered,
+        # DECIMAL(5,2) caps the amount below 1000
+        "定制金额": decimal.Decimal(str(rng.uniform(199, 999.99))).quantize(_TWO_PLACES),
+    })
+    return order
+
+
+def iter_orders(count, seed=42, start_id=1, today=None):
+    """Yield ``count`` orders with ids from ``start_id``, reproducible for a given seed and day"""
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    for i in range(count):
+        order = {"id": start_id + i}
+        order.update(generate_order(rng, today))
+        yield order
+
+
+def generate_orders(count, seed=42, start_id=1):
+    """``count`` orders as a list; use iter_orders for large counts"""
+    return list(iter_orders(count, seed, start_id))
@@ -0,0 +1,81 @@
+import sys
+import json
+import time
+import argparse
+import statistics
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import row_json
+from benchmarks.generator import generate_orders
+from statements import ORDER_COLUMNS
+
+# The order list response rendered the old way (row dicts through
+# jsonable_encoder and JSONResponse) versus row_json.render on row tuples.
+
+
+def _median_ms(func, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def _jsonable_path(columns, rows):
+    result = {"success": True, "orders": [dict(zip(columns, row)) for row in rows], "count": len(rows),
+              "sync_token": "1"}
+    return JSONResponse(content=jsonable_encoder(result)).body
+
+
+def _row_json_path(columns, rows):
+    result = {"success": True, "orders": rows, "count": len(rows), "sync_token": "1"}
+    return row_json.render(result, "orders", columns, rows)
+
+
+def run(rows=5000, runs=5, columns=None):
+    columns = columns or ORDER_COLUMNS
+    orders = generate_orders(rows)
+    # Rows as pyodbc returns them: tuples of int/str/Decimal/date/None
+    data = [tuple(order[col] for col in columns) for order in orders]
+
+    jsonable_ms, expected = _median_ms(lambda: _jsonable_path(columns, data), runs)
+    row_json._compile.cache_clear()
+    compile_ms, _ = _median_ms(lambda: row_json.row_encoder(columns), 1)
+    fast_ms, body = _median_ms(lambda: _row_json_path(columns, data), runs)
+    return {
+        "rows": rows,
+        "columns": len(columns),
+        "runs": runs,
+        "bytes": len(body),
+        "identical": body == expected,
+        "jsonable_encoder_ms": round(jsonable_ms, 2),
+        "row_json_ms": round(fast_ms, 2),
+        "compile_ms": round(compile_ms, 3),
+        "speedup": round(jsonable_ms / fast_ms, 1),
+        "rows_per_second": int(rows / (fast_ms / 1000)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Order list serialization: jsonable_encoder vs row_json")
+    parser.add_argument("--rows", type=int, default=5000, help="orders in the response")
+    parser.add_argument("--runs", type=int, default=5, help="repetitions per measurement (median reported)")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    report = run(args.rows, args.runs)
+    for key, value in report.items():
+        print(f"{key:<20} {value}")
+    if not report["identical"]:
+        print("row_json output differs from JSONResponse(jsonable_encoder(...))", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if report["identical"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
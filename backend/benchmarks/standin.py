@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+
+from schema import TABLE_NAME, ROW_VERSION_COLUMN
+import migrations
+import rollups
+import statements
+import storage
+from benchmarks.generator import iter_orders
+
+# SQLite stand-in for the SQL Server database, so the API can be benchmarked
+# on a laptop: a file for storage.py's SQLite backend, filled with synthetic
+# orders. Benchmarks run main.app with STORAGE_BACKEND=sqlite pointed at a
+# copy of it.
+
+LOAD_BATCH = 5000
+
+
+def build_database(path, rows, seed=42, today=None):
+    """Create ``path`` holding ``rows`` synthetic orders; returns the load time in seconds"""
+    started = time.perf_counter()
+    if os.path.exists(path):
+        os.remove(path)
+    # The raw sqlite3 connection, with storage's Decimal and date adapters
+    conn = storage.SqliteConnection(path).raw
+    conn.execute("PRAGMA synchronous = OFF")
+    storage.create_schema(conn)
+    columns = statements.ORDER_COLUMNS
+    insert = (
+        f"INSERT INTO {TABLE_NAME} ({', '.join(columns)}, {ROW_VERSION_COLUMN}) "
+        f"VALUES ({', '.join('?' * (len(columns) + 1))})"
+    )
+    batch = []
+    for order in iter_orders(rows, seed, today=today):
+        batch.append([order[col] for col in columns] + [order["id"]])
+        if len(batch) == LOAD_BATCH:
+            conn.executemany(insert, batch)
+            batch = []
+            print(f"  loaded {order['id']} / {rows} orders", end="\r", file=sys.stderr)
+    if batch:
+        conn.executemany(insert, batch)
+    conn.execute(f"UPDATE {storage.VERSION_TABLE} SET v = ?", (rows,))
+    # create_schema made the rollup table empty; fill it as rollups.rebuild does
+    conn.execute(rollups.REBUILD_ROLLUP_SQL)
+    storage.create_triggers(conn)
+    conn.execute(f"PRAGMA user_version = {migrations.LATEST_VERSION}")
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    print(file=sys.stderr)
+    return time.perf_counter() - started
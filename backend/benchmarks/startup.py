@@ -0,0 +1,133 @@
+import os
+import re
+import sys
+import json
+import time
+import socket
+import argparse
+import subprocess
+
+import httpx
+
+# Cold-start budget: how long `import main` takes in a fresh interpreter and
+# how long a fresh uvicorn process takes to answer /livez. Exits 1 when either
+# is over its budget, so CI can catch a heavy import creeping back in:
+#
+#   python -m benchmarks.startup
+#   python -m benchmarks.startup --import-budget-ms 1200 --startup-budget-ms 2500 --output results/startup.json
+
+IMPORT_BUDGET_MS = float(os.getenv('IMPORT_BUDGET_MS', '1500'))
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', '3000'))
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOP_IMPORTS = 10
+
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _env():
+    env = dict(os.environ)
+    # main reads its configuration at import; the probes never touch the database
+    for name in ("DB_HOST", "DB_PORT", "DB_USER", "DB_PASSWORD", "DB_NAME"):
+        env.setdefault(name, "startup")
+    return env
+
+
+def measure_import(runs):
+    """Best wall time of ``import main`` over ``runs`` fresh interpreters, plus the slowest top-level imports"""
+    code = "import time; t = time.perf_counter(); import main; print((time.perf_counter() - t) * 1000)"
+    best = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=_env(),
+                                capture_output=True, text=True, check=True)
+        ms = float(result.stdout.strip().splitlines()[-1])
+        best = ms if best is None else min(best, ms)
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND_DIR,
+                            env=_env(), capture_output=True, text=True, check=True)
+    # Children are listed before their parent, one level (two spaces) deeper
+    top_level = []
+    children = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        depth, name = len(match.group(3)), match.group(4)
+        if depth == 3:
+            children.append((name, int(match.group(2)) / 1000))
+        elif depth == 1:
+            if name == "main":
+                top_level = children
+            children = []
+    top_level.sort(key=lambda item: item[1], reverse=True)
+    return round(best, 1), [{"module": name, "ms": round(ms, 1)} for name, ms in top_level[:TOP_IMPORTS]]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_startup(timeout):
+    """Milliseconds from spawning uvicorn to the first 200 from /livez"""
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/livez").status_code == 200:
+                        return round((time.perf_counter() - started) * 1000, 1)
+                except httpx.HTTPError:
+                    pass
+                if process.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+                time.sleep(0.01)
+        raise RuntimeError(f"/livez did not answer within {timeout} s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import and cold-start time of the API against a budget")
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--startup-budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters timed; the best is reported")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for /livez")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    import_ms, top_imports = measure_import(max(1, args.runs))
+    startup_ms = min(measure_startup(args.timeout) for _ in range(max(1, args.runs)))
+    report = {
+        "import_ms": import_ms,
+        "import_budget_ms": args.import_budget_ms,
+        "startup_ms": startup_ms,
+        "startup_budget_ms": args.startup_budget_ms,
+        "top_imports": top_imports,
+    }
+
+    print(f"import main      {import_ms:>8.1f} ms  (budget {args.import_budget_ms:.0f})")
+    print(f"first /livez 200 {startup_ms:>8.1f} ms  (budget {args.startup_budget_ms:.0f})")
+    print("slowest imports:")
+    for entry in top_imports:
+        print(f"  {entry['module']:<24} {entry['ms']:>8.1f} ms")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    over = [name for name, ms, budget in (("import", import_ms, args.import_budget_ms),
+                                           ("startup", startup_ms, args.startup_budget_ms)) if ms > budget]
+    if over:
+        print(f"Over budget: {', '.join(over)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import json
+import base64
+import decimal
+import datetime
+
+# Columnar wire format for order lists (?format=columnar):
+#
+#   {"columns": [name, ...], "length": n, "data": [column, ...]}
+#
+# Each column object holds the non-null values in row order, either as
+# "values" or, for repetitive strings, as a "dict" of distinct values plus
+# "codes" indexing into it. Null positions are given either as "null_runs"
+# ([start, length, start, length, ...]) or as "null_bitmap" (base64, bit i
+# of byte i // 8 set for a null row, least significant bit first),
+# whichever is shorter. A column with neither key has no nulls.
+
+
+def plain_value(value):
+    """Convert Decimal and date/time values the same way jsonable_encoder does; others pass through.
+
+    The one copy of these rules: row_json.py and main.py use it as well.
+    """
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def json_default(value):
+    """``default`` hook for json.dumps applying plain_value"""
+    converted = plain_value(value)
+    if converted is value:
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return converted
+
+
+def _null_runs(values):
+    runs = []
+    start = None
+    for i, value in enumerate(values):
+        if value is None:
+            if start is None:
+                start = i
+        elif start is not None:
+            runs.extend((start, i - start))
+            start = None
+    if start is not None:
+        runs.extend((start, len(values) - start))
+    return runs
+
+
+def _null_bitmap(values):
+    bitmap = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value is None:
+            bitmap[i >> 3] |= 1 << (i & 7)
+    return base64.b64encode(bytes(bitmap)).decode("ascii")
+
+
+def encode_column(values):
+    """Encode one column's values (a list, None for null)"""
+    column = {}
+    present = [plain_value(value) for value in values if value is not None]
+    if len(present) < len(values):
+        runs = _null_runs(values)
+        bitmap = _null_bitmap(values)
+        if len(json.dumps(runs, separators=(",", ":"))) <= len(bitmap) + 2:
+            column["null_runs"] = runs
+        else:
+            column["null_bitmap"] = bitmap
+    if present and all(isinstance(value, str) for value in present):
+        distinct = {}
+        codes = [distinct.setdefault(value, len(distinct)) for value in present]
+        # Only worth it when values repeat
+        if len(distinct) * 2 <= len(present):
+            column["dict"] = list(distinct)
+            column["codes"] = codes
+            return column
+    column["values"] = present
+    return column
+
+
+def encode_columnar(columns, rows, positions=None):
+    """Encode ``rows`` (sequences) as a columnar payload.
+
+    ``positions`` maps each name in ``columns`` to its index in the rows and
+    defaults to the same order, so a projection of wider rows such as
+    cached order snapshots needs no copying.
+    """
+    if positions is None:
+        positions = range(len(columns))
+    return {
+        "columns": list(columns),
+        "length": len(rows),
+        "data": [encode_column([row[i] for row in rows]) for i in positions],
+    }
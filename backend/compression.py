@@ -0,0 +1,194 @@
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
+# Responses smaller than this are sent as-is; compressing them costs more
+# CPU than the bytes it saves
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', '4'))
+ZSTD_LEVEL = int(os.getenv('ZSTD_LEVEL', '3'))
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+
+# Content types worth compressing; images and archives are already compressed
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class GzipCompressor:
+    def __init__(self, level=GZIP_LEVEL):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, quality=BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level=ZSTD_LEVEL):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+# Server preference when the client accepts several encodings equally
+ENCODINGS = {}
+if zstandard is not None:
+    ENCODINGS["zstd"] = ZstdCompressor
+if brotli is not None:
+    ENCODINGS["br"] = BrotliCompressor
+ENCODINGS["gzip"] = GzipCompressor
+
+
+def negotiate(accept_encoding, available=ENCODINGS):
+    """Pick the encoding to use for an Accept-Encoding header, or None"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best = None
+    best_q = 0.0
+    for name in available:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses according to Accept-Encoding.
+
+    Single-body responses below ``minimum_size`` pass through untouched.
+    Streaming responses are compressed chunk by chunk and flushed after
+    each chunk, so clients still receive rows as they are produced.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE, encodings=None, enabled=COMPRESSION_ENABLED):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = ENCODINGS if encodings is None else encodings
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for key, value in scope["headers"]:
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate(accept, self.encodings) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingResponder(send, encoding, self.encodings[encoding], self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    def __init__(self, send, encoding, compressor_class, minimum_size):
+        self._send = send
+        self.encoding = encoding
+        self.compressor_class = compressor_class
+        self.minimum_size = minimum_size
+        self._start = None
+        self._compressor = None
+        self._passthrough = False
+
+    def _should_compress(self, headers):
+        content_type = ""
+        for key, value in headers:
+            if key == b"content-encoding":
+                return False
+            if key == b"content-type":
+                content_type = value.decode("latin-1").lower()
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self._start = message
+            headers = message.get("headers", [])
+            status = message["status"]
+            self._passthrough = status < 200 or status in (204, 304) or not self._should_compress(headers)
+            if self._passthrough:
+                await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or self._passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._compressor is None:
+            if not more_body and len(body) < self.minimum_size:
+                self._passthrough = True
+                await self._send(self._start)
+                await self._send(message)
+                return
+            self._compressor = self.compressor_class()
+            headers = [(k, v) for k, v in self._start.get("headers", []) if k not in (b"content-length", b"vary")]
+            vary = [v for k, v in self._start.get("headers", []) if k == b"vary"]
+            headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+            headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+            if not more_body:
+                data = self._compressor.compress(body) + self._compressor.finish()
+                headers.append((b"content-length", str(len(data)).encode("latin-1")))
+                await self._send({**self._start, "headers": headers})
+                await self._send({"type": "http.response.body", "body": data})
+                return
+            await self._send({**self._start, "headers": headers})
+
+        data = self._compressor.compress(body)
+        if more_body:
+            data += self._compressor.flush()
+        else:
+            data += self._compressor.finish()
+        if data or not more_body:
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
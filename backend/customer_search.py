@@ -0,0 +1,296 @@
+import re
+import threading
+
+from statements import ORDER_COLUMNS
+
+# In-memory customer index over shirt_orders for partial 姓名 / 电话 lookups.
+# Chinese names are only 2-4 characters, so single characters and bigrams are
+# indexed; phone numbers are indexed by digit trigrams. Whole values and
+# leading characters get postings of their own so exact and prefix matches,
+# which rank first, are found without scanning substring candidates.
+
+_ID = ORDER_COLUMNS.index("id")
+_NAME = ORDER_COLUMNS.index("姓名")
+_PHONE = ORDER_COLUMNS.index("电话")
+_ORDER_DATE = ORDER_COLUMNS.index("下单日期")
+
+PHONE_GRAM = 3
+_NON_DIGITS = re.compile(r"\D")
+NAME_PREFIXES = (1, 2)
+MAX_RESULTS = 100
+
+# Match quality, best first
+EXACT, PREFIX, SUBSTRING = "exact", "prefix", "substring"
+
+
+def normalize_name(value):
+    return "".join(str(value or "").split()).lower()
+
+
+def normalize_phone(value):
+    value = str(value or "")
+    return value if value.isdigit() else _NON_DIGITS.sub("", value)
+
+
+def _name_substring_grams(name):
+    # A single character can only be looked up by itself; longer strings use
+    # their bigrams, which are far more selective
+    if len(name) == 1:
+        return {("n", name)}
+    return {("n", name[i:i + 2]) for i in range(len(name) - 1)}
+
+
+def _phone_substring_grams(phone):
+    return {("p", phone[i:i + PHONE_GRAM]) for i in range(len(phone) - PHONE_GRAM + 1)}
+
+
+def customer_grams(name, phone):
+    """Every posting key a customer with this name and phone belongs to"""
+    grams = set()
+    if name:
+        grams |= {("n", ch) for ch in name} | _name_substring_grams(name)
+        grams |= {("n^", name[:size]) for size in NAME_PREFIXES if len(name) >= size}
+        grams.add(("n=", name))
+    if phone:
+        grams |= _phone_substring_grams(phone)
+        grams.add(("p=", phone))
+        if len(phone) >= PHONE_GRAM:
+            grams.add(("p^", phone[:PHONE_GRAM]))
+    return grams
+
+
+def _order_rank(row):
+    # Latest order first: by 下单日期 (missing dates count as oldest), then id
+    order_date = row[_ORDER_DATE]
+    return (order_date is not None, str(order_date or ""), row[_ID])
+
+
+class _Customer:
+    __slots__ = ("slot", "key", "order_ids", "latest", "name", "phone", "grams")
+
+    def __init__(self, slot, key):
+        self.slot = slot
+        self.key = key
+        self.order_ids = set()
+        self.latest = None
+        self.name = ""
+        self.phone = ""
+        self.grams = frozenset()
+
+
+class CustomerIndex:
+    """Customers grouped from order rows, searchable by partial name or phone.
+
+    A customer is identified by phone number, or by name for orders without
+    one. Rows are tuples in ``statements.ORDER_COLUMNS`` order and are kept
+    by reference, so an index built from the shared order cache snapshot
+    costs little extra memory.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._orders = {}
+        self._customers = {}
+        self._slots = []
+        self._free_slots = []
+        self._postings = {}
+        # Postings sorted by recency, built on demand and dropped on change
+        self._ranked = {}
+        self.sync_token = None
+
+    def __len__(self):
+        return len(self._customers)
+
+    @staticmethod
+    def customer_key(row):
+        phone = normalize_phone(row[_PHONE])
+        return f"tel:{phone}" if phone else f"name:{normalize_name(row[_NAME])}"
+
+    def load(self, rows, sync_token):
+        """Rebuild the index from all order rows"""
+        with self._lock:
+            self.__init__()
+            # Group first so each customer's grams are computed only once
+            for row in rows:
+                key = self.customer_key(row)
+                customer = self._customers.get(key)
+                if customer is None:
+                    customer = self._customers[key] = _Customer(len(self._slots), key)
+                    self._slots.append(customer)
+                self._orders[row[_ID]] = (key, row)
+                customer.order_ids.add(row[_ID])
+                if customer.latest is None or _order_rank(row) > _order_rank(customer.latest):
+                    customer.latest = row
+            postings = self._postings
+            for customer in self._slots:
+                customer.name = normalize_name(customer.latest[_NAME])
+                customer.phone = normalize_phone(customer.latest[_PHONE])
+                customer.grams = frozenset(customer_grams(customer.name, customer.phone))
+                for gram in customer.grams:
+                    posting = postings.get(gram)
+                    if posting is None:
+                        posting = postings[gram] = set()
+                    posting.add(customer.slot)
+            self.sync_token = sync_token
+
+    def apply(self, rows, deleted_ids, sync_token):
+        """Apply changed rows and deleted order ids from a delta sync"""
+        with self._lock:
+            for row in rows:
+                self._upsert(row)
+            for order_id in deleted_ids:
+                self._remove(order_id)
+            self.sync_token = sync_token
+
+    def _upsert(self, row):
+        order_id = row[_ID]
+        key = self.customer_key(row)
+        previous = self._orders.get(order_id)
+        if previous is not None and previous[0] != key:
+            self._remove(order_id)
+        customer = self._customers.get(key)
+        if customer is None:
+            slot = self._free_slots.pop() if self._free_slots else len(self._slots)
+            customer = _Customer(slot, key)
+            if slot == len(self._slots):
+                self._slots.append(customer)
+            else:
+                self._slots[slot] = customer
+            self._customers[key] = customer
+        self._orders[order_id] = (key, row)
+        customer.order_ids.add(order_id)
+        latest = customer.latest
+        if latest is None or _order_rank(row) > _order_rank(latest):
+            customer.latest = row
+        elif latest[_ID] == order_id:
+            # The latest order was edited and may no longer be the latest
+            self._recompute_latest(customer)
+        else:
+            return
+        self._reindex(customer)
+
+    def _remove(self, order_id):
+        entry = self._orders.pop(order_id, None)
+        if entry is None:
+            return
+        customer = self._customers[entry[0]]
+        customer.order_ids.discard(order_id)
+        if not customer.order_ids:
+            self._set_grams(customer, frozenset())
+            del self._customers[customer.key]
+            self._slots[customer.slot] = None
+            self._free_slots.append(customer.slot)
+        elif customer.latest[_ID] == order_id:
+            self._recompute_latest(customer)
+            self._reindex(customer)
+
+    def _recompute_latest(self, customer):
+        customer.latest = max((self._orders[i][1] for i in customer.order_ids), key=_order_rank)
+
+    def _reindex(self, customer):
+        customer.name = normalize_name(customer.latest[_NAME])
+        customer.phone = normalize_phone(customer.latest[_PHONE])
+        self._set_grams(customer, frozenset(customer_grams(customer.name, customer.phone)))
+
+    def _set_grams(self, customer, grams):
+        old = customer.grams
+        for gram in old - grams:
+            posting = self._postings[gram]
+            posting.discard(customer.slot)
+            if not posting:
+                del self._postings[gram]
+        for gram in grams - old:
+            self._postings.setdefault(gram, set()).add(customer.slot)
+        # The customer's recency may have changed too, so every ranked view
+        # containing it is stale
+        if self._ranked:
+            for gram in old | grams:
+                self._ranked.pop(gram, None)
+        customer.grams = grams
+
+    def _rank_key(self, slot):
+        return _order_rank(self._slots[slot].latest)
+
+    def _ranked_posting(self, gram):
+        ranked = self._ranked.get(gram)
+        if ranked is None:
+            ranked = sorted(self._postings.get(gram, ()), key=self._rank_key, reverse=True)
+            self._ranked[gram] = ranked
+        return ranked
+
+    def _ranked_candidates(self, grams):
+        # Intersect the rarest postings first; the result is small enough to sort
+        postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        candidates = set(postings[0]) if postings else set()
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+        return sorted(candidates, key=self._rank_key, reverse=True)
+
+    def search(self, query, limit=20):
+        """Return up to ``limit`` (customer, match) pairs, best match first.
+
+        Exact matches rank above prefix matches above substring matches;
+        within each group, customers with the most recent order come first.
+        """
+        limit = max(1, min(limit, MAX_RESULTS))
+        phone = normalize_phone(query)
+        name = normalize_name(query)
+        if phone and phone == name:
+            if len(phone) < PHONE_GRAM:
+                return []
+            field, needle = "p", phone
+            prefix_gram = ("p^", phone[:PHONE_GRAM])
+            prefix_exact = len(phone) == PHONE_GRAM
+            substring_grams = _phone_substring_grams(phone)
+        elif name:
+            field, needle = "n", name
+            size = min(len(name), NAME_PREFIXES[-1])
+            prefix_gram = ("n^", name[:size])
+            prefix_exact = len(name) == size
+            substring_grams = _name_substring_grams(name)
+        else:
+            return []
+
+        results = []
+        seen = set()
+
+        def take(slots, quality, matches):
+            for slot in slots:
+                if slot in seen:
+                    continue
+                customer = self._slots[slot]
+                if matches(customer.phone if field == "p" else customer.name):
+                    seen.add(slot)
+                    results.append((customer, quality))
+                    if len(results) == limit:
+                        return True
+            return False
+
+        with self._lock:
+            if take(self._ranked_posting((field + "=", needle)), EXACT, lambda value: True):
+                return results
+            if prefix_exact:
+                prefixed = self._ranked_posting(prefix_gram)
+            else:
+                prefixed = self._ranked_candidates({prefix_gram} | substring_grams)
+            if take(prefixed, PREFIX, lambda value: value.startswith(needle)):
+                return results
+            if len(substring_grams) == 1:
+                # Walk the recency-ranked posting; prefix matches are already in ``seen``
+                contains = self._ranked_posting(next(iter(substring_grams)))
+            else:
+                contains = self._ranked_candidates(substring_grams)
+            take(contains, SUBSTRING, lambda value: needle in value)
+            return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                "customers": len(self._customers),
+                "orders": len(self._orders),
+                "grams": len(self._postings),
+                "ranked_views": len(self._ranked),
+                "sync_token": self.sync_token,
+            }
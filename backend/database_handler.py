@@ -1,20 +1,26 @@
 import pyodbc
 import os
-import sys
 import json
 from dotenv import load_dotenv
 from datetime import datetime
 
+import app_logging
+
 # Load environment variables
 load_dotenv()
 
 # Default to False if not set
 USE_SQLSERVER = os.getenv('USE_SQLSERVER', 'false').lower() == 'true'
 
+logger = app_logging.get_logger("database_handler")
+# Per-row debug messages are sampled (LOG_SAMPLE_DEBUG) so debug logging
+# does not cost one write per fetched row
+log_row = app_logging.Sampler(logger)
+
 def get_db_connection():
     """Create and return a database connection"""
     if not USE_SQLSERVER:
-        print("SQL Server connection is disabled. Set USE_SQLSERVER=true in .env to enable.", file=sys.stderr)
+        logger.warning("SQL Server connection is disabled. Set USE_SQLSERVER=true in .env to enable.")
         return None
         
     try:
@@ -34,7 +40,7 @@ def get_db_connection():
             if not password: missing.append('DB_PASSWORD')
             if not port: missing.append('DB_PORT')
             
-            print(f"Missing required SQL Server environment variables: {', '.join(missing)}", file=sys.stderr)
+            logger.error("Missing required SQL Server environment variables: %s", ', '.join(missing))
             return None
             
         # Strip quotes from values if present
@@ -56,13 +62,14 @@ def get_db_connection():
             "Encrypt=yes;"
         )
         
-        print(f"Attempting to connect with connection string: {conn_str}", file=sys.stderr)
+        # The connection string holds the password; log only where we connect
+        logger.debug("Attempting to connect to %s, database %s as %s", server_with_port, database, username)
         
         conn = pyodbc.connect(conn_str)
-        print("Successfully connected to database", file=sys.stderr)
+        logger.info("Successfully connected to database")
         return conn
     except Exception as e:
-        print(f"Error connecting to database: {str(e)}", file=sys.stderr)
+        logger.error("Error connecting to database: %s", e)
         return None
 
 def insert_order(order_data):
@@ -71,12 +78,12 @@ def insert_order(order_data):
     try:
         conn = get_db_connection()
         if conn is None:
-            print("Cannot insert order: No database connection available", file=sys.stderr)
+            logger.error("Cannot insert order: No database connection available")
             return False
             
         cursor = conn.cursor()
         
-        print(f"Preparing to insert order data: {json.dumps(order_data, indent=2)}", file=sys.stderr)
+        logger.debug("Preparing to insert order data: %s", order_data)
         
         # Ensure measurements are properly formatted as floats
         if 'measurements' in order_data and isinstance(order_data['measurements'], dict):
@@ -84,7 +91,7 @@ def insert_order(order_data):
                 try:
                     order_data['measurements'][key] = float(value)
                 except (ValueError, TypeError):
-                    print(f"Invalid measurement value for {key}: {value}", file=sys.stderr)
+                    logger.error("Invalid measurement value for %s: %s", key, value)
                     return False
         
         # Updated query to match the actual table schema
@@ -129,36 +136,36 @@ def insert_order(order_data):
                 order_data.get('special_requests', '')  # maps to special_requirements
             )
         except KeyError as e:
-            print(f"Missing required field in order data: {e}", file=sys.stderr)
+            logger.error("Missing required field in order data: %s", e)
             return False
         except (ValueError, TypeError) as e:
-            print(f"Invalid measurement value: {e}", file=sys.stderr)
+            logger.error("Invalid measurement value: %s", e)
             return False
         
-        print(f"Executing SQL query with values: {values}", file=sys.stderr)
+        logger.debug("Executing SQL query with values: %s", values)
         
         # Execute the query
         cursor.execute(query, values)
         
         # Check if the insert was successful
         if cursor.rowcount <= 0:
-            print("No rows affected by insert operation", file=sys.stderr)
+            logger.warning("No rows affected by insert operation")
             conn.rollback()
             return False
             
         conn.commit()
-        print(f"Successfully inserted order into database, rows affected: {cursor.rowcount}", file=sys.stderr)
+        logger.info("Successfully inserted order into database, rows affected: %s", cursor.rowcount)
         return True
         
     except Exception as e:
-        print(f"Error inserting order: {str(e)}", file=sys.stderr)
+        logger.error("Error inserting order: %s", e)
         if conn:
             conn.rollback()
         return False
     finally:
         if conn:
             conn.close()
-            print("Database connection closed", file=sys.stderr)
+            logger.debug("Database connection closed")
 
 def get_orders():
     """Fetch all orders from the database"""
@@ -166,12 +173,12 @@ def get_orders():
     try:
         conn = get_db_connection()
         if conn is None:
-            print("Cannot get orders: No database connection available", file=sys.stderr)
+            logger.error("Cannot get orders: No database connection available")
             return []
             
         cursor = conn.cursor()
         
-        print(f"Fetching all orders from the database", file=sys.stderr)
+        logger.info("Fetching all orders from the database")
         
         # Query to get all orders from the Test table
         query = '''
@@ -195,18 +202,18 @@ def get_orders():
             FROM Test
         '''
         
-        print(f"Executing query: {query}", file=sys.stderr)
+        logger.debug("Executing query: %s", query)
         cursor.execute(query)
         
-        # Get all rows and print the count for debugging
+        # Get all rows and log the count for debugging
         rows = cursor.fetchall()
         row_count = len(rows)
-        print(f"Query returned {row_count} rows", file=sys.stderr)
+        logger.debug("Query returned %s rows", row_count)
         
         orders = []
         for row in rows:
-            # Print each row ID for debugging
-            print(f"Processing row with ID: {row[0]}", file=sys.stderr)
+            # Log a sample of row IDs for debugging
+            log_row("Processing row with ID: %s", row[0])
             
             # Convert row to dictionary with the frontend-expected structure
             order = {
@@ -231,18 +238,18 @@ def get_orders():
             }
             orders.append(order)
         
-        print(f"Successfully processed {len(orders)} orders to return", file=sys.stderr)
+        logger.info("Successfully processed %s orders to return", len(orders))
         
         # Don't truncate the results - ensure we return all orders
         return orders
         
     except Exception as e:
-        print(f"Error fetching orders: {str(e)}", file=sys.stderr)
+        logger.error("Error fetching orders: %s", e)
         raise
     finally:
         if conn:
             conn.close()
-            print("Database connection closed", file=sys.stderr)
+            logger.debug("Database connection closed")
 
 def update_order(order_id, order_data):
     """Update an existing order in the database"""
@@ -251,12 +258,12 @@ def update_order(order_id, order_data):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        print(f"Preparing to update order {order_id} with data: {order_data}", file=sys.stderr)
+        logger.debug("Preparing to update order %s with data: %s", order_id, order_data)
         
         # Check if order exists
         cursor.execute('SELECT id FROM Test WHERE id = ?', (order_id,))
         if not cursor.fetchone():
-            print(f"Order with ID {order_id} not found", file=sys.stderr)
+            logger.warning("Order with ID %s not found", order_id)
             return False, "Order not found"
         
         # Prepare update fields
@@ -334,7 +341,7 @@ def update_order(order_id, order_data):
             values.append(order_data['special_requests'])
         
         if not update_fields:
-            print("No fields to update", file=sys.stderr)
+            logger.info("No fields to update")
             return True, "No fields to update"
         
         # Build and execute update query
@@ -342,22 +349,22 @@ def update_order(order_id, order_data):
         query = f"UPDATE Test SET {set_clause} WHERE id = ?"
         values.append(order_id)
         
-        print(f"Executing SQL query: {query} with values: {values}", file=sys.stderr)
+        logger.debug("Executing SQL query: %s with values: %s", query, values)
         cursor.execute(query, values)
         conn.commit()
         
-        print(f"Successfully updated order {order_id}", file=sys.stderr)
+        logger.info("Successfully updated order %s", order_id)
         return True, "Order updated successfully"
         
     except Exception as e:
-        print(f"Error updating order: {str(e)}", file=sys.stderr)
+        logger.error("Error updating order: %s", e)
         if conn:
             conn.rollback()
         return False, str(e)
     finally:
         if conn:
             conn.close()
-            print("Database connection closed", file=sys.stderr)
+            logger.debug("Database connection closed")
 
 def test_insert():
     """Test function to insert sample data"""
@@ -0,0 +1,51 @@
+import os
+import asyncio
+import functools
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from db_pool import POOL_MAX_SIZE
+
+# One thread per pooled connection: more threads would only queue on the pool,
+# fewer would leave connections idle while requests wait
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', str(POOL_MAX_SIZE)))
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return this worker process's bounded database executor"""
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(
+                    max_workers=DB_EXECUTOR_WORKERS,
+                    thread_name_prefix="db",
+                )
+                _executor_pid = pid
+    return _executor
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database call on the DB executor and await its result.
+
+    The call runs in a copy of the caller's context, so per-request state
+    (see metrics.py) is visible in the executor thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+
+def shutdown_executor():
+    """Stop the executor, waiting for in-flight database calls to finish"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
@@ -0,0 +1,255 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import app_logging
+
+# Pool sizing and health-check settings, overridable per deployment
+POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '5'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '1800'))
+POOL_VALIDATE_AFTER = float(os.getenv('DB_POOL_VALIDATE_AFTER', '5'))
+
+logger = app_logging.get_logger("db_pool")
+# While the database is down every request fails to connect; these are
+# sampled (LOG_SAMPLE_ERROR / LOG_SAMPLE_WARNING) so an outage does not
+# flood the log
+log_connect_error = app_logging.Sampler(logger, logging.ERROR)
+log_ping_error = app_logging.Sampler(logger, logging.WARNING)
+
+
+class PoolError(Exception):
+    """Raised when the pool cannot hand out a database connection"""
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection became available within the pool timeout"""
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections.
+
+    Connections are created lazily by ``connect`` up to ``max_size``. A
+    connection that has been idle longer than ``validate_after`` seconds is
+    pinged before it is handed out, and connections older than
+    ``max_lifetime`` seconds are closed and replaced on borrow.
+    """
+
+    def __init__(self, connect, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 timeout=POOL_TIMEOUT, max_lifetime=POOL_MAX_LIFETIME,
+                 validate_after=POOL_VALIDATE_AFTER, ping_sql="SELECT 1"):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._connect = connect
+        self.min_size = min(max(min_size, 0), max_size)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.validate_after = validate_after
+        self.ping_sql = ping_sql
+
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        # Counters exposed through stats()
+        self._borrows = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._invalidated = 0
+        self._connect_errors = 0
+
+    def open(self):
+        """Pre-create connections until the pool holds ``min_size``"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                entry = self._create()
+            except PoolError:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def _create(self):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            conn = None
+            log_connect_error("Connection pool failed to open a connection: %s", e)
+        if conn is None:
+            with self._cond:
+                self._connect_errors += 1
+            raise PoolError("无法连接到数据库")
+        with self._cond:
+            self._created += 1
+        return _PooledConnection(conn)
+
+    def _is_usable(self, entry):
+        now = time.monotonic()
+        if self.max_lifetime and now - entry.created_at > self.max_lifetime:
+            with self._cond:
+                self._recycled += 1
+            return False
+        if now - entry.last_used > self.validate_after:
+            try:
+                cursor = entry.conn.cursor()
+                cursor.execute(self.ping_sql)
+                cursor.fetchall()
+                cursor.close()
+            except Exception as e:
+                log_ping_error("Discarding pooled connection that failed ping: %s", e)
+                with self._cond:
+                    self._invalidated += 1
+                return False
+        return True
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """Borrow a connection, waiting up to ``timeout`` seconds for one"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        while True:
+            entry = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("Connection pool is closed")
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Timed out after {self.timeout}s waiting for a database connection"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if entry is None:
+                try:
+                    entry = self._create()
+                except PoolError:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_usable(entry):
+                self._close_quietly(entry.conn)
+                with self._cond:
+                    self._size -= 1
+                continue
+
+            wait = time.monotonic() - start
+            with self._cond:
+                self._borrows += 1
+                self._wait_total += wait
+                if wait > self._wait_max:
+                    self._wait_max = wait
+                if waited:
+                    self._waits += 1
+            return entry
+
+    def release(self, entry, discard=False):
+        """Return a borrowed connection, rolling back any open transaction"""
+        if not discard:
+            try:
+                entry.conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            self._cond.notify()
+        if discard or self._closed:
+            self._close_quietly(entry.conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a ``with`` block"""
+        entry = self.acquire()
+        try:
+            yield entry.conn
+        finally:
+            self.release(entry)
+
+    def close(self):
+        """Close all idle connections and refuse further borrows"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_quietly(entry.conn)
+
+    def stats(self):
+        """Return a snapshot of pool occupancy and wait-time metrics"""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "borrows": self._borrows,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "wait_ms_total": round(self._wait_total * 1000, 3),
+                "wait_ms_avg": round(self._wait_total * 1000 / self._borrows, 3) if self._borrows else 0.0,
+                "wait_ms_max": round(self._wait_max * 1000, 3),
+                "created": self._created,
+                "recycled": self._recycled,
+                "invalidated": self._invalidated,
+                "connect_errors": self._connect_errors,
+            }
+
+
+def sqlite_connection_factory(path):
+    """Return a connect callable for a local SQLite stand-in database"""
+    import sqlite3
+
+    def connect():
+        return sqlite3.connect(path, check_same_thread=False)
+    return connect
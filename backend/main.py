@@ -1,103 +1,46 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from fastapi.encoders import jsonable_encoder
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, StrictInt, ValidationError, field_validator
 from typing import Optional, List, Dict, Any
-import sqlite3
+import io
+import csv
 import json
+import zlib
+import base64
+import asyncio
 import socket
-import sys
 import os
-import traceback
 import datetime
-import uvicorn
-import pyodbc
+import threading
+import tempfile
+import time
 from dotenv import load_dotenv
+from db_pool import ConnectionPool, PoolError, POOL_MAX_SIZE
+from db_executor import run_db, shutdown_executor
+from ttl_cache import TTLCache
+from order_cache import SharedOrderCache, ORDER_CACHE_ENABLED, ORDER_CACHE_DIR
+from replica import ReadReplica, REPLICA_ENABLED
+from customer_search import CustomerIndex
+from schema import TABLE_NAME, TABLE_COLUMNS, COLUMN_LIMITS, DATE_COLUMNS, parse_date
+import rollups
+import statements
+import migrations
+import columnar
+import row_json
+import order_import
+import order_query
+from compression import CompressionMiddleware
+import metrics
+import storage
+from single_flight import SingleFlight
+import app_logging
 
 app = FastAPI()
 
-# Define table name and columns to avoid hardcoding
-TABLE_NAME = "shirt_orders"
-TABLE_COLUMNS = {
-    "id": "INT IDENTITY(1,1) PRIMARY KEY",
-    "姓名": "VARCHAR(50) NOT NULL",
-    "身高": "DECIMAL(5,2)",
-    "体重_KG": "DECIMAL(5,2)",
-    "电话": "VARCHAR(20)",
-    "使用时间": "DATE",
-    "下单日期": "DATE",
-    "到店交付日期": "DATE",
-    "实际交付日期": "DATE",
-    "定制工艺": "VARCHAR(20)",
-    "工艺": "VARCHAR(20)",
-    "西装净体领围": "DECIMAL(5,2)",
-    "西装肩宽": "DECIMAL(5,2)",
-    "西装袖长": "DECIMAL(5,2)",
-    "西装袖肥": "DECIMAL(5,2)",
-    "西装袖口": "DECIMAL(5,2)",
-    "西装胸围": "DECIMAL(5,2)",
-    "西装中腰": "DECIMAL(5,2)",
-    "西装下摆臀围": "DECIMAL(5,2)",
-    "西装前衣长": "DECIMAL(5,2)",
-    "西装后衣长": "DECIMAL(5,2)",
-    "西装前腰节": "DECIMAL(5,2)",
-    "西装后腰节": "DECIMAL(5,2)",
-    "西装左肩斜": "DECIMAL(5,2)",
-    "西装右肩斜": "DECIMAL(5,2)",
-    "西装背胸差": "DECIMAL(5,2)",
-    "西装前胸宽": "DECIMAL(5,2)",
-    "西装后背宽": "DECIMAL(5,2)",
-    "西装袖笼差": "DECIMAL(5,2)",
-    "西装袖笼深": "DECIMAL(5,2)",
-    "西装袖笼围": "DECIMAL(5,2)",
-    "西装数量": "INT",
-    "西裤裤腰围": "DECIMAL(5,2)",
-    "西裤臀围": "DECIMAL(5,2)",
-    "西裤大腿圈": "DECIMAL(5,2)",
-    "西裤膝围": "DECIMAL(5,2)",
-    "西裤小腿圈": "DECIMAL(5,2)",
-    "西裤小腿高": "DECIMAL(5,2)",
-    "西裤裤长": "DECIMAL(5,2)",
-    "西裤遮档": "DECIMAL(5,2)",
-    "西裤腰高": "DECIMAL(5,2)",
-    "西裤裤前褶": "VARCHAR(20)",
-    "西裤皮带袢": "VARCHAR(20)",
-    "西裤卷边": "VARCHAR(20)",
-    "西裤调山袢": "VARCHAR(20)",
-    "西装面料": "VARCHAR(20)",
-    "西裤数量": "INT",
-    "马甲肩宽": "DECIMAL(5,2)",
-    "马甲胸围": "DECIMAL(5,2)",
-    "马甲中腰肚围": "DECIMAL(5,2)",
-    "马甲下摆": "DECIMAL(5,2)",
-    "马甲前衣长": "DECIMAL(5,2)",
-    "马甲后衣长": "DECIMAL(5,2)",
-    "马甲袖肥": "DECIMAL(5,2)",
-    "马甲袖口": "DECIMAL(5,2)",
-    "马甲扣数": "INT",
-    "马甲排数": "VARCHAR(20)",
-    "马甲口袋": "VARCHAR(20)",
-    "马甲背面": "VARCHAR(20)",
-    "马甲领子": "VARCHAR(20)",
-    "马甲侧面开叉": "VARCHAR(20)",
-    "马甲数量": "INT",
-    "衬衫领围": "DECIMAL(5,2)",
-    "衬衫肩宽": "DECIMAL(5,2)",
-    "衬衫袖长": "DECIMAL(5,2)",
-    "衬衫领型": "DECIMAL(5,2)",
-    "衬衫袖口": "DECIMAL(5,2)",
-    "衬衫面料": "VARCHAR(50)",
-    "衬衫数量": "INT",
-    "款式备注": "VARCHAR(50)",
-    "体型备注": "VARCHAR(50)",
-    "里布": "VARCHAR(50)",
-    "客户来源": "VARCHAR(50)",
-    "接待人员": "VARCHAR(50)",
-    "定制顾问": "VARCHAR(50)",
-    "定制金额": "DECIMAL(5,2)"
-}
-
-
+logger = app_logging.get_logger("main")
 
 # Load environment variables from .env file
 load_dotenv()
@@ -120,12 +63,33 @@ app.add_middleware(
     max_age=3600,  # Cache preflight requests for 1 hour
 )
 
-# Register startup event to initialize database
+# Compress large JSON/CSV responses for clients that accept it (see compression.py)
+app.add_middleware(CompressionMiddleware)
+
+# Per-route latency, response bytes and database time for GET /metrics
+# (see metrics.py); added last so it times compression too
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Register startup event to initialize database. The schema check runs in
+# the background so the worker answers /livez at once; /readyz reports
+# ready once the schema is known to be current
+_schema_task = None
+
 @app.on_event("startup")
 async def startup_event():
-    print("Server starting up", file=sys.stderr)
-    init_db()
-    print("Database initialized on startup", file=sys.stderr)
+    global _schema_task
+    logger.info("Server starting up")
+    _schema_task = asyncio.create_task(prepare_schema())
+    read_replica.start()
+
+# Let in-flight database calls finish before the worker exits
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _schema_task is not None:
+        _schema_task.cancel()
+    read_replica.stop()
+    shutdown_executor()
+    get_pool().close()
 
 # Function to get the current machine's IP address
 def get_host_ip():
@@ -152,73 +116,134 @@ DB_NAME = os.getenv('DB_NAME')
 # Flag to determine if we should use SQL Server
 USE_SQLSERVER = all([DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME])
 
-def get_db_connection():
-    """Create and return a database connection to the SQL Server"""
+def _build_connection_string():
+    """Build the SQL Server ODBC connection string once from the environment"""
     if not USE_SQLSERVER:
-        print("SQL Server connection is disabled due to missing environment variables.", file=sys.stderr)
+        return None
+
+    # Strip quotes from values if present
+    username = DB_USER.strip("'")
+    password = DB_PASSWORD.strip("'")
+
+    driver = '{ODBC Driver 18 for SQL Server}'
+
+    # Format the server string with port
+    server_with_port = f"{DB_HOST},{DB_PORT}"
+
+    return (
+        f"DRIVER={driver};"
+        f"SERVER={server_with_port};"
+        f"DATABASE={DB_NAME};"
+        f"UID={username};"
+        f"PWD={password};"
+        "TrustServerCertificate=yes;"
+        "Encrypt=yes;"
+    )
+
+SQLSERVER_CONN_STR = _build_connection_string()
+
+# Where shirt orders are stored (storage.py): SQL Server unless
+# STORAGE_BACKEND=sqlite selects the embedded SQLite file
+storage_backend = storage.from_env(SQLSERVER_CONN_STR, f"{DB_HOST}:{DB_PORT}/{DB_NAME}")
+DB_ENABLED = storage_backend is not None
+
+def get_db_connection():
+    """Create and return a new physical connection to the storage backend"""
+    if not DB_ENABLED:
+        logger.warning("Database connection is disabled due to missing environment variables.")
         return None
         
     try:
-        # Strip quotes from values if present
-        username = DB_USER.strip("'")
-        password = DB_PASSWORD.strip("'")
-        
-        driver = '{ODBC Driver 18 for SQL Server}'
-        
-        # Format the server string with port
-        server_with_port = f"{DB_HOST},{DB_PORT}"
+        logger.info("Connecting to %s database: %s", storage_backend.name, storage_backend.location)
         
-        conn_str = (
-            f"DRIVER={driver};"
-            f"SERVER={server_with_port};"
-            f"DATABASE={DB_NAME};"
-            f"UID={username};"
-            f"PWD={password};"
-            "TrustServerCertificate=yes;"
-            "Encrypt=yes;"
-        )
-        
-        print(f"Connecting to SQL Server: {DB_HOST}:{DB_PORT}, Database: {DB_NAME}", file=sys.stderr)
-        
-        conn = pyodbc.connect(conn_str)
-        print("Successfully connected to SQL Server database", file=sys.stderr)
+        conn = storage_backend.connect()
+        logger.info("Successfully connected to %s database", storage_backend.name)
         return conn
     except Exception as e:
-        print(f"Error connecting to SQL Server database: {str(e)}", file=sys.stderr)
+        logger.error("Error connecting to %s database: %s", storage_backend.name, e)
+        return None
+
+# Connection pool, created lazily once per worker process so forked
+# workers (serve.py) never share sockets inherited from the master
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return this worker process's database connection pool"""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(metrics.instrument_connect(get_db_connection))
+                _pool_pid = pid
+    return _pool
+
+# Local SQLite copy of shirt_orders for reads (enabled with REPLICA_ENABLED);
+# pointless when the orders already live in a local SQLite file
+read_replica = ReadReplica(get_pool, enabled=REPLICA_ENABLED and isinstance(storage_backend, storage.SqlServerBackend))
+
+# Fingerprint of the schema this code expects on this database, written
+# after a successful migration check; later worker starts that find the same
+# fingerprint skip the check and its DDL round trips
+SCHEMA_CACHE_PATH = os.getenv('SCHEMA_CACHE_PATH', os.path.join(ORDER_CACHE_DIR, "schema.fingerprint"))
+SCHEMA_CHECK_ALWAYS = os.getenv('SCHEMA_CHECK_ALWAYS', 'false').lower() == 'true'
+schema_ready = threading.Event()
+
+def _cached_schema_fingerprint():
+    try:
+        with open(SCHEMA_CACHE_PATH, encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
         return None
 
+def _save_schema_fingerprint(fingerprint):
+    try:
+        os.makedirs(os.path.dirname(SCHEMA_CACHE_PATH), exist_ok=True)
+        tmp_path = f"{SCHEMA_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(fingerprint)
+        os.replace(tmp_path, SCHEMA_CACHE_PATH)
+    except OSError as e:
+        logger.warning("Could not save schema fingerprint: %s", e)
+
 # Database initialization
 def init_db():
-    """Initialize the database by creating the shirt_orders table if it doesn't exist"""
-    if USE_SQLSERVER:
+    """Apply pending schema migrations unless the cached fingerprint shows none are needed.
+
+    Returns True once the schema is current.
+    """
+    if DB_ENABLED:
+        fingerprint = migrations.schema_fingerprint(f"{storage_backend.name}:{storage_backend.location}")
+        if not SCHEMA_CHECK_ALWAYS and _cached_schema_fingerprint() == fingerprint:
+            logger.info("Schema fingerprint matches, skipping migration check")
+            schema_ready.set()
+            return True
         try:
-            conn = get_db_connection()
-            if conn is None:
-                print("Could not initialize SQL Server database - connection failed", file=sys.stderr)
-                return
-            
-            cursor = conn.cursor()
-            
-            # Dynamically build the CREATE TABLE statement
-            column_defs = [f"{col} {type_def}" for col, type_def in TABLE_COLUMNS.items()]
-            create_table_sql = f"""
-                IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = '{TABLE_NAME}')
-                BEGIN
-                    CREATE TABLE {TABLE_NAME} (
-                        {', '.join(column_defs)}
-                    )
-                END
-            """
-            
-            cursor.execute(create_table_sql)
-            
-            conn.commit()
-            conn.close()
-            print("SQL Server database initialized successfully", file=sys.stderr)
+            with get_pool().connection() as conn:
+                applied = storage_backend.migrate(conn)
+            logger.info("%s database initialized successfully (%s migration(s) applied)",
+                        storage_backend.name, len(applied))
+            _save_schema_fingerprint(fingerprint)
+            schema_ready.set()
+            return True
+        except PoolError as e:
+            logger.error("Could not initialize %s database - connection failed: %s", storage_backend.name, e)
         except Exception as e:
-            print(f"Error initializing SQL Server database: {str(e)}", file=sys.stderr)
+            logger.error("Error initializing %s database: %s", storage_backend.name, e)
     else:
-        print("SQL Server connection not available - using SQLite as fallback", file=sys.stderr)
+        logger.warning("No storage backend configured - set the DB_* variables or STORAGE_BACKEND=sqlite")
+    return False
+
+async def prepare_schema():
+    """Run init_db until it succeeds, backing off while the database is unreachable"""
+    delay = 1.0
+    while not await run_db(init_db):
+        if not DB_ENABLED:
+            return
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30.0)
 
 # Add ShirtOrder model
 class ShirtOrder(BaseModel):
@@ -298,47 +323,685 @@ class ShirtOrder(BaseModel):
     定制顾问: Optional[str] = None
     定制金额: Optional[float] = None
 
+    @field_validator('*')
+    @classmethod
+    def fits_column(cls, value, info):
+        """Reject numbers and text longer than the column's SQL type holds"""
+        limit = COLUMN_LIMITS.get(info.field_name)
+        if value is None or limit is None:
+            return value
+        if isinstance(value, str):
+            if len(value) > limit:
+                raise ValueError(f"不能超过 {limit} 个字符")
+        elif abs(value) >= limit:
+            raise ValueError(f"必须小于 {limit}")
+        return value
+
+    @field_validator(*DATE_COLUMNS)
+    @classmethod
+    def iso_date(cls, value):
+        """Store dates as YYYY-MM-DD whatever form SQL Server would accept them in"""
+        if value is None or not value.strip():
+            return None
+        return parse_date(value).isoformat()
+
+class ShirtOrderEdit(ShirtOrder):
+    """An edited grid row: the order id plus the fields that changed"""
+    id: int
+    姓名: Optional[str] = None
+
+class BulkUpdateRequest(BaseModel):
+    """Body of POST /api/shirt-orders/bulk-update"""
+    editedOrders: List[ShirtOrderEdit] = []
+    newOrders: List[ShirtOrder] = []
+    deletedOrders: List[StrictInt] = []
+
+# -------------------------
+# DATA ACCESS (blocking, run on the DB executor)
+# -------------------------
+
+# Keyset pagination settings for the order list
+MAX_PAGE_SIZE = 1000
+SORT_KEYS = ("id", "下单日期")
+
+def parse_fields(fields):
+    """Validate a comma-separated ?fields= projection against TABLE_COLUMNS"""
+    if not fields:
+        return list(TABLE_COLUMNS.keys())
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in TABLE_COLUMNS]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(unknown)}")
+    # id is always returned so rows can be keyed and paged
+    return list(dict.fromkeys(['id'] + requested))
+
+def encode_cursor(sort_key, sort_value, order_id):
+    """Encode the last row's sort key and id as an opaque page cursor"""
+    if isinstance(sort_value, datetime.date):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_key, sort_value, order_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, sort_key):
+    """Decode a page cursor back into (sort_value, order_id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_key, sort_value, order_id = json.loads(base64.urlsafe_b64decode(padded))
+        order_id = int(order_id)
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if cursor_key != sort_key:
+        raise ValueError("分页游标与排序字段不匹配")
+    return sort_value, order_id
+
+def keyset_predicate(sort_key, descending, sort_value, order_id):
+    """Build the WHERE clause selecting rows after the cursor position.
+
+    SQL Server sorts NULLs first ascending and last descending, so rows with a
+    NULL sort key are handled explicitly to keep every row reachable.
+    """
+    op = '<' if descending else '>'
+    if sort_key == 'id':
+        return f"id {op} ?", [order_id]
+    if sort_value is None:
+        if descending:
+            return f"({sort_key} IS NULL AND id < ?)", [order_id]
+        return f"(({sort_key} IS NULL AND id > ?) OR {sort_key} IS NOT NULL)", [order_id]
+    # The leading inclusive bound lets the (sort_key, id) index seek to the cursor
+    clause = f"({sort_key} {op}= ? AND ({sort_key} {op} ? OR id {op} ?))"
+    if descending:
+        clause = f"({clause} OR {sort_key} IS NULL)"
+    return clause, [sort_value, sort_value, order_id]
+
+def execute_versioned(cursor, sql, params=()):
+    """Run ``sql`` in one batch after SYNC_VERSION and return the (token, dbts) pair.
+
+    The cursor is left positioned on the result set of ``sql``.
+    """
+    cursor.execute(f"{statements.SYNC_VERSION}; {sql}", params)
+    version = tuple(cursor.fetchone())
+    cursor.nextset()
+    return version
+
+def fetch_sync_version():
+    """Return the current (sync token, @@DBTS) pair used for ETags"""
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(statements.SYNC_VERSION)
+        return tuple(cursor.fetchone())
+
+def parse_sync_token(token):
+    """Validate a ?since= sync token"""
+    try:
+        value = int(token)
+    except (TypeError, ValueError):
+        raise ValueError("无效的同步令牌")
+    if value < 0:
+        raise ValueError("无效的同步令牌")
+    return value
+
+def fetch_shirt_orders_since(columns, since):
+    """Fetch rows changed and ids deleted since ``since``; returns (rows, deleted_ids, version)"""
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(statements.changes_since(columns), (since,))
+        version = tuple(cursor.fetchone())
+        cursor.nextset()
+        rows = [tuple(row) for row in cursor.fetchall()]
+        cursor.nextset()
+        deleted_ids = [row[0] for row in cursor.fetchall()]
+    return rows, deleted_ids, version
+
+def fetch_shirt_orders_page(columns, limit, sort_key="id", descending=False, after=None):
+    """Fetch one keyset page of orders after the decoded cursor position.
+
+    Returns ``(rows, next_cursor, version)`` with row tuples in ``columns``
+    order; ``next_cursor`` is None on the last page.
+    """
+    select_columns = columns if sort_key in columns else columns + [sort_key]
+    direction = 'DESC' if descending else 'ASC'
+    order_clause = f"id {direction}" if sort_key == 'id' else f"{sort_key} {direction}, id {direction}"
+    
+    where, where_params = keyset_predicate(sort_key, descending, *after) if after is not None else ("", [])
+    
+    # Fetch one extra row to learn whether another page follows
+    replicated = read_replica.query(select_columns, where, where_params, order_clause, limit + 1)
+    if replicated is not None:
+        rows, version = replicated
+    else:
+        sql = f"SELECT TOP (?) {', '.join(select_columns)} FROM {TABLE_NAME}"
+        if where:
+            sql += f" WHERE {where}"
+        sql += f" ORDER BY {order_clause}"
+        with get_pool().connection() as conn:
+            db_cursor = conn.cursor()
+            version = execute_versioned(db_cursor, sql, [limit + 1] + where_params)
+            rows = db_cursor.fetchall()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_key, last[select_columns.index(sort_key)], last[0])
+    width = len(columns)
+    return [tuple(row[:width]) for row in rows], next_cursor, version
+
+def fetch_shirt_orders(columns=None):
+    """Fetch all shirt orders as row tuples in ``columns`` order; returns (rows, version)"""
+    replicated = read_replica.query(columns or statements.ORDER_COLUMNS)
+    if replicated is not None:
+        return replicated
+    if columns and columns != statements.ORDER_COLUMNS:
+        sql = f'SELECT {", ".join(columns)} FROM {TABLE_NAME}'
+    else:
+        sql = statements.SELECT_ALL
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        version = execute_versioned(cursor, sql)
+        rows = [tuple(row) for row in cursor.fetchall()]
+    return rows, version
+
+def fetch_order_query(query):
+    """Run a compiled order_query.OrderQuery; returns (rows, total, version).
+
+    ``total`` is None unless the query asked for it. Runs on the database,
+    whose indexes serve the pushed-down filters and sort.
+    """
+    sql, params = query.sql(TABLE_NAME)
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        version = execute_versioned(cursor, sql, params)
+        total = None
+        if query.with_total:
+            total = cursor.fetchone()[0]
+            cursor.nextset()
+        rows = [tuple(row) for row in cursor.fetchall()]
+    return rows, total, version
+
+def load_order_snapshot():
+    """Loader for the shared order cache: (columns, row tuples, version) of the whole table"""
+    replicated = read_replica.query(statements.ORDER_COLUMNS)
+    if replicated is not None:
+        return statements.ORDER_COLUMNS, replicated[0], replicated[1]
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        version = execute_versioned(cursor, statements.SELECT_ALL)
+        rows = [tuple(row) for row in cursor.fetchall()]
+    return statements.ORDER_COLUMNS, rows, version
+
+# Full order list shared by every worker process; writes invalidate it
+order_cache = SharedOrderCache()
+
+# Identical reads in flight at the same time share one database call
+read_flights = SingleFlight()
+
+# Seconds between delta refreshes of the customer search index
+CUSTOMER_SEARCH_REFRESH = float(os.getenv('CUSTOMER_SEARCH_REFRESH', '5'))
+customer_index = CustomerIndex()
+_customer_index_lock = threading.Lock()
+_customer_index_refreshed_at = 0.0
+
+def refresh_customer_index():
+    """Build the customer index on first use, then apply row_version deltas when due"""
+    global _customer_index_refreshed_at
+    with _customer_index_lock:
+        if customer_index.sync_token is None:
+            snapshot = order_cache.get(load_order_snapshot)
+            customer_index.load(snapshot.rows, snapshot.db_version[0])
+        elif time.monotonic() - _customer_index_refreshed_at >= CUSTOMER_SEARCH_REFRESH:
+            rows, deleted_ids, version = fetch_shirt_orders_since(statements.ORDER_COLUMNS, customer_index.sync_token)
+            customer_index.apply(rows, deleted_ids, version[0])
+        else:
+            return
+        _customer_index_refreshed_at = time.monotonic()
+
+def warm_up():
+    """Open the pool's minimum connections and load the order cache and customer index.
+
+    Run by serve.py before a worker accepts requests, so its first requests
+    do not pay for connecting and loading.
+    """
+    if not DB_ENABLED:
+        return
+    started = time.perf_counter()
+    try:
+        get_pool().open()
+        if ORDER_CACHE_ENABLED:
+            order_cache.get(load_order_snapshot)
+        refresh_customer_index()
+    except Exception as e:
+        logger.error("Warm-up failed, serving cold: %s", e)
+        return
+    logger.info("Worker warmed up in %.0f ms", (time.perf_counter() - started) * 1000)
+
+def mark_customer_index_stale():
+    """Make the next search pick up this worker's writes"""
+    global _customer_index_refreshed_at
+    _customer_index_refreshed_at = 0.0
+
+def search_customers(query, limit):
+    """Search customers by partial 姓名 or 电话; returns the latest order of each match"""
+    refresh_customer_index()
+    customers = []
+    for customer, match in customer_index.search(query, limit):
+        latest = dict(zip(statements.ORDER_COLUMNS, customer.latest))
+        customers.append({
+            "姓名": latest["姓名"],
+            "电话": latest["电话"],
+            "order_count": len(customer.order_ids),
+            "match": match,
+            "latest_order": latest
+        })
+    return customers
+
+# Rows fetched per round trip when streaming an export
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '500'))
+EXPORT_DATE_FIELDS = ("下单日期", "到店交付日期", "实际交付日期")
+# Exports streaming at once per worker; kept below the pool size so slow
+# download clients can never occupy every connection
+EXPORT_MAX_CONCURRENT = int(os.getenv('EXPORT_MAX_CONCURRENT', str(max(1, POOL_MAX_SIZE - 1))))
+_export_slots = None
+
+def export_slots():
+    """Semaphore limiting this worker's concurrent exports, created on the running loop"""
+    global _export_slots
+    if _export_slots is None:
+        _export_slots = asyncio.Semaphore(EXPORT_MAX_CONCURRENT)
+    return _export_slots
+
+def fetch_export_batch(columns, date_field="下单日期", start_date=None, end_date=None, after_id=0,
+                       batch_size=EXPORT_BATCH_SIZE):
+    """Fetch the next batch of order rows with id > ``after_id``, in id order.
+
+    Each batch borrows a pooled connection only for its own query, so a
+    client reading the stream slowly holds no connection in between.
+    Returns ``(rows, last_id)``; rows are in ``columns`` order.
+    """
+    select_columns = columns if "id" in columns else columns + ["id"]
+    conditions = ["id > ?"]
+    params = [batch_size, after_id]
+    if start_date is not None:
+        conditions.append(f"{date_field} >= ?")
+        params.append(start_date)
+    if end_date is not None:
+        conditions.append(f"{date_field} <= ?")
+        params.append(end_date)
+    sql = (
+        f"SELECT TOP (?) {', '.join(select_columns)} FROM {TABLE_NAME} "
+        f"WHERE {' AND '.join(conditions)} ORDER BY id"
+    )
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    if not rows:
+        return [], after_id
+    id_index = select_columns.index("id")
+    last_id = rows[-1][id_index]
+    width = len(columns)
+    return [tuple(row[:width]) for row in rows], last_id
+
+def encode_ndjson_batch(columns, rows):
+    """Encode a batch of rows as newline-delimited JSON objects"""
+    lines = [
+        json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=columnar.json_default)
+        for row in rows
+    ]
+    return ("\n".join(lines) + "\n").encode('utf-8')
+
+def encode_csv_batch(columns, rows, header=False):
+    """Encode a batch of rows as CSV, optionally preceded by the header line"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow([
+            value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else value
+            for value in row
+        ])
+    return buffer.getvalue().encode('utf-8')
+
+def fetch_orders_by_day(start_date, end_date):
+    """Count orders placed (下单日期) and delivered (实际交付日期) per day in one round trip"""
+    sql = f"""
+        SELECT 'input' AS kind, 下单日期 AS day, COUNT(*) AS total
+        FROM {TABLE_NAME}
+        WHERE 下单日期 >= ? AND 下单日期 <= ?
+        GROUP BY 下单日期
+        UNION ALL
+        SELECT 'finish' AS kind, 实际交付日期 AS day, COUNT(*) AS total
+        FROM {TABLE_NAME}
+        WHERE 实际交付日期 >= ? AND 实际交付日期 <= ?
+        GROUP BY 实际交付日期
+    """
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, (start_date, end_date, start_date, end_date))
+        rows = cursor.fetchall()
+    
+    # Zero-fill every day in the range so the chart has no gaps
+    counts = {}
+    day = start_date
+    while day <= end_date:
+        counts[day.isoformat()] = {"date": day.isoformat(), "inputCount": 0, "finishCount": 0}
+        day += datetime.timedelta(days=1)
+    for kind, day, total in rows:
+        key = day.isoformat() if isinstance(day, datetime.date) else str(day)[:10]
+        if key in counts:
+            counts[key]["inputCount" if kind == 'input' else "finishCount"] = total
+    return list(counts.values())
+
+def fetch_upcoming_due_orders(start_date, end_date):
+    """Fetch orders whose 到店交付日期 falls within the given date range"""
+    sql = f"""
+        SELECT id, 姓名, 电话, 到店交付日期
+        FROM {TABLE_NAME}
+        WHERE 到店交付日期 >= ? AND 到店交付日期 <= ?
+        ORDER BY 到店交付日期, id
+    """
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, (start_date, end_date))
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def fetch_daily_summary(start_date, end_date):
+    """Per-day order, garment and revenue totals read from the daily rollup"""
+    quantities = ", ".join(f"SUM({qty}) AS {qty}" for qty in rollups.ROLLUP_QUANTITIES)
+    sql = f"""
+        SELECT day, SUM(order_count) AS order_count, {quantities},
+               SUM({rollups.ROLLUP_AMOUNT}) AS {rollups.ROLLUP_AMOUNT}
+        FROM {rollups.ROLLUP_TABLE}
+        WHERE day >= ? AND day <= ?
+        GROUP BY day
+        ORDER BY day
+    """
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, (start_date, end_date))
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def fetch_consultant_performance(start_date, end_date):
+    """Per-consultant (定制顾问) totals read from the daily rollup"""
+    quantities = ", ".join(f"SUM({qty}) AS {qty}" for qty in rollups.ROLLUP_QUANTITIES)
+    sql = f"""
+        SELECT 定制顾问, SUM(order_count) AS order_count, {quantities},
+               SUM({rollups.ROLLUP_AMOUNT}) AS {rollups.ROLLUP_AMOUNT}
+        FROM {rollups.ROLLUP_TABLE}
+        WHERE day >= ? AND day <= ?
+        GROUP BY 定制顾问
+        ORDER BY SUM({rollups.ROLLUP_AMOUNT}) DESC
+    """
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, (start_date, end_date))
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def insert_shirt_order(order):
+    """Insert a single validated ShirtOrder and return its new id"""
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        
+        # Always insert every writable column so all creates share one statement
+        values = [getattr(order, col, None) for col in statements.WRITABLE_COLUMNS]
+        cursor.execute(statements.INSERT_ORDER, values)
+        
+        # Get the ID of the new order (using SCOPE_IDENTITY())
+        cursor.execute("SELECT SCOPE_IDENTITY()")
+        order_id = cursor.fetchone()[0]
+        
+        # Keep the daily rollup in step within the same transaction
+        delta = rollups.RollupDelta()
+        delta.add(order.model_dump())
+        delta.apply(cursor)
+        
+        conn.commit()
+        return order_id
+
+# Edit batches up to this size are applied with per-shape UPDATE statements
+# instead of a temp-table stage, which costs three extra round trips
+SMALL_EDIT_BATCH = int(os.getenv('SMALL_EDIT_BATCH', '20'))
+
+def apply_bulk_update(edited_orders, new_orders, deleted_orders):
+    """Apply deletes, edits and inserts from the order grid in one transaction.
+
+    Each phase is set-based: deletes are one ``IN`` list per 2000 ids, and
+    edits and inserts are bulk-loaded into temp tables with
+    ``fast_executemany`` and applied with a single joined UPDATE / MERGE.
+    Small edit batches skip the stage and run one ``executemany`` per
+    column-mask shape. Returns the new order ids (in request order) and
+    per-phase timings.
+    """
+    timings = {}
+    valid_fields = statements.WRITABLE_COLUMNS
+    deleted_ids = [int(order_id) for order_id in deleted_orders]
+    
+    # A repeated id keeps its last edit; rows with no non-null fields are
+    # skipped, as before
+    latest_edits = {int(order['id']): order for order in edited_orders}
+    edit_rows = []
+    for order_id, order in latest_edits.items():
+        values = [order.get(field) for field in valid_fields]
+        if any(value is not None for value in values):
+            edit_rows.append([order_id] + values)
+    insert_rows = []
+    for order in new_orders:
+        values = [order.get(field) for field in valid_fields]
+        if any(value is not None for value in values):
+            insert_rows.append([len(insert_rows)] + values)
+    
+    inserted_ids = []
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.fast_executemany = True
+        
+        # Capture the current state of touched orders so the daily rollup
+        # can be adjusted incrementally in the same transaction
+        started = time.perf_counter()
+        delta = rollups.RollupDelta()
+        previous = rollups.fetch_rollup_sources(
+            cursor, deleted_ids + [row[0] for row in edit_rows]
+        )
+        for order_id in deleted_ids:
+            if order_id in previous:
+                delta.remove(previous[order_id])
+        for order_id, order in latest_edits.items():
+            old = previous.get(order_id)
+            if old is not None:
+                delta.remove(old)
+                delta.add({**old, **{k: v for k, v in order.items() if k in old and v is not None}})
+        for order in new_orders:
+            delta.add(order)
+        timings["snapshot"] = time.perf_counter() - started
+        
+        # Handle deleted orders: one IN list per chunk of ids
+        started = time.perf_counter()
+        for start in range(0, len(deleted_ids), statements.MAX_SQL_PARAMS):
+            cursor.execute(*statements.delete_in(deleted_ids[start:start + statements.MAX_SQL_PARAMS]))
+        timings["delete"] = time.perf_counter() - started
+        
+        # Handle edited orders: stage all rows, then one joined UPDATE. NULL
+        # staged values keep the current column value, matching the grid's
+        # "only send what changed" payloads
+        started = time.perf_counter()
+        if 0 < len(edit_rows) <= SMALL_EDIT_BATCH:
+            shapes = {}
+            for order_id in (row[0] for row in edit_rows):
+                order = latest_edits[order_id]
+                mask = statements.column_mask(order)
+                shapes.setdefault(mask, []).append(
+                    [order[col] for col in statements.mask_columns(mask)] + [order_id]
+                )
+            for mask, params in shapes.items():
+                cursor.executemany(statements.update_statements.get(mask), params)
+        elif edit_rows:
+            cursor.execute(statements.CREATE_EDIT_STAGE)
+            cursor.executemany(statements.LOAD_EDIT_STAGE, edit_rows)
+            cursor.execute(statements.APPLY_EDIT_STAGE)
+        timings["update"] = time.perf_counter() - started
+        
+        # Handle new orders: stage all rows, then one MERGE whose OUTPUT maps
+        # each staged row (seq) to its new identity value
+        started = time.perf_counter()
+        if insert_rows:
+            cursor.execute(statements.CREATE_INSERT_STAGE)
+            cursor.executemany(statements.LOAD_INSERT_STAGE, insert_rows)
+            cursor.execute(statements.APPLY_INSERT_STAGE)
+            inserted_ids = [order_id for _, order_id in sorted(cursor.fetchall())]
+            cursor.execute(statements.DROP_INSERT_STAGE)
+        timings["insert"] = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        delta.apply(cursor)
+        conn.commit()
+        timings["commit"] = time.perf_counter() - started
+    
+    logger.info("Bulk update applied: %s deleted, %s updated, %s inserted",
+                len(deleted_ids), len(edit_rows), len(inserted_ids))
+    return {
+        "inserted_ids": inserted_ids,
+        "deleted": len(deleted_ids),
+        "updated": len(edit_rows),
+        "inserted": len(inserted_ids),
+        "timings_ms": {phase: round(seconds * 1000, 2) for phase, seconds in timings.items()}
+    }
+
+# Uploads up to this many bytes are spooled in memory, larger ones to a temp file
+IMPORT_SPOOL_SIZE = int(os.getenv('IMPORT_SPOOL_SIZE', str(8 * 1024 * 1024)))
+
+def import_orders_file(file, dry_run=False):
+    """Import a CSV/.xlsx file object through ShirtOrder; returns the import report"""
+    if dry_run:
+        return order_import.import_file(file, ShirtOrder)
+    with get_pool().connection() as conn:
+        return order_import.import_file(file, ShirtOrder, conn)
+
 # -------------------------
 # THREE MAIN API ENDPOINTS
 # -------------------------
 
 # 1. GET shirt orders
+def make_etag(version, request):
+    """Weak ETag from the change-tracking version and the normalized query string"""
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    return f'W/"{version[0]}.{version[1]}.{zlib.crc32(query.encode("utf-8")):08x}"'
+
 @app.get("/api/shirt-orders")
-async def get_shirt_orders():
-    """Get all shirt orders"""
-    if USE_SQLSERVER:
+async def get_shirt_orders(request: Request, fields: Optional[str] = None, limit: Optional[int] = None,
+                           cursor: Optional[str] = None, order_by: str = "id", order: str = "asc",
+                           since: Optional[str] = None, format: str = "json"):
+    """Get shirt orders.
+
+    Without parameters every order is returned with all columns. ``fields``
+    restricts the columns, and ``limit``/``cursor`` page through the table
+    by ``order_by`` (``id`` or ``下单日期``) using keyset pagination.
+    ``since`` takes the ``sync_token`` of an earlier response and returns
+    only rows changed since then plus the ids of deleted rows. Responses
+    carry an ETag and honour If-None-Match. ``format=columnar`` replaces
+    ``orders`` with a ``columnar`` payload (see columnar.py).
+    """
+    if DB_ENABLED:
         try:
-            conn = get_db_connection()
-            if conn is None:
+            try:
+                columns = parse_fields(fields)
+                if order_by not in SORT_KEYS:
+                    raise ValueError(f"不支持的排序字段: {order_by}")
+                if order not in ("asc", "desc"):
+                    raise ValueError(f"不支持的排序方向: {order}")
+                if since is not None and (limit is not None or cursor is not None):
+                    raise ValueError("since 不能与分页参数同时使用")
+                since_token = parse_sync_token(since) if since is not None else None
+                if cursor is not None and limit is None:
+                    limit = MAX_PAGE_SIZE
+                if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+                    raise ValueError(f"limit 必须在 1 到 {MAX_PAGE_SIZE} 之间")
+                after = decode_cursor(cursor, order_by) if cursor else None
+                if format not in ("json", "columnar"):
+                    raise ValueError(f"不支持的格式: {format}")
+            except ValueError as e:
                 return {
                     "success": False,
-                    "message": "无法连接到数据库",
+                    "message": str(e),
                     "orders": [],
                     "count": 0
                 }
-                
-            cursor = conn.cursor()
-            cursor.execute(f'SELECT * FROM {TABLE_NAME}')
-            
-            columns = [column[0] for column in cursor.description]
-            orders = []
             
-            for row in cursor.fetchall():
-                # Convert row to dict
-                order_dict = {}
-                for i, value in enumerate(row):
-                    order_dict[columns[i]] = value
-                orders.append(order_dict)
+            if_none_match = request.headers.get("if-none-match")
+            snapshot = None
+            if since_token is None and limit is None and ORDER_CACHE_ENABLED:
+                # Full list: served from the shared cache, which also knows its version
+                snapshot = order_cache.peek() or await read_flights.run(order_cache.get, load_order_snapshot)
+                etag = make_etag(snapshot.db_version, request)
+                if if_none_match == etag:
+                    return Response(status_code=304, headers={"ETag": etag})
+            elif if_none_match:
+                # Cheap version probe first when the client already holds a copy
+                etag = make_etag(await read_flights.run(fetch_sync_version), request)
+                if if_none_match == etag:
+                    return Response(status_code=304, headers={"ETag": etag})
             
-            conn.close()
+            # Rows stay tuples (``positions`` indexes them when the cached
+            # snapshot is wider than ``columns``) until they are encoded
+            positions = None
+            if snapshot is not None:
+                rows = snapshot.rows
+                positions = snapshot.positions(columns)
+                version = snapshot.db_version
+                result = {
+                    "success": True,
+                    "orders": rows,
+                    "count": len(rows)
+                }
+            elif since_token is not None:
+                rows, deleted_ids, version = await read_flights.run(fetch_shirt_orders_since, columns, since_token)
+                result = {
+                    "success": True,
+                    "orders": rows,
+                    "deleted": deleted_ids,
+                    "count": len(rows),
+                    "incremental": True
+                }
+            elif limit is None:
+                rows, version = await read_flights.run(fetch_shirt_orders, columns)
+                result = {
+                    "success": True,
+                    "orders": rows,
+                    "count": len(rows)
+                }
+            else:
+                rows, next_cursor, version = await read_flights.run(
+                    fetch_shirt_orders_page, columns, limit, order_by, order == "desc", after
+                )
+                result = {
+                    "success": True,
+                    "orders": rows,
+                    "count": len(rows),
+                    "next_cursor": next_cursor,
+                    "has_more": next_cursor is not None
+                }
+            result["sync_token"] = str(version[0])
+            headers = {"ETag": make_etag(version, request)}
+            if format == "columnar":
+                result["columnar"] = columnar.encode_columnar(columns, result.pop("orders"), positions)
+                # Columnar payloads hold only JSON-native values already
+                return JSONResponse(content=result, headers=headers)
+            # Same bytes as JSONResponse(jsonable_encoder(...)) with dict rows
+            body = row_json.render(result, "orders", columns, rows, positions)
+            return Response(content=body, media_type="application/json", headers=headers)
+        except PoolError as e:
+            logger.error("Error fetching shirt orders from database: %s", e)
             return {
-                "success": True,
-                "orders": orders,
-                "count": len(orders)
+                "success": False,
+                "message": "无法连接到数据库",
+                "orders": [],
+                "count": 0
             }
         except Exception as e:
-            print(f"Error fetching shirt orders from SQL Server: {str(e)}", file=sys.stderr)
-            print(traceback.format_exc(), file=sys.stderr)
+            logger.exception("Error fetching shirt orders from database: %s", e)
             return {
                 "success": False,
                 "message": f"获取订单失败: {str(e)}",
@@ -357,52 +1020,30 @@ async def get_shirt_orders():
 @app.post("/api/shirt-orders")
 async def create_shirt_order(order: ShirtOrder):
     """Create a new shirt order"""
-    if USE_SQLSERVER:
+    if DB_ENABLED:
         try:
-            conn = get_db_connection()
-            if conn is None:
-                return {
-                    "success": False,
-                    "message": "无法连接到数据库"
-                }
-                
-            cursor = conn.cursor()
-            
-            # Get all columns except 'id' which is auto-generated
-            columns = [col for col in TABLE_COLUMNS.keys() if col != 'id']
-            
-            # Build SQL dynamically
-            sql = f'''INSERT INTO {TABLE_NAME} (
-                        {', '.join(columns)}
-                    ) VALUES (
-                        {', '.join(['?'] * len(columns))}
-                    )'''
-                    
-            # Extract values in the same order as columns
-            values = []
-            for col in columns:
-                values.append(getattr(order, col, None))
-            
-            cursor.execute(sql, values)
-            conn.commit()
-            
-            # Get the ID of the new order (using SCOPE_IDENTITY())
-            cursor.execute("SELECT SCOPE_IDENTITY()")
-            order_id = cursor.fetchone()[0]
-            
-            conn.close()
+            order_id = await run_db(insert_shirt_order, order)
+            analytics_cache.clear()
+            read_flights.invalidate()
+            if read_replica.enabled:
+                # Read-your-writes: pull this change before readers are sent to the replica
+                await run_db(read_replica.sync)
+            order_cache.invalidate()
+            mark_customer_index_stale()
             
             return {
                 "success": True,
                 "message": "衬衫订单创建成功",
                 "order_id": order_id
             }
+        except PoolError as e:
+            logger.error("Error creating shirt order in database: %s", e)
+            return {
+                "success": False,
+                "message": "无法连接到数据库"
+            }
         except Exception as e:
-            print(f"Error creating shirt order in SQL Server: {str(e)}", file=sys.stderr)
-            print(traceback.format_exc(), file=sys.stderr)
-            if 'conn' in locals() and conn:
-                conn.rollback()
-                conn.close()
+            logger.exception("Error creating shirt order in database: %s", e)
             return {
                 "success": False,
                 "message": f"创建订单失败: {str(e)}"
@@ -417,7 +1058,7 @@ async def create_shirt_order(order: ShirtOrder):
 @app.post("/api/shirt-orders/bulk-update")
 async def bulk_update_shirt_orders(request: Request):
     """Bulk update for shirt orders - handles update, create, and delete operations"""
-    if not USE_SQLSERVER:
+    if not DB_ENABLED:
         return {
             "success": False,
             "message": "数据库连接配置不完整，请检查环境变量"
@@ -425,86 +1066,514 @@ async def bulk_update_shirt_orders(request: Request):
         
     try:
         # Parse request body manually
-        request_data = await request.json()
+        try:
+            request_data = await request.json()
+        except ValueError:
+            request_data = None
+        if not isinstance(request_data, dict):
+            return JSONResponse(status_code=400, content={
+                "success": False,
+                "message": "订单数据无效: 请求体必须是 JSON 对象"
+            })
+        
+        # Validate through the same model as single creates, so a bad value
+        # is rejected here instead of being stored; edits keep only the
+        # fields that were sent, and deletes must be integer ids
+        try:
+            body = BulkUpdateRequest.model_validate(request_data)
+        except ValidationError as e:
+            return JSONResponse(status_code=400, content={
+                "success": False,
+                "message": f"订单数据无效: {e}"
+            })
+        edited_orders = [order.model_dump(exclude_unset=True) for order in body.editedOrders]
+        new_orders = [order.model_dump() for order in body.newOrders]
+        deleted_orders = body.deletedOrders
         
-        edited_orders = request_data.get('editedOrders', [])
-        new_orders = request_data.get('newOrders', [])
-        deleted_orders = request_data.get('deletedOrders', [])
+        logger.info("Processing bulk update: %s edits, %s new, %s deleted",
+                    len(edited_orders), len(new_orders), len(deleted_orders))
         
-        print(f"Processing bulk update: {len(edited_orders)} edits, {len(new_orders)} new, {len(deleted_orders)} deleted", file=sys.stderr)
+        result = await run_db(apply_bulk_update, edited_orders, new_orders, deleted_orders)
+        analytics_cache.clear()
+        read_flights.invalidate()
+        if read_replica.enabled:
+            # Read-your-writes: pull this change before readers are sent to the replica
+            await run_db(read_replica.sync)
+        order_cache.invalidate()
+        mark_customer_index_stale()
         
-        conn = get_db_connection()
-        if conn is None:
+        return {
+            "success": True,
+            "message": "Shirt orders updated successfully",
+            **result
+        }
+    except PoolError as e:
+        logger.error("Error in bulk update of shirt orders: %s", e)
+        return {
+            "success": False,
+            "message": "无法连接到数据库"
+        }
+    except Exception as e:
+        logger.exception("Error in bulk update of shirt orders: %s", e)
+        return {
+            "success": False,
+            "message": f"Error updating shirt orders: {str(e)}"
+        }
+
+# 4. EXPORT shirt orders as a stream
+@app.get("/api/shirt-orders/export")
+async def export_shirt_orders(format: str = "ndjson", fields: Optional[str] = None,
+                              date_field: str = "下单日期", start: Optional[str] = None,
+                              end: Optional[str] = None):
+    """Stream shirt orders as NDJSON or CSV in fetchmany batches.
+
+    ``start``/``end`` (YYYY-MM-DD, inclusive) filter on ``date_field``.
+    Memory use is bounded by EXPORT_BATCH_SIZE regardless of table size.
+    Batches are read by id, so rows changed during a long export may be
+    seen in their old or new state. At most EXPORT_MAX_CONCURRENT exports
+    stream at once per worker; beyond that the request gets a 503.
+    """
+    if not DB_ENABLED:
+        return {
+            "success": False,
+            "message": "数据库连接配置不完整，请检查环境变量"
+        }
+    
+    try:
+        columns = parse_fields(fields)
+        if format not in ("ndjson", "csv"):
+            raise ValueError(f"不支持的导出格式: {format}")
+        if date_field not in EXPORT_DATE_FIELDS:
+            raise ValueError(f"不支持的日期字段: {date_field}")
+        start_date = datetime.date.fromisoformat(start) if start else None
+        end_date = datetime.date.fromisoformat(end) if end else None
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={
+            "success": False,
+            "message": f"导出参数无效: {str(e)}"
+        })
+    
+    slots = export_slots()
+    if slots.locked():
+        return JSONResponse(status_code=503, content={
+            "success": False,
+            "message": "导出任务过多，请稍后重试"
+        })
+    # Reserve the slot before responding: acquire() returns without waiting
+    # when the semaphore is not locked, so no request queues behind a full one
+    await slots.acquire()
+    released = False
+    
+    def release_slot():
+        nonlocal released
+        if not released:
+            released = True
+            slots.release()
+    
+    async def stream():
+        after_id = 0
+        first = True
+        try:
+            while True:
+                # Keyset batches by id: the connection goes back to the pool
+                # between batches while the client downloads
+                rows, after_id = await run_db(fetch_export_batch, columns, date_field, start_date, end_date,
+                                              after_id)
+                if not rows:
+                    break
+                if format == "csv":
+                    # BOM so Excel opens the Chinese headers as UTF-8
+                    prefix = "\ufeff".encode('utf-8') if first else b""
+                    yield prefix + encode_csv_batch(columns, rows, header=first)
+                else:
+                    yield encode_ndjson_batch(columns, rows)
+                first = False
+            if first and format == "csv":
+                yield "\ufeff".encode('utf-8') + encode_csv_batch(columns, [], header=True)
+        except Exception as e:
+            logger.exception("Error exporting shirt orders: %s", e)
+            raise
+        finally:
+            release_slot()
+    
+    if format == "csv":
+        media_type = "text/csv"
+    else:
+        media_type = "application/x-ndjson"
+    # The background task also runs when the client leaves before the
+    # stream starts, which would skip the generator's finally
+    return StreamingResponse(stream(), media_type=media_type, background=BackgroundTask(release_slot), headers={
+        "Content-Disposition": f'attachment; filename="{TABLE_NAME}.{format}"'
+    })
+
+# 5. IMPORT shirt orders from a spreadsheet
+@app.post("/api/shirt-orders/import")
+async def import_shirt_orders(request: Request, dry_run: bool = False):
+    """Import orders from a CSV (UTF-8) or .xlsx request body.
+
+    Headers are TABLE_COLUMNS names. Rows are validated and inserted in
+    chunks of IMPORT_CHUNK_SIZE; invalid rows are listed in ``errors``
+    and skipped. ``dry_run`` validates without inserting.
+    """
+    if not DB_ENABLED:
+        return {
+            "success": False,
+            "message": "数据库连接配置不完整，请检查环境变量"
+        }
+    
+    upload = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_SIZE)
+    try:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        upload.seek(0)
+        result = await run_db(import_orders_file, upload, dry_run)
+        if result["inserted"]:
+            analytics_cache.clear()
+            read_flights.invalidate()
+            if read_replica.enabled:
+                await run_db(read_replica.sync)
+            order_cache.invalidate()
+            mark_customer_index_stale()
+        if dry_run:
+            message = f"校验完成: {result['total'] - result['failed']} 条有效, {result['failed']} 条无效"
+        else:
+            message = f"导入完成: {result['inserted']} 条成功, {result['failed']} 条失败"
+        return {
+            "success": True,
+            "message": message,
+            **result
+        }
+    except order_import.ImportFormatError as e:
+        return JSONResponse(status_code=400, content={
+            "success": False,
+            "message": f"导入文件无效: {str(e)}"
+        })
+    except PoolError as e:
+        logger.error("Error importing shirt orders: %s", e)
+        return {
+            "success": False,
+            "message": "无法连接到数据库"
+        }
+    except Exception as e:
+        logger.exception("Error importing shirt orders: %s", e)
+        return {
+            "success": False,
+            "message": f"导入订单失败: {str(e)}"
+        }
+    finally:
+        upload.close()
+
+# 6. QUERY shirt orders with a filter/sort spec
+@app.post("/api/shirt-orders/query")
+async def query_shirt_orders(request: Request):
+    """Filter, sort and page orders in the database (spec format in order_query.py)"""
+    if not DB_ENABLED:
+        return {
+            "success": False,
+            "message": "数据库连接配置不完整，请检查环境变量",
+            "orders": [],
+            "count": 0
+        }
+    
+    try:
+        try:
+            query = order_query.compile_query(await request.json(), MAX_PAGE_SIZE)
+        except ValueError as e:
+            # json.JSONDecodeError is a ValueError too
             return {
                 "success": False,
-                "message": "无法连接到数据库"
+                "message": f"查询无效: {str(e)}",
+                "orders": [],
+                "count": 0
             }
-            
-        cursor = conn.cursor()
-        
-        # Handle deleted orders
-        if deleted_orders:
-            for order_id in deleted_orders:
-                cursor.execute(f"DELETE FROM {TABLE_NAME} WHERE id = ?", (order_id,))
-                print(f"Deleted shirt order with ID {order_id}", file=sys.stderr)
-        
-        # Handle edited orders
-        for order in edited_orders:
-            # Build update query dynamically based on provided fields
-            update_fields = []
-            update_values = []
-            
-            # Use TABLE_COLUMNS keys (except 'id') for valid field names
-            valid_fields = [col for col in TABLE_COLUMNS.keys() if col != 'id']
-            
-            for field in valid_fields:
-                if field in order and order[field] is not None:
-                    update_fields.append(f"{field} = ?")
-                    update_values.append(order[field])
-            
-            if update_fields:
-                update_values.append(order['id'])
-                query = f"UPDATE {TABLE_NAME} SET {', '.join(update_fields)} WHERE id = ?"
-                cursor.execute(query, update_values)
-                print(f"Updated shirt order {order['id']}", file=sys.stderr)
-        
-        # Handle new orders
-        for order in new_orders:
-            # Build insert query
-            field_names = []
-            placeholders = []
-            values = []
-            
-            # Use TABLE_COLUMNS keys (except 'id') for valid field names
-            valid_fields = [col for col in TABLE_COLUMNS.keys() if col != 'id']
-            
-            for field in valid_fields:
-                if field in order and order[field] is not None:
-                    field_names.append(field)
-                    placeholders.append('?')
-                    values.append(order[field])
-            
-            if field_names:
-                query = f"INSERT INTO {TABLE_NAME} ({', '.join(field_names)}) VALUES ({', '.join(placeholders)})"
-                cursor.execute(query, values)
-                print(f"Inserted new shirt order", file=sys.stderr)
-        
-        conn.commit()
-        conn.close()
         
+        rows, total, version = await read_flights.run(fetch_order_query, query, key=query.sql(TABLE_NAME))
+        has_more = len(rows) > query.limit
+        rows = rows[:query.limit]
+        result = {
+            "success": True,
+            "orders": rows,
+            "count": len(rows),
+            "has_more": has_more,
+            "next_offset": query.offset + query.limit if has_more else None,
+            "sync_token": str(version[0])
+        }
+        if total is not None:
+            result["total"] = total
+        body = row_json.render(result, "orders", query.columns, rows)
+        return Response(content=body, media_type="application/json")
+    except PoolError as e:
+        logger.error("Error querying shirt orders: %s", e)
+        return {
+            "success": False,
+            "message": "无法连接到数据库",
+            "orders": [],
+            "count": 0
+        }
+    except Exception as e:
+        logger.exception("Error querying shirt orders: %s", e)
         return {
+            "success": False,
+            "message": f"查询订单失败: {str(e)}",
+            "orders": [],
+            "count": 0
+        }
+
+# -------------------------
+# CUSTOMER SEARCH
+# -------------------------
+
+@app.get("/api/customers/search")
+async def search_customers_endpoint(q: str = "", limit: int = 20):
+    """Find returning customers by partial 姓名 or 电话.
+
+    Exact matches come first, then prefix and substring matches, each
+    ordered by the customer's most recent order. Every result carries that
+    order with its measurements.
+    """
+    if not DB_ENABLED:
+        return {
+            "success": False,
+            "message": "数据库连接配置不完整，请检查环境变量",
+            "customers": []
+        }
+    if not q.strip():
+        return {
+            "success": False,
+            "message": "请输入姓名或电话",
+            "customers": []
+        }
+    if not 1 <= limit <= 100:
+        return {
+            "success": False,
+            "message": "limit 必须在 1 到 100 之间",
+            "customers": []
+        }
+    
+    try:
+        started = time.perf_counter()
+        customers = await run_db(search_customers, q, limit)
+        return JSONResponse(content=jsonable_encoder({
             "success": True,
-            "message": "Shirt orders updated successfully"
+            "customers": customers,
+            "count": len(customers),
+            "took_ms": round((time.perf_counter() - started) * 1000, 3)
+        }))
+    except PoolError as e:
+        logger.error("Error searching customers: %s", e)
+        return {
+            "success": False,
+            "message": "无法连接到数据库",
+            "customers": []
         }
     except Exception as e:
-        print(f"Error in bulk update of shirt orders: {str(e)}", file=sys.stderr)
-        print(traceback.format_exc(), file=sys.stderr)
-        if 'conn' in locals() and conn:
-            conn.rollback()
-            conn.close()
+        logger.exception("Error searching customers: %s", e)
         return {
             "success": False,
-            "message": f"Error updating shirt orders: {str(e)}"
+            "message": f"搜索客户失败: {str(e)}",
+            "customers": []
+        }
+
+# -------------------------
+# ANALYTICS ENDPOINTS
+# -------------------------
+
+# Aggregates are small and tolerate slight staleness, so they are cached
+# briefly and dropped whenever this worker writes orders
+ANALYTICS_CACHE_TTL = float(os.getenv('ANALYTICS_CACHE_TTL', '30'))
+analytics_cache = TTLCache(ANALYTICS_CACHE_TTL)
+
+@app.get("/api/analytics/orders-by-day")
+async def get_orders_by_day(days: int = 30):
+    """Daily counts of input (下单日期) and finished (实际交付日期) orders over the last ``days`` days"""
+    if not DB_ENABLED:
+        return {
+            "success": False,
+            "message": "数据库连接配置不完整，请检查环境变量",
+            "days": []
+        }
+    if not 1 <= days <= 366:
+        return {
+            "success": False,
+            "message": "days 必须在 1 到 366 之间",
+            "days": []
+        }
+    
+    end_date = datetime.date.today()
+    start_date = end_date - datetime.timedelta(days=days)
+    cache_key = ("orders-by-day", start_date, end_date)
+    cached = analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        result = {
+            "success": True,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "days": await read_flights.run(fetch_orders_by_day, start_date, end_date)
+        }
+        analytics_cache.set(cache_key, result)
+        return result
+    except PoolError as e:
+        logger.error("Error aggregating orders by day: %s", e)
+        return {
+            "success": False,
+            "message": "无法连接到数据库",
+            "days": []
+        }
+    except Exception as e:
+        logger.exception("Error aggregating orders by day: %s", e)
+        return {
+            "success": False,
+            "message": f"统计订单失败: {str(e)}",
+            "days": []
+        }
+
+@app.get("/api/analytics/upcoming-due")
+async def get_upcoming_due_orders(days: int = 7):
+    """Orders whose 到店交付日期 is within the next ``days`` days"""
+    if not DB_ENABLED:
+        return {
+            "success": False,
+            "message": "数据库连接配置不完整，请检查环境变量",
+            "orders": [],
+            "count": 0
+        }
+    if not 0 <= days <= 366:
+        return {
+            "success": False,
+            "message": "days 必须在 0 到 366 之间",
+            "orders": [],
+            "count": 0
+        }
+    
+    start_date = datetime.date.today()
+    end_date = start_date + datetime.timedelta(days=days)
+    cache_key = ("upcoming-due", start_date, end_date)
+    cached = analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        orders = await read_flights.run(fetch_upcoming_due_orders, start_date, end_date)
+        result = {
+            "success": True,
+            "orders": orders,
+            "count": len(orders)
+        }
+        analytics_cache.set(cache_key, result)
+        return result
+    except PoolError as e:
+        logger.error("Error fetching upcoming due orders: %s", e)
+        return {
+            "success": False,
+            "message": "无法连接到数据库",
+            "orders": [],
+            "count": 0
+        }
+    except Exception as e:
+        logger.exception("Error fetching upcoming due orders: %s", e)
+        return {
+            "success": False,
+            "message": f"获取快到期订单失败: {str(e)}",
+            "orders": [],
+            "count": 0
+        }
+
+@app.get("/api/analytics/daily-summary")
+async def get_daily_summary(days: int = 30):
+    """Order count, garment quantities and 定制金额 per 下单日期 over the last ``days`` days"""
+    if not DB_ENABLED:
+        return {
+            "success": False,
+            "message": "数据库连接配置不完整，请检查环境变量",
+            "days": []
+        }
+    if not 1 <= days <= 3660:
+        return {
+            "success": False,
+            "message": "days 必须在 1 到 3660 之间",
+            "days": []
+        }
+    
+    end_date = datetime.date.today()
+    start_date = end_date - datetime.timedelta(days=days)
+    cache_key = ("daily-summary", start_date, end_date)
+    cached = analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        result = {
+            "success": True,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "days": await read_flights.run(fetch_daily_summary, start_date, end_date)
+        }
+        analytics_cache.set(cache_key, result)
+        return result
+    except PoolError as e:
+        logger.error("Error reading daily summary: %s", e)
+        return {
+            "success": False,
+            "message": "无法连接到数据库",
+            "days": []
+        }
+    except Exception as e:
+        logger.exception("Error reading daily summary: %s", e)
+        return {
+            "success": False,
+            "message": f"统计订单失败: {str(e)}",
+            "days": []
+        }
+
+@app.get("/api/analytics/consultant-performance")
+async def get_consultant_performance(start: Optional[str] = None, end: Optional[str] = None):
+    """Orders, garments and 定制金额 per 定制顾问 between ``start`` and ``end`` (default: last 30 days)"""
+    if not DB_ENABLED:
+        return {
+            "success": False,
+            "message": "数据库连接配置不完整，请检查环境变量",
+            "consultants": []
+        }
+    try:
+        end_date = datetime.date.fromisoformat(end) if end else datetime.date.today()
+        start_date = datetime.date.fromisoformat(start) if start else end_date - datetime.timedelta(days=30)
+    except ValueError as e:
+        return {
+            "success": False,
+            "message": f"日期格式无效: {str(e)}",
+            "consultants": []
+        }
+    
+    cache_key = ("consultant-performance", start_date, end_date)
+    cached = analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        result = {
+            "success": True,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "consultants": await read_flights.run(fetch_consultant_performance, start_date, end_date)
+        }
+        analytics_cache.set(cache_key, result)
+        return result
+    except PoolError as e:
+        logger.error("Error reading consultant performance: %s", e)
+        return {
+            "success": False,
+            "message": "无法连接到数据库",
+            "consultants": []
+        }
+    except Exception as e:
+        logger.exception("Error reading consultant performance: %s", e)
+        return {
+            "success": False,
+            "message": f"统计顾问业绩失败: {str(e)}",
+            "consultants": []
         }
 
 # Server info endpoint (utility)
@@ -518,24 +1587,110 @@ async def get_server_info(request: Request):
         "server_hostname": "8.153.205.171"
     }
 
+# Connection pool metrics endpoint (utility)
+@app.get("/api/db-pool/stats")
+async def get_db_pool_stats():
+    """Report this worker's connection pool occupancy and wait times"""
+    return {
+        "success": True,
+        "pid": os.getpid(),
+        "pool": get_pool().stats()
+    }
+
+# SQL statement registry metrics endpoint (utility)
+@app.get("/api/statements/stats")
+async def get_statement_stats():
+    """Report this worker's UPDATE statement-shape cache hits and misses"""
+    return {
+        "success": True,
+        "pid": os.getpid(),
+        "statements": statements.stats()
+    }
+
+# Shared order cache metrics endpoint (utility)
+@app.get("/api/order-cache/stats")
+async def get_order_cache_stats():
+    """Report this worker's order cache hit rate, memory footprint and staleness"""
+    return {
+        "success": True,
+        "pid": os.getpid(),
+        "cache": order_cache.stats()
+    }
+
+# Request coalescing metrics endpoint (utility)
+@app.get("/api/read-flights/stats")
+async def get_read_flight_stats():
+    """Report this worker's coalesced reads and the database calls they shared"""
+    return {
+        "success": True,
+        "pid": os.getpid(),
+        "flights": read_flights.stats()
+    }
+
+# Read replica metrics endpoint (utility)
+@app.get("/api/replica/stats")
+async def get_replica_stats():
+    """Report replica lag, sync throughput and how many reads it served"""
+    return {
+        "success": True,
+        "pid": os.getpid(),
+        "replica": await run_db(read_replica.stats)
+    }
+
+# Prometheus metrics endpoint, summed over all worker processes
+@app.get("/metrics")
+async def get_metrics():
+    """Request latency histograms, database time breakdown, rows and bytes in Prometheus text format"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# Liveness probe: the process is up and its event loop responds
+@app.get("/livez")
+async def livez():
+    return {"status": "ok"}
+
+# Readiness probe: the schema is current, so requests can be served. The
+# database connection itself is opened by the first request (or serve.py's
+# warm-up), so a load balancer can add the worker before it is warm
+@app.get("/readyz")
+async def readyz():
+    if not DB_ENABLED:
+        return JSONResponse(status_code=503, content={
+            "success": False,
+            "message": "数据库连接配置不完整，请检查环境变量"
+        })
+    if not schema_ready.is_set():
+        return JSONResponse(status_code=503, content={
+            "success": False,
+            "message": "数据库尚未就绪"
+        })
+    return {
+        "success": True,
+        "status": "ready",
+        "db_connections": get_pool().stats()["size"]
+    }
+
 # Home page endpoint for checking server status
 @app.get("/")
 async def root():
-    db_status = "Connected" if USE_SQLSERVER else "Not connected"
+    db_status = "Connected" if DB_ENABLED else "Not connected"
     return {
         "message": "API Server is running", 
         "status": "ok",
         "database": db_status,
-        "db_host": DB_HOST if USE_SQLSERVER else None
+        "db_backend": storage_backend.name if DB_ENABLED else None,
+        "db_host": DB_HOST if isinstance(storage_backend, storage.SqlServerBackend) else None
     }
 
 if __name__ == "__main__":
     host_ip = get_host_ip()
     port = 8889
     
-    print(f"Server will run at: http://{host_ip}:{port}")
-    print(f"Server will also be available at: http://localhost:{port}")
-    print(f"Starting server with host='0.0.0.0' to allow all incoming connections")
+    logger.info("Server will run at: http://%s:%s", host_ip, port)
+    logger.info("Server will also be available at: http://localhost:%s", port)
+    logger.info("Starting server with host='0.0.0.0' to allow all incoming connections")
     
+    import uvicorn
+
+    # Single process for development; production runs serve.py
     # Explicitly bind to all interfaces (0.0.0.0) to ensure accessibility
-    uvicorn.run(app, host="0.0.0.0", port=port, log_level="debug") 
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=port, log_level=app_logging.LOG_LEVEL.lower()) 
\ No newline at end of file
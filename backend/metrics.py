@@ -0,0 +1,506 @@
+import os
+import glob
+import json
+import time
+import atexit
+import bisect
+import threading
+import contextvars
+
+from order_cache import ORDER_CACHE_DIR, FileLock, ensure_private_directory, read_private_file, write_private_file
+import app_logging
+
+# Request and database metrics in Prometheus text format at GET /metrics.
+#
+# Each worker process counts in memory (one lock, a few dict updates per
+# request) and a background thread writes its totals to METRICS_DIR every
+# METRICS_FLUSH_INTERVAL seconds. A scrape, whichever worker serves it, sums
+# every worker's file, so counters cover all of serve.py's workers.
+# Totals of workers that have exited are folded into one file and kept, so
+# counters never go backwards while the directory lives. Worker files are
+# named by PID and process start time, so a new worker that reuses a PID
+# never adds to a dead worker's totals.
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(ORDER_CACHE_DIR, "metrics"))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+# Statements whose execute takes longer than this are logged as warnings
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '500'))
+
+# Starlette appends "; charset=utf-8" to text/* media types
+CONTENT_TYPE = "text/plain; version=0.0.4"
+PREFIX = "suit_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_PHASES = ("connect", "execute", "fetch", "commit")
+# Label used for database work done outside a request (replica sync, warm-up)
+BACKGROUND = "background"
+
+METRICS = {
+    "http_requests_total": ("counter", "HTTP requests by route, method and status"),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency by route"),
+    "http_response_bytes_total": ("counter", "Response body bytes sent, after compression"),
+    "db_seconds_total": ("counter", "Time spent in the database by route and phase"),
+    "db_queries_total": ("counter", "Statements executed by route"),
+    "db_rows_total": ("counter", "Rows fetched from the database by route"),
+    "db_slow_queries_total": ("counter", f"Statements slower than SLOW_QUERY_MS ({SLOW_QUERY_MS:g} ms)"),
+    "coalesced_reads_total": ("counter", "Reads served by another request's in-flight database call, by route"),
+}
+
+_DEAD_FILE = "exited.json"
+
+logger = app_logging.get_logger("metrics")
+slow_query_logger = app_logging.get_logger("slow_query")
+
+
+class RequestStats:
+    """Database time and rows of the request being served, summed by the instrumented cursors"""
+
+    __slots__ = ("scope", "seconds", "queries", "rows")
+
+    def __init__(self, scope=None):
+        self.scope = scope
+        self.seconds = dict.fromkeys(DB_PHASES, 0.0)
+        self.queries = 0
+        self.rows = 0
+
+
+# Set by MetricsMiddleware for the duration of a request; run_db copies the
+# context into the executor thread, so cursors there see it too
+_current = contextvars.ContextVar("metrics_request", default=None)
+
+
+class Registry:
+    """Counters and histograms of this worker process, mirrored to a file for the other workers"""
+
+    def __init__(self, directory=METRICS_DIR, flush_interval=METRICS_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._started = None
+        self._private = None
+        self._counters = {}
+        self._histograms = {}
+        self._dirty = False
+
+    def _own(self):
+        # A forked worker starts from zero and flushes to a file of its own
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._counters = {}
+                    self._histograms = {}
+                    self._started = _process_start(pid)
+                    self._pid = pid
+                    threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+
+    def _inc(self, name, labels, value):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def _observe(self, name, labels, value):
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            # Per-bucket counts, +Inf last, then the sum
+            histogram = self._histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        histogram[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        histogram[-1] += value
+
+    def record_request(self, method, route, status, seconds, response_bytes, stats):
+        self._own()
+        with self._lock:
+            self._inc("http_requests_total", (("method", method), ("route", route), ("status", str(status))), 1)
+            self._observe("http_request_duration_seconds", (("method", method), ("route", route)), seconds)
+            self._inc("http_response_bytes_total", (("route", route),), response_bytes)
+            if stats.queries or stats.seconds["connect"]:
+                self._add_db(route, stats.seconds, stats.queries, stats.rows)
+            self._dirty = True
+
+    def record_db(self, seconds, queries, rows, route=BACKGROUND):
+        self._own()
+        with self._lock:
+            self._add_db(route, seconds, queries, rows)
+            self._dirty = True
+
+    def _add_db(self, route, seconds, queries, rows):
+        for phase, value in seconds.items():
+            if value:
+                self._inc("db_seconds_total", (("phase", phase), ("route", route)), value)
+        self._inc("db_queries_total", (("route", route),), queries)
+        self._inc("db_rows_total", (("route", route),), rows)
+
+    def record_slow_query(self, route):
+        self._own()
+        with self._lock:
+            self._inc("db_slow_queries_total", (("route", route),), 1)
+            self._dirty = True
+
+    def record_coalesced(self, route):
+        self._own()
+        with self._lock:
+            self._inc("coalesced_reads_total", (("route", route),), 1)
+            self._dirty = True
+
+    # -- sharing across worker processes --------------------------------------
+
+    def _snapshot(self):
+        with self._lock:
+            return dict(self._counters), {key: list(value) for key, value in self._histograms.items()}
+
+    def _shared(self):
+        # Every worker reads what the others write here; see order_cache.ensure_private_directory
+        if self._private is None:
+            try:
+                ensure_private_directory(self.directory)
+                self._private = True
+            except OSError as e:
+                logger.error("Metrics cover this worker only: %s", e)
+                self._private = False
+        return self._private
+
+    def _path(self):
+        return os.path.join(self.directory, f"{self._pid}-{self._started}.json")
+
+    def flush(self):
+        """Write this worker's totals to its file in the metrics directory"""
+        if self._pid != os.getpid() or not self._shared():
+            return
+        with self._lock:
+            self._dirty = False
+        _write(self._path(), self._snapshot())
+
+    def retire(self):
+        """Fold this worker's totals into the exited-workers file and remove its own file"""
+        if self._pid != os.getpid() or not self._shared():
+            return
+        with FileLock(os.path.join(self.directory, "metrics.lock")):
+            dead_path = os.path.join(self.directory, _DEAD_FILE)
+            totals = _read(dead_path)
+            _merge(totals, self._snapshot())
+            _write(dead_path, totals)
+            try:
+                os.remove(self._path())
+            except OSError:
+                pass
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush()
+
+    def collect(self):
+        """(counters, histograms) summed over every worker, this one read live"""
+        self._own()
+        counters, histograms = self._snapshot()
+        if not self._shared():
+            return counters, histograms
+        self._fold_exited()
+        own = self._path()
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            if path != own:
+                _merge((counters, histograms), _read(path))
+        return counters, histograms
+
+    def _fold_exited(self):
+        # Files of exited workers are merged into one so the directory stays small
+        exited = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            pid, _, started = os.path.basename(path)[:-5].partition("-")
+            if pid.isdigit() and not _alive(int(pid), started):
+                exited.append(path)
+        if not exited:
+            return
+        with FileLock(os.path.join(self.directory, "metrics.lock"), blocking=False) as lock:
+            if not lock.acquired:
+                return
+            dead_path = os.path.join(self.directory, _DEAD_FILE)
+            totals = _read(dead_path)
+            for path in exited:
+                _merge(totals, _read(path))
+            _write(dead_path, totals)
+            for path in exited:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def _process_start(pid):
+    """Start time of process ``pid`` in clock ticks since boot (Linux), or 0 where unknown"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            # Fields after the parenthesized command name; starttime is field 22
+            return int(f.read().rpartition(b")")[2].split()[19])
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def _alive(pid, started):
+    """Whether the worker that wrote a file for ``pid`` started at ``started`` is still running"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return started == str(_process_start(pid))
+
+
+def _read(path):
+    try:
+        data = json.loads(read_private_file(path))
+        counters = {(name, tuple(map(tuple, labels))): value for name, labels, value in data["counters"]}
+        histograms = {(name, tuple(map(tuple, labels))): value for name, labels, value in data["histograms"]}
+        return counters, histograms
+    except FileNotFoundError:
+        return {}, {}
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning("Ignoring metrics file %s: %s", path, e)
+        return {}, {}
+
+
+def _write(path, data):
+    counters, histograms = data
+    payload = {
+        "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+        "histograms": [[name, labels, value] for (name, labels), value in histograms.items()],
+    }
+    try:
+        write_private_file(path, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+    except OSError as e:
+        logger.error("Could not write metrics file: %s", e)
+
+
+def _merge(into, other):
+    counters, histograms = into
+    other_counters, other_histograms = other
+    for key, value in other_counters.items():
+        counters[key] = counters.get(key, 0) + value
+    for key, value in other_histograms.items():
+        current = histograms.get(key)
+        if current is None or len(current) != len(value):
+            histograms[key] = list(value)
+        else:
+            histograms[key] = [a + b for a, b in zip(current, value)]
+
+
+registry = Registry()
+atexit.register(registry.retire)
+
+
+# -- database instrumentation -------------------------------------------------
+
+def _record(phase, seconds, queries=0, rows=0):
+    stats = _current.get()
+    if stats is None:
+        registry.record_db({phase: seconds}, queries, rows)
+    else:
+        stats.seconds[phase] += seconds
+        stats.queries += queries
+        stats.rows += rows
+
+
+def _log_slow_query(sql, seconds):
+    stats = _current.get()
+    route = route_label(stats.scope) if stats is not None else BACKGROUND
+    registry.record_slow_query(route)
+    statement = " ".join(sql.split())
+    if len(statement) > 500:
+        statement = statement[:500] + "..."
+    slow_query_logger.warning("Slow query (%.0f ms, %s): %s", seconds * 1000, route, statement, extra={
+        "duration_ms": round(seconds * 1000, 1), "route": route,
+    })
+
+
+class InstrumentedCursor:
+    """DB-API cursor wrapper timing execute and fetch calls"""
+
+    __slots__ = ("_cursor",)
+
+    def __init__(self, cursor):
+        object.__setattr__(self, "_cursor", cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # e.g. fast_executemany
+        setattr(self._cursor, name, value)
+
+    def _timed_execute(self, method, sql, args):
+        started = time.perf_counter()
+        method(sql, *args)
+        elapsed = time.perf_counter() - started
+        _record("execute", elapsed, queries=1)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            _log_slow_query(sql, elapsed)
+        return self
+
+    def execute(self, sql, *args):
+        return self._timed_execute(self._cursor.execute, sql, args)
+
+    def executemany(self, sql, *args):
+        self._timed_execute(self._cursor.executemany, sql, args)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        _record("fetch", time.perf_counter() - started, rows=row is not None)
+        return row
+
+    def fetchmany(self, *args):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(*args)
+        _record("fetch", time.perf_counter() - started, rows=len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        _record("fetch", time.perf_counter() - started, rows=len(rows))
+        return rows
+
+    def nextset(self):
+        started = time.perf_counter()
+        result = self._cursor.nextset()
+        _record("fetch", time.perf_counter() - started)
+        return result
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+
+class InstrumentedConnection:
+    """DB-API connection wrapper whose cursors and commits are timed"""
+
+    __slots__ = ("_conn",)
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self):
+        return InstrumentedCursor(self._conn.cursor())
+
+    def commit(self):
+        started = time.perf_counter()
+        self._conn.commit()
+        _record("commit", time.perf_counter() - started)
+
+
+def instrument_connect(connect):
+    """Wrap a pool ``connect`` callable so connect time and all cursor work are measured"""
+    if not METRICS_ENABLED:
+        return connect
+
+    def instrumented_connect():
+        started = time.perf_counter()
+        conn = connect()
+        _record("connect", time.perf_counter() - started)
+        return InstrumentedConnection(conn) if conn is not None else None
+    return instrumented_connect
+
+
+def record_coalesced():
+    """Count a read that joined another request's database call (see single_flight.py)"""
+    if not METRICS_ENABLED:
+        return
+    stats = _current.get()
+    registry.record_coalesced(route_label(stats.scope) if stats is not None else BACKGROUND)
+
+
+# -- HTTP middleware and exposition -------------------------------------------
+
+_route_paths = {}
+
+
+def route_label(scope):
+    """Path template of the route that handled ``scope`` ("unmatched" for 404s)"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    path = _route_paths.get(endpoint)
+    if path is None:
+        for route in getattr(scope.get("app"), "routes", ()):
+            if getattr(route, "endpoint", None) is not None:
+                _route_paths[route.endpoint] = route.path
+        path = _route_paths.setdefault(endpoint, getattr(endpoint, "__name__", "unknown"))
+    return path
+
+
+class MetricsMiddleware:
+    """Records latency, status and response bytes per route, plus the request's database time"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        status = 500
+        response_bytes = 0
+
+        async def send_wrapper(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            registry.record_request(scope["method"], route_label(scope), status,
+                                    time.perf_counter() - started, response_bytes, stats)
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics of all workers in the Prometheus text exposition format"""
+    counters, histograms = registry.collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {PREFIX}{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}{name} {kind}")
+        if kind == "histogram":
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), values):
+                    cumulative += count
+                    lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {_number(values[-1])}")
+                lines.append(f"{PREFIX}{name}_count{_labels(labels)} {cumulative}")
+        else:
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{PREFIX}{name}{_labels(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,389 @@
+import sys
+import json
+import time
+import decimal
+import hashlib
+import datetime
+import argparse
+import statistics
+
+from schema import TABLE_NAME, TABLE_COLUMNS, ROW_VERSION_COLUMN, TOMBSTONE_TABLE
+import rollups
+import app_logging
+
+# Versioned schema changes for the SQL Server database. Applied versions are
+# recorded in MIGRATIONS_TABLE; each pending migration runs in its own
+# transaction. Statements are guarded so a migration that was interrupted,
+# or whose objects predate this table, can safely run again.
+MIGRATIONS_TABLE = "schema_migrations"
+
+logger = app_logging.get_logger("migrations")
+
+# Columns shown by the order list view; the covering index includes them so
+# date-sorted pages with ?fields= never touch the base table
+LIST_VIEW_COLUMNS = ("姓名", "电话", "到店交付日期", "实际交付日期", "定制顾问", "接待人员", "客户来源", "定制金额")
+
+
+class Index:
+    """Definition of one nonclustered index, rendered for SQL Server or SQLite"""
+
+    def __init__(self, name, columns, include=()):
+        self.name = name
+        self.columns = tuple(columns)
+        self.include = tuple(include)
+
+    def create_sql(self):
+        include = f" INCLUDE ({', '.join(self.include)})" if self.include else ""
+        return (
+            f"IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = '{self.name}' "
+            f"AND object_id = OBJECT_ID('{TABLE_NAME}')) "
+            f"CREATE INDEX {self.name} ON {TABLE_NAME} ({', '.join(self.columns)}){include}"
+        )
+
+    def drop_sql(self):
+        return (
+            f"IF EXISTS (SELECT * FROM sys.indexes WHERE name = '{self.name}' "
+            f"AND object_id = OBJECT_ID('{TABLE_NAME}')) "
+            f"DROP INDEX {self.name} ON {TABLE_NAME}"
+        )
+
+    def sqlite_create_sql(self):
+        # SQLite has no INCLUDE; trailing key columns make the index covering
+        return f"CREATE INDEX IF NOT EXISTS {self.name} ON {TABLE_NAME} ({', '.join(self.columns + self.include)})"
+
+    def sqlite_drop_sql(self):
+        return f"DROP INDEX IF EXISTS {self.name}"
+
+
+class Migration:
+    """One schema version.
+
+    ``steps`` are SQL strings or callables taking a cursor. Index
+    migrations also list the indexes they create and drop, and the
+    representative ``benchmarks`` queries (label, sql, params) used to
+    compare plans and latency before and after.
+    """
+
+    def __init__(self, version, name, steps=(), create_indexes=(), drop_indexes=(), benchmarks=()):
+        self.version = version
+        self.name = name
+        self.create_indexes = tuple(create_indexes)
+        self.drop_indexes = tuple(drop_indexes)
+        self.steps = tuple(steps) + tuple(index.drop_sql() for index in self.drop_indexes) + \
+            tuple(index.create_sql() for index in self.create_indexes)
+        self.benchmarks = tuple(benchmarks)
+
+    def apply(self, cursor):
+        for step in self.steps:
+            if callable(step):
+                step(cursor)
+            else:
+                cursor.execute(step)
+
+
+def _create_orders_table():
+    column_defs = [f"{col} {type_def}" for col, type_def in TABLE_COLUMNS.items()]
+    return f"""
+        IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = '{TABLE_NAME}')
+        BEGIN
+            CREATE TABLE {TABLE_NAME} (
+                {', '.join(column_defs)}
+            )
+        END
+    """
+
+
+def _seed_rollup(cursor):
+    # A freshly created rollup table is seeded from existing orders
+    cursor.execute("SELECT OBJECT_ID(?)", (rollups.ROLLUP_TABLE,))
+    if cursor.fetchone()[0] is None:
+        rollups.rebuild(cursor)
+
+
+_ORDER_DATE_INDEX = Index("IX_shirt_orders_order_date", ["下单日期"])
+_LIST_COLUMNS = ", ".join(("id",) + LIST_VIEW_COLUMNS[:2] + ("下单日期",) + LIST_VIEW_COLUMNS[2:])
+
+MIGRATIONS = [
+    Migration(1, "create_shirt_orders", [_create_orders_table()]),
+    # Change tracking for delta sync: a ROWVERSION column bumped on every
+    # insert/update, and a tombstone table for deletes
+    Migration(2, "add_row_version", [
+        f"""
+        IF COL_LENGTH('{TABLE_NAME}', '{ROW_VERSION_COLUMN}') IS NULL
+            ALTER TABLE {TABLE_NAME} ADD {ROW_VERSION_COLUMN} ROWVERSION
+        """,
+        f"""
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_{TABLE_NAME}_{ROW_VERSION_COLUMN}')
+            CREATE INDEX IX_{TABLE_NAME}_{ROW_VERSION_COLUMN} ON {TABLE_NAME} ({ROW_VERSION_COLUMN})
+        """,
+    ]),
+    Migration(3, "create_tombstones", [
+        f"""
+        IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = '{TOMBSTONE_TABLE}')
+        BEGIN
+            CREATE TABLE {TOMBSTONE_TABLE} (
+                id INT NOT NULL PRIMARY KEY,
+                {ROW_VERSION_COLUMN} ROWVERSION,
+                deleted_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+            );
+            CREATE INDEX IX_{TOMBSTONE_TABLE}_{ROW_VERSION_COLUMN} ON {TOMBSTONE_TABLE} ({ROW_VERSION_COLUMN});
+        END
+        """,
+    ]),
+    Migration(4, "create_daily_rollup", [_seed_rollup]),
+    Migration(
+        5, "index_order_dates",
+        create_indexes=[
+            _ORDER_DATE_INDEX,
+            Index("IX_shirt_orders_due_date", ["到店交付日期"], include=["姓名", "电话"]),
+            Index("IX_shirt_orders_delivered_date", ["实际交付日期"]),
+        ],
+        benchmarks=[
+            ("orders placed in a month", f"SELECT COUNT(*) FROM {TABLE_NAME} WHERE 下单日期 >= ? AND 下单日期 <= ?",
+             ("2024-03-01", "2024-03-31")),
+            ("upcoming due list", f"SELECT id, 姓名, 电话, 到店交付日期 FROM {TABLE_NAME} "
+             "WHERE 到店交付日期 >= ? AND 到店交付日期 <= ? ORDER BY 到店交付日期, id",
+             ("2024-03-01", "2024-03-07")),
+            ("orders delivered in a month", f"SELECT COUNT(*) FROM {TABLE_NAME} "
+             "WHERE 实际交付日期 >= ? AND 实际交付日期 <= ?", ("2024-03-01", "2024-03-31")),
+        ],
+    ),
+    Migration(
+        6, "index_customer_lookup",
+        create_indexes=[
+            Index("IX_shirt_orders_phone", ["电话"]),
+            Index("IX_shirt_orders_name", ["姓名"], include=["电话"]),
+        ],
+        benchmarks=[
+            ("lookup by phone", f"SELECT id, 姓名, 下单日期 FROM {TABLE_NAME} WHERE 电话 = ?", ("13800138000",)),
+            ("name prefix", f"SELECT id, 姓名, 电话 FROM {TABLE_NAME} WHERE 姓名 LIKE ?", ("王伟%",)),
+        ],
+    ),
+    # The list view pages by 下单日期 with a fixed projection; one covering
+    # index serves those pages and replaces the plain order date index
+    Migration(
+        7, "cover_list_view",
+        create_indexes=[
+            Index("IX_shirt_orders_list_by_order_date", ["下单日期", "id"], include=LIST_VIEW_COLUMNS),
+        ],
+        drop_indexes=[_ORDER_DATE_INDEX],
+        benchmarks=[
+            # Same predicate as the API's keyset pages; LIMIT stands in for TOP (?)
+            ("list page by order date", f"SELECT {_LIST_COLUMNS} FROM {TABLE_NAME} "
+             "WHERE (下单日期 >= ? AND (下单日期 > ? OR id > ?)) ORDER BY 下单日期, id LIMIT 51",
+             ("2024-03-01", "2024-03-01", 0)),
+        ],
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def schema_fingerprint(database=""):
+    """Hash of the table definition and every migration step, optionally scoped to a ``database``.
+
+    It changes whenever a deploy could need DDL, so a worker that finds the
+    fingerprint recorded by an earlier successful migrate() can skip it.
+    """
+    steps = [
+        [migration.version, migration.name,
+         [step if isinstance(step, str) else step.__qualname__ for step in migration.steps]]
+        for migration in MIGRATIONS
+    ]
+    payload = json.dumps([database, TABLE_NAME, list(TABLE_COLUMNS.items()), steps], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute(f"""
+        IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = '{MIGRATIONS_TABLE}')
+        BEGIN
+            CREATE TABLE {MIGRATIONS_TABLE} (
+                version INT NOT NULL PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                applied_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+                duration_ms INT NOT NULL
+            )
+        END
+    """)
+
+
+def applied_versions(cursor):
+    """Versions already recorded in the migrations table"""
+    cursor.execute(f"SELECT version FROM {MIGRATIONS_TABLE}")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn, target=LATEST_VERSION):
+    """Apply pending migrations up to ``target``; returns [(version, name, ms)] applied.
+
+    An application lock on the session serializes workers that start at the
+    same time, so each migration runs exactly once.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "EXEC sp_getapplock @Resource = ?, @LockMode = 'Exclusive', @LockOwner = 'Session', @LockTimeout = 60000",
+        (MIGRATIONS_TABLE,),
+    )
+    applied = []
+    try:
+        ensure_migrations_table(cursor)
+        conn.commit()
+        done = applied_versions(cursor)
+        for migration in MIGRATIONS:
+            if migration.version in done or migration.version > target:
+                continue
+            started = time.perf_counter()
+            try:
+                migration.apply(cursor)
+                elapsed_ms = int((time.perf_counter() - started) * 1000)
+                cursor.execute(
+                    f"INSERT INTO {MIGRATIONS_TABLE} (version, name, duration_ms) VALUES (?, ?, ?)",
+                    (migration.version, migration.name, elapsed_ms),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            logger.info("Applied migration %03d_%s in %s ms", migration.version, migration.name, elapsed_ms)
+            applied.append((migration.version, migration.name, elapsed_ms))
+    finally:
+        cursor.execute("EXEC sp_releaseapplock @Resource = ?, @LockOwner = 'Session'", (MIGRATIONS_TABLE,))
+        conn.commit()
+    return applied
+
+
+def status(cursor):
+    """Rows of (version, name, applied_at or None) for every known migration"""
+    ensure_migrations_table(cursor)
+    cursor.execute(f"SELECT version, applied_at FROM {MIGRATIONS_TABLE}")
+    applied = dict(cursor.fetchall())
+    return [(m.version, m.name, applied.get(m.version)) for m in MIGRATIONS]
+
+
+# -------------------------
+# Benchmark on a seeded SQLite stand-in
+# -------------------------
+
+# Orders span the two years before this day, so the month queried by the
+# benchmarks (2024-03) is covered whatever the current date
+_SEED_TODAY = datetime.date(2025, 1, 1)
+
+
+def _sqlite_value(value):
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def _seed(conn, rows, seed):
+    """Create shirt_orders in ``conn`` and fill it with ``rows`` orders from benchmarks.generator"""
+    from benchmarks.generator import iter_orders
+
+    column_defs = ["id INTEGER PRIMARY KEY"] + [
+        f"{col} {type_def.split()[0]}" for col, type_def in TABLE_COLUMNS.items() if col != "id"
+    ]
+    conn.execute(f"CREATE TABLE {TABLE_NAME} ({', '.join(column_defs)})")
+    columns = list(TABLE_COLUMNS)
+    sql = f"INSERT INTO {TABLE_NAME} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+    batch = []
+    for order in iter_orders(rows, seed, today=_SEED_TODAY):
+        batch.append([_sqlite_value(order[col]) for col in columns])
+        if len(batch) == 5000:
+            conn.executemany(sql, batch)
+            batch = []
+    if batch:
+        conn.executemany(sql, batch)
+    conn.commit()
+
+
+def _measure(conn, sql, params, runs):
+    plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"plan": plan, "median_ms": round(statistics.median(timings), 3)}
+
+
+def benchmark(rows=100000, runs=5, seed=42):
+    """Seed an in-memory SQLite copy and time each migration's queries before and after its indexes"""
+    import sqlite3
+
+    conn = sqlite3.connect(":memory:")
+    # Like SQL Server, let LIKE 'prefix%' seek an index
+    conn.execute("PRAGMA case_sensitive_like = ON")
+    _seed(conn, rows, seed)
+    conn.execute("ANALYZE")
+    results = []
+    for migration in MIGRATIONS:
+        if not migration.benchmarks:
+            continue
+        before = {label: _measure(conn, sql, params, runs) for label, sql, params in migration.benchmarks}
+        for index in migration.drop_indexes:
+            conn.execute(index.sqlite_drop_sql())
+        for index in migration.create_indexes:
+            conn.execute(index.sqlite_create_sql())
+        conn.execute("ANALYZE")
+        after = {label: _measure(conn, sql, params, runs) for label, sql, params in migration.benchmarks}
+        results.append({
+            "version": migration.version,
+            "name": migration.name,
+            "queries": [
+                {"label": label, "before": before[label], "after": after[label]}
+                for label, _, _ in migration.benchmarks
+            ],
+        })
+    conn.close()
+    return {"rows": rows, "runs": runs, "migrations": results}
+
+
+def _print_benchmark(report):
+    print(f"Seeded {report['rows']} orders, median of {report['runs']} runs")
+    for migration in report["migrations"]:
+        print(f"\n{migration['version']:03d}_{migration['name']}")
+        for query in migration["queries"]:
+            before, after = query["before"], query["after"]
+            print(f"  {query['label']}: {before['median_ms']} ms -> {after['median_ms']} ms")
+            print(f"    before: {'; '.join(before['plan'])}")
+            print(f"    after:  {'; '.join(after['plan'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage shirt_orders schema migrations")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="list migrations and when they were applied")
+    migrate_parser = sub.add_parser("migrate", help="apply pending migrations")
+    migrate_parser.add_argument("--target", type=int, default=LATEST_VERSION)
+    bench_parser = sub.add_parser("benchmark", help="compare query plans and latency on a seeded SQLite copy")
+    bench_parser.add_argument("--rows", type=int, default=100000)
+    bench_parser.add_argument("--runs", type=int, default=5)
+    bench_parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.command == "benchmark":
+        report = benchmark(args.rows, args.runs)
+        _print_benchmark(report)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        sys.exit(0)
+
+    from main import get_pool, storage_backend
+
+    if storage_backend is None:
+        print("No storage backend configured - set the DB_* variables or STORAGE_BACKEND=sqlite", file=sys.stderr)
+        sys.exit(1)
+    with get_pool().connection() as conn:
+        if args.command == "migrate":
+            try:
+                applied = storage_backend.migrate(conn, args.target)
+            except ValueError as e:
+                parser.error(str(e))
+            print(f"Applied {len(applied)} migration(s)")
+        else:
+            for version, name, applied_at in storage_backend.status(conn):
+                print(f"{version:03d}_{name}: {applied_at or 'pending'}")
@@ -0,0 +1,373 @@
+import os
+import sys
+import json
+import mmap
+import stat
+import time
+import struct
+import decimal
+import datetime
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: single-process locking only
+    fcntl = None
+
+import app_logging
+
+# Where the shared snapshot and version counter live. /dev/shm keeps both in
+# memory on Linux so every uwsgi/uvicorn worker maps the same pages.
+_DEFAULT_DIR = "/dev/shm/suit_crm" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(), "suit_crm")
+ORDER_CACHE_DIR = os.getenv('ORDER_CACHE_DIR', _DEFAULT_DIR)
+# Upper bound on staleness for changes made outside this API (seconds)
+ORDER_CACHE_MAX_AGE = float(os.getenv('ORDER_CACHE_MAX_AGE', '300'))
+ORDER_CACHE_ENABLED = os.getenv('ORDER_CACHE_ENABLED', 'true').lower() == 'true'
+
+_COUNTER = struct.Struct("<Q")
+
+logger = app_logging.get_logger("order_cache")
+
+
+# -- private files ---------------------------------------------------------------
+#
+# Every worker reads back what the others wrote to this directory, so it must
+# not be writable by anyone else: a world-writable /dev/shm/suit_crm created
+# by another user would let them plant the data workers load.
+
+def ensure_private_directory(path):
+    """Create ``path`` with mode 0700, or refuse one another user owns"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"{path} is not a directory owned by uid {os.getuid()}")
+    if stat.S_IMODE(info.st_mode) != 0o700:
+        # Made by an older version under the default umask
+        os.chmod(path, 0o700)
+
+
+def read_private_file(path):
+    """Contents of ``path``; refuses a symlink or a file another user owns or can write"""
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+    with os.fdopen(fd, "rb") as f:
+        info = os.fstat(f.fileno())
+        if hasattr(os, "getuid") and (info.st_uid != os.getuid() or info.st_mode & 0o022):
+            raise PermissionError(f"{path} is not private to uid {os.getuid()}")
+        return f.read()
+
+
+def write_private_file(path, payload):
+    """Atomically replace ``path`` with ``payload``, readable only by this user"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_NOFOLLOW", 0)
+    with os.fdopen(os.open(tmp_path, flags, 0o600), "wb") as f:
+        f.write(payload)
+    # Readers see either the old or the new file
+    os.replace(tmp_path, path)
+
+
+# -- snapshot file format --------------------------------------------------------
+#
+# JSON, one list per column. Decimal and date columns are written as strings
+# and named in "kinds" so they are read back as the same types.
+
+_DECODERS = {"decimal": decimal.Decimal, "date": datetime.date.fromisoformat}
+
+
+def _column_kind(values):
+    for value in values:
+        if isinstance(value, decimal.Decimal):
+            return "decimal"
+        if isinstance(value, datetime.date):
+            return "date"
+        if value is not None:
+            return None
+    return None
+
+
+def encode_snapshot(snapshot):
+    """Bytes of the snapshot file for ``snapshot``"""
+    data = []
+    kinds = []
+    for i in range(len(snapshot.columns)):
+        values = [row[i] for row in snapshot.rows]
+        kind = _column_kind(values)
+        if kind == "decimal":
+            values = [None if value is None else str(value) for value in values]
+        elif kind == "date":
+            values = [None if value is None else value.isoformat() for value in values]
+        kinds.append(kind)
+        data.append(values)
+    return json.dumps({
+        "cache_version": snapshot.cache_version,
+        "db_version": snapshot.db_version,
+        "loaded_at": snapshot.loaded_at,
+        "columns": snapshot.columns,
+        "kinds": kinds,
+        "length": len(snapshot.rows),
+        "data": data,
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode_snapshot(payload):
+    """OrderSnapshot read back from ``encode_snapshot`` bytes"""
+    document = json.loads(payload)
+    data = []
+    for kind, values in zip(document["kinds"], document["data"]):
+        decode = _DECODERS.get(kind)
+        if decode is not None:
+            values = [None if value is None else decode(value) for value in values]
+        data.append(values)
+    rows = list(zip(*data)) if data else [()] * document["length"]
+    return OrderSnapshot(document["cache_version"], tuple(document["db_version"]), document["loaded_at"],
+                         document["columns"], rows)
+
+
+class OrderSnapshot:
+    """Immutable copy of the order table as row tuples plus column names"""
+
+    __slots__ = ("cache_version", "db_version", "loaded_at", "columns", "rows", "_index", "approx_bytes")
+
+    def __init__(self, cache_version, db_version, loaded_at, columns, rows):
+        self.cache_version = cache_version
+        self.db_version = db_version
+        self.loaded_at = loaded_at
+        self.columns = columns
+        self.rows = rows
+        self._index = {col: i for i, col in enumerate(columns)}
+        self.approx_bytes = _estimate_size(rows)
+
+    def positions(self, columns):
+        """Row indexes of ``columns``"""
+        return [self._index[col] for col in columns]
+
+    def to_dicts(self, columns=None):
+        """Materialize rows as dicts, optionally projected to ``columns``"""
+        if columns is None or columns == self.columns:
+            names = self.columns
+            return [dict(zip(names, row)) for row in self.rows]
+        positions = self.positions(columns)
+        return [{col: row[i] for col, i in zip(columns, positions)} for row in self.rows]
+
+
+def _estimate_size(rows, sample=200):
+    """Approximate in-memory size of the row tuples from a sample"""
+    if not rows:
+        return 0
+    step = max(1, len(rows) // sample)
+    sampled = rows[::step]
+    total = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in sampled)
+    return int(total / len(sampled) * len(rows))
+
+
+class SharedOrderCache:
+    """Read-through cache of the full order list shared by all worker processes.
+
+    A memory-mapped 8-byte counter holds the current cache version; writers
+    bump it after committing. Each worker keeps the decoded snapshot in
+    memory while the counter is unchanged and younger than ``max_age``, and
+    otherwise reloads the shared snapshot file, or the database if that file
+    is stale too.
+    """
+
+    def __init__(self, directory=ORDER_CACHE_DIR, max_age=ORDER_CACHE_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+        self._counter_path = os.path.join(directory, "orders.version")
+        self._snapshot_path = os.path.join(directory, "orders.snapshot")
+        self._lock_path = os.path.join(directory, "orders.lock")
+        self._counter = None
+        self._counter_pid = None
+        self._private = None
+        self._local = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.snapshot_loads = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    # -- shared version counter --------------------------------------------
+
+    def usable(self):
+        """Whether the cache directory is safe to share through; checked once.
+
+        When it is not, the cache is bypassed: every read goes to the loader.
+        """
+        if self._private is None:
+            try:
+                ensure_private_directory(self.directory)
+                self._private = True
+            except OSError as e:
+                logger.error("Shared order cache disabled: %s", e)
+                self._private = False
+        return self._private
+
+    def _open_counter(self):
+        pid = os.getpid()
+        if self._counter is not None and self._counter_pid == pid:
+            return self._counter
+        fd = os.open(self._counter_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < _COUNTER.size:
+                os.ftruncate(fd, _COUNTER.size)
+            self._counter = mmap.mmap(fd, _COUNTER.size)
+        finally:
+            os.close(fd)
+        self._counter_pid = pid
+        return self._counter
+
+    def _file_lock(self):
+        return FileLock(self._lock_path)
+
+    def version(self):
+        """Current shared cache version"""
+        return _COUNTER.unpack_from(self._open_counter(), 0)[0]
+
+    def invalidate(self):
+        """Bump the shared version so every worker reloads on its next read"""
+        if not self.usable():
+            return
+        counter = self._open_counter()
+        with self._lock, self._file_lock():
+            current = _COUNTER.unpack_from(counter, 0)[0]
+            _COUNTER.pack_into(counter, 0, current + 1)
+            self._local = None
+            self.invalidations += 1
+
+    # -- snapshot access ----------------------------------------------------
+
+    def _fresh(self, snapshot, version):
+        return (snapshot is not None and snapshot.cache_version == version
+                and time.time() - snapshot.loaded_at <= self.max_age)
+
+    def peek(self):
+        """Return this worker's snapshot if it is current, without any I/O besides the counter"""
+        if not self.usable():
+            return None
+        version = self.version()
+        snapshot = self._local
+        if self._fresh(snapshot, version):
+            with self._lock:
+                self.hits += 1
+            return snapshot
+        return None
+
+    def get(self, loader):
+        """Return a current snapshot, loading it through ``loader`` on a miss.
+
+        ``loader()`` must return ``(columns, rows, db_version)``. It is called
+        at most once per worker for each cache version that no other worker
+        has already written to the shared snapshot file.
+        """
+        if not self.usable():
+            columns, rows, db_version = loader()
+            with self._lock:
+                self.misses += 1
+            return OrderSnapshot(0, db_version, time.time(), list(columns), [tuple(row) for row in rows])
+        version = self.version()
+        snapshot = self._local
+        if self._fresh(snapshot, version):
+            with self._lock:
+                self.hits += 1
+            return snapshot
+
+        snapshot = self._read_snapshot_file()
+        if self._fresh(snapshot, version):
+            with self._lock:
+                self._local = snapshot
+                self.snapshot_loads += 1
+            return snapshot
+
+        # Read the version before querying: a write that commits during the
+        # query bumps the counter afterwards, so this snapshot is never
+        # mistaken for a newer one
+        columns, rows, db_version = loader()
+        snapshot = OrderSnapshot(version, db_version, time.time(), list(columns), [tuple(row) for row in rows])
+        with self._lock:
+            self.misses += 1
+            if self.version() == version:
+                self._local = snapshot
+                self._write_snapshot_file(snapshot)
+        return snapshot
+
+    def _read_snapshot_file(self):
+        try:
+            return decode_snapshot(read_private_file(self._snapshot_path))
+        except FileNotFoundError:
+            return None
+        except PermissionError as e:
+            logger.error("Ignoring shared order snapshot: %s", e)
+            return None
+        except (OSError, ValueError, KeyError, TypeError, decimal.InvalidOperation) as e:
+            logger.warning("Unreadable shared order snapshot: %s", e)
+            return None
+
+    def _write_snapshot_file(self, snapshot):
+        try:
+            write_private_file(self._snapshot_path, encode_snapshot(snapshot))
+        except OSError as e:
+            logger.error("Could not write shared order snapshot: %s", e)
+
+    def stats(self):
+        """Hit rate, memory footprint and staleness of this worker's cache"""
+        version = self.version() if self.usable() else 0
+        snapshot = self._local
+        with self._lock:
+            lookups = self.hits + self.snapshot_loads + self.misses
+            try:
+                snapshot_bytes = os.path.getsize(self._snapshot_path)
+            except OSError:
+                snapshot_bytes = 0
+            return {
+                "enabled": ORDER_CACHE_ENABLED and self.usable(),
+                "version": version,
+                "hits": self.hits,
+                "snapshot_loads": self.snapshot_loads,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round((self.hits + self.snapshot_loads) / lookups, 4) if lookups else 0.0,
+                "rows": len(snapshot.rows) if snapshot else 0,
+                "memory_bytes": snapshot.approx_bytes if snapshot else 0,
+                "snapshot_file_bytes": snapshot_bytes,
+                "age_seconds": round(time.time() - snapshot.loaded_at, 3) if snapshot else None,
+                "stale": snapshot is not None and not self._fresh(snapshot, version),
+                "max_age_seconds": self.max_age,
+            }
+
+
+class FileLock:
+    """Exclusive advisory lock across processes (no-op without fcntl).
+
+    With ``blocking=False`` entering never waits; check ``acquired`` to see
+    whether another process already holds the lock.
+    """
+
+    def __init__(self, path, blocking=True):
+        self.path = path
+        self.blocking = blocking
+        self.acquired = False
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is None:
+            self.acquired = True
+            return self
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.acquired = True
+        except BlockingIOError:
+            os.close(self._fd)
+            self._fd = None
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self.acquired = False
+        return False
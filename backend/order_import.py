@@ -0,0 +1,272 @@
+import io
+import os
+import sys
+import csv
+import json
+import time
+import datetime
+import argparse
+import itertools
+
+from pydantic import TypeAdapter, ValidationError
+
+from schema import TABLE_COLUMNS
+import rollups
+import statements
+import app_logging
+
+try:
+    import openpyxl
+except ImportError:  # optional: pip install openpyxl (needed for .xlsx imports only)
+    openpyxl = None
+
+# Rows validated and inserted per round trip
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '1000'))
+# Per-row errors listed in a report; the rest are only counted
+IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', '1000'))
+
+XLSX_MAGIC = b"PK\x03\x04"
+
+logger = app_logging.get_logger("order_import")
+
+
+class ImportFormatError(ValueError):
+    """The file itself cannot be imported (bad header, unsupported format)"""
+
+
+def _column_kind(column):
+    return TABLE_COLUMNS[column].split("(")[0].split()[0].upper()
+
+
+def map_header(header):
+    """Column name per header cell (None for ignored cells); raises ImportFormatError"""
+    names = [str(cell).strip() if cell is not None else "" for cell in header]
+    unknown = [name for name in names if name and name not in TABLE_COLUMNS]
+    if unknown:
+        raise ImportFormatError(f"未知列: {', '.join(unknown)}")
+    if "姓名" not in names:
+        raise ImportFormatError("缺少必填列: 姓名")
+    duplicated = sorted({name for name in names if name and names.count(name) > 1})
+    if duplicated:
+        raise ImportFormatError(f"重复列: {', '.join(duplicated)}")
+    # id is assigned by the database; historical ids are not kept
+    return [name if name and name != "id" else None for name in names]
+
+
+def clean_value(column, value):
+    """Normalize a spreadsheet cell for ShirtOrder: blanks to None, dates and phone numbers to text"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    kind = _column_kind(column)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        if isinstance(value, datetime.datetime):
+            value = value.date()
+        return value.isoformat()
+    if kind in ("VARCHAR", "DATE"):
+        # Excel stores phone numbers and similar codes as numbers
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value)
+    return value
+
+
+def _records(rows, columns):
+    for row_number, cells in rows:
+        record = {}
+        for column, value in zip(columns, cells):
+            if column is not None:
+                value = clean_value(column, value)
+                if value is not None:
+                    record[column] = value
+        if record:
+            yield row_number, record
+
+
+def read_csv(text):
+    """(row_number, record) pairs from a CSV text stream with a header line"""
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        raise ImportFormatError("文件为空")
+    columns = map_header(header)
+    # Numbered per record, blank lines included, as a spreadsheet shows the
+    # rows; file lines would drift after a quoted cell spanning several lines
+    return _records(enumerate(reader, start=2), columns)
+
+
+def read_xlsx(file):
+    """(row_number, record) pairs from the first worksheet of an .xlsx file"""
+    if openpyxl is None:
+        raise ImportFormatError("导入 Excel 需要安装 openpyxl")
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    rows = workbook.worksheets[0].iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        raise ImportFormatError("文件为空")
+    columns = map_header(header)
+    return _records(enumerate(rows, start=2), columns)
+
+
+def read_orders(file):
+    """Detect CSV or .xlsx from the first bytes of a binary file and read its records"""
+    if file.read(4) == XLSX_MAGIC:
+        file.seek(0)
+        return read_xlsx(file)
+    file.seek(0)
+    return read_csv(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+
+
+class ImportReport:
+    """Counts, timings and per-row errors of one import"""
+
+    def __init__(self, max_errors=IMPORT_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.total = 0
+        self.inserted = 0
+        self.failed = 0
+        self.chunks = 0
+        self.errors = []
+        self.timings = {"read": 0.0, "validate": 0.0, "insert": 0.0}
+
+    def error(self, row_number, field, message):
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "field": field, "message": message})
+
+    def to_dict(self):
+        elapsed = sum(self.timings.values())
+        return {
+            "total": self.total,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "chunks": self.chunks,
+            "errors": self.errors,
+            "errors_truncated": len(self.errors) < self.failed,
+            "timings_ms": {phase: round(seconds * 1000, 2) for phase, seconds in self.timings.items()},
+            "rows_per_minute": int(self.total / elapsed * 60) if elapsed else 0,
+        }
+
+
+class OrderImporter:
+    """Validates records in chunks with one TypeAdapter call and inserts each chunk in one round trip.
+
+    Rows that fail validation, or whose insert the database rejects, are
+    reported and skipped; every chunk commits on its own, so one bad row
+    never loses the rest of the file.
+    """
+
+    def __init__(self, model, chunk_size=IMPORT_CHUNK_SIZE):
+        self.model = model
+        self.chunk_size = chunk_size
+        self.adapter = TypeAdapter(list[model])
+
+    def validate(self, chunk, report):
+        """Validated orders of ``chunk`` as (row_number, order) pairs; failures go to ``report``"""
+        records = [record for _, record in chunk]
+        try:
+            orders = self.adapter.validate_python(records)
+            return [(row_number, order) for (row_number, _), order in zip(chunk, orders)]
+        except ValidationError as e:
+            invalid = set()
+            for error in e.errors():
+                index = error["loc"][0]
+                field = error["loc"][1] if len(error["loc"]) > 1 else None
+                if index not in invalid:
+                    invalid.add(index)
+                    report.failed += 1
+                report.error(chunk[index][0], field, error["msg"])
+        valid = [entry for i, entry in enumerate(chunk) if i not in invalid]
+        # The remaining records passed above, so this pass cannot fail
+        orders = self.adapter.validate_python([record for _, record in valid])
+        return [(row_number, order) for (row_number, _), order in zip(valid, orders)]
+
+    def insert(self, conn, orders, report):
+        """Insert a validated chunk with one executemany; on failure retry row by row"""
+        cursor = conn.cursor()
+        cursor.fast_executemany = True
+        params = [[getattr(order, col) for col in statements.WRITABLE_COLUMNS] for _, order in orders]
+        try:
+            cursor.executemany(statements.INSERT_ORDER, params)
+            inserted = orders
+        except Exception:
+            conn.rollback()
+            inserted = []
+            cursor = conn.cursor()
+            for (row_number, order), values in zip(orders, params):
+                try:
+                    cursor.execute(statements.INSERT_ORDER, values)
+                    inserted.append((row_number, order))
+                except Exception as e:
+                    report.failed += 1
+                    report.error(row_number, None, str(e))
+        # Keep the daily rollup in step within the same transaction
+        delta = rollups.RollupDelta()
+        for _, order in inserted:
+            delta.add(order.model_dump())
+        delta.apply(cursor)
+        conn.commit()
+        report.inserted += len(inserted)
+
+    def run(self, records, conn=None, report=None):
+        """Import ``records`` ((row_number, dict) pairs); validation only when ``conn`` is None"""
+        report = report or ImportReport()
+        records = iter(records)
+        while True:
+            started = time.perf_counter()
+            chunk = list(itertools.islice(records, self.chunk_size))
+            report.timings["read"] += time.perf_counter() - started
+            if not chunk:
+                break
+            report.total += len(chunk)
+            report.chunks += 1
+
+            started = time.perf_counter()
+            orders = self.validate(chunk, report)
+            report.timings["validate"] += time.perf_counter() - started
+
+            started = time.perf_counter()
+            if orders and conn is not None:
+                self.insert(conn, orders, report)
+            report.timings["insert"] += time.perf_counter() - started
+        return report
+
+
+def import_file(file, model, conn=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import a binary CSV/.xlsx file object; returns the report dict"""
+    report = OrderImporter(model, chunk_size).run(read_orders(file), conn)
+    logger.info("Order import: %s rows, %s inserted, %s failed", report.total, report.inserted, report.failed)
+    return report.to_dict()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import historical shirt orders from CSV or Excel")
+    parser.add_argument("file", help=".csv (UTF-8, Chinese headers as in TABLE_COLUMNS) or .xlsx")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="validate only, insert nothing")
+    parser.add_argument("--errors", help="write the per-row errors to this CSV file")
+    args = parser.parse_args()
+
+    from main import ShirtOrder, get_pool, order_cache
+
+    try:
+        with open(args.file, "rb") as f:
+            if args.dry_run:
+                result = import_file(f, ShirtOrder, chunk_size=args.chunk_size)
+            else:
+                with get_pool().connection() as conn:
+                    result = import_file(f, ShirtOrder, conn, args.chunk_size)
+                order_cache.invalidate()
+    except ImportFormatError as e:
+        print(f"Cannot import {args.file}: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    print(json.dumps({k: v for k, v in result.items() if k != "errors"}, ensure_ascii=False, indent=2))
+    if args.errors:
+        with open(args.errors, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["row", "field", "message"])
+            for error in result["errors"]:
+                writer.writerow([error["row"], error["field"] or "", error["message"]])
+    sys.exit(1 if result["failed"] else 0)
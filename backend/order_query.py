@@ -0,0 +1,216 @@
+import decimal
+import datetime
+
+from schema import TABLE_COLUMNS
+from statements import MAX_SQL_PARAMS, pad_to_bucket
+
+# Compiles the JSON filter/sort spec of POST /api/shirt-orders/query into a
+# parameterized WHERE / ORDER BY for SQL Server. Column names are only ever
+# taken from TABLE_COLUMNS and values only ever travel as parameters.
+#
+#   {
+#     "fields": ["姓名", "电话", "下单日期"],
+#     "filters": {
+#       "定制顾问": "王顾问",
+#       "下单日期": {"gte": "2024-01-01", "lt": "2024-07-01"},
+#       "西装胸围": {"between": [90, 110]},
+#       "客户来源": {"in": ["门店", "小红书"]},
+#       "姓名": {"prefix": "王"},
+#       "实际交付日期": null
+#     },
+#     "sort": [{"field": "下单日期", "order": "desc"}],
+#     "limit": 100,
+#     "offset": 0,
+#     "total": true
+#   }
+
+DEFAULT_LIMIT = 100
+MAX_SORT_KEYS = 3
+
+_COMPARISONS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+_RANGE_KINDS = ("INT", "DECIMAL", "DATE")
+
+
+def column_kind(column):
+    """Base SQL type of a TABLE_COLUMNS column: INT, DECIMAL, DATE or VARCHAR"""
+    return TABLE_COLUMNS[column].split("(")[0].split()[0].upper()
+
+
+def _column(name):
+    if not isinstance(name, str) or name not in TABLE_COLUMNS:
+        raise ValueError(f"未知字段: {name}")
+    return name
+
+
+def coerce_value(column, value):
+    """Convert a JSON value to the parameter type of ``column``"""
+    kind = column_kind(column)
+    try:
+        if kind == "INT":
+            if isinstance(value, bool) or not isinstance(value, (int, str)):
+                raise ValueError
+            return int(value)
+        if kind == "DECIMAL":
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                raise ValueError
+            number = decimal.Decimal(str(value))
+            if not number.is_finite():
+                raise ValueError
+            return number
+        if kind == "DATE":
+            return datetime.date.fromisoformat(value)
+        if not isinstance(value, str):
+            raise ValueError
+        return value
+    except (ValueError, TypeError, decimal.InvalidOperation):
+        raise ValueError(f"字段 {column} 的值无效: {value!r}")
+
+
+def escape_like(text):
+    """Escape LIKE wildcards (SQL Server also treats [ as one) for ESCAPE '\\'"""
+    for char in ("\\", "%", "_", "["):
+        text = text.replace(char, "\\" + char)
+    return text
+
+
+def _condition(column, op, value, params):
+    kind = column_kind(column)
+    if op in ("eq", "ne"):
+        if value is None:
+            return f"{column} IS {'NOT ' if op == 'ne' else ''}NULL"
+        params.append(coerce_value(column, value))
+        return f"{column} {'=' if op == 'eq' else '<>'} ?"
+    if op in _COMPARISONS or op == "between":
+        if kind not in _RANGE_KINDS:
+            raise ValueError(f"字段 {column} 不支持范围查询")
+        if op == "between":
+            if not isinstance(value, list) or len(value) != 2:
+                raise ValueError("between 需要 [最小值, 最大值]")
+            params.extend(coerce_value(column, bound) for bound in value)
+            return f"{column} BETWEEN ? AND ?"
+        params.append(coerce_value(column, value))
+        return f"{column} {_COMPARISONS[op]} ?"
+    if op == "in":
+        if not isinstance(value, list) or not value:
+            raise ValueError("in 需要非空数组")
+        if len(value) > MAX_SQL_PARAMS // 2:
+            raise ValueError(f"in 最多 {MAX_SQL_PARAMS // 2} 个值")
+        # Bucketed list length so the plan cache sees a handful of shapes
+        values = pad_to_bucket([coerce_value(column, item) for item in value])
+        params.extend(values)
+        return f"{column} IN ({', '.join('?' * len(values))})"
+    if op == "prefix":
+        if kind != "VARCHAR":
+            raise ValueError(f"字段 {column} 不支持前缀查询")
+        if not isinstance(value, str) or not value:
+            raise ValueError("prefix 需要非空字符串")
+        # A constant prefix keeps LIKE sargable on an index
+        params.append(escape_like(value) + "%")
+        return f"{column} LIKE ? ESCAPE '\\'"
+    raise ValueError(f"不支持的操作符: {op}")
+
+
+def compile_filters(filters):
+    """(where, params) for a filters object; ``where`` is "" when there are none"""
+    if filters is None:
+        return "", []
+    if not isinstance(filters, dict):
+        raise ValueError("filters 必须是对象")
+    conditions = []
+    params = []
+    for name, spec in filters.items():
+        column = _column(name)
+        if not isinstance(spec, dict):
+            spec = {"eq": spec}
+        if not spec:
+            raise ValueError(f"字段 {column} 缺少条件")
+        for op, value in spec.items():
+            conditions.append(_condition(column, op, value, params))
+    return " AND ".join(conditions), params
+
+
+def compile_sort(sort):
+    """ORDER BY clause for a sort list; id breaks ties so paging is stable"""
+    sort = sort or []
+    if not isinstance(sort, list):
+        raise ValueError("sort 必须是数组")
+    if len(sort) > MAX_SORT_KEYS:
+        raise ValueError(f"最多 {MAX_SORT_KEYS} 个排序字段")
+    keys = []
+    for item in sort:
+        if isinstance(item, str):
+            item = {"field": item}
+        if not isinstance(item, dict):
+            raise ValueError("sort 项必须是对象")
+        column = _column(item.get("field"))
+        order = item.get("order", "asc")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"不支持的排序方向: {order}")
+        keys.append(f"{column} {order.upper()}")
+        if column == "id":
+            break
+    else:
+        keys.append("id ASC")
+    return ", ".join(keys)
+
+
+class OrderQuery:
+    """A validated query spec ready to run"""
+
+    __slots__ = ("columns", "where", "params", "order_by", "limit", "offset", "with_total")
+
+    def __init__(self, columns, where, params, order_by, limit, offset, with_total):
+        self.columns = columns
+        self.where = where
+        self.params = params
+        self.order_by = order_by
+        self.limit = limit
+        self.offset = offset
+        self.with_total = with_total
+
+    def sql(self, table):
+        """Count (when requested) and page statements as one batch, and their parameters.
+
+        One row beyond ``limit`` is fetched to tell whether another page follows.
+        """
+        where = f" WHERE {self.where}" if self.where else ""
+        sql = (
+            f"SELECT {', '.join(self.columns)} FROM {table}{where} ORDER BY {self.order_by} "
+            f"OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+        )
+        params = self.params + [self.offset, self.limit + 1]
+        if self.with_total:
+            sql = f"SELECT COUNT(*) FROM {table}{where}; {sql}"
+            params = self.params + params
+        return sql, params
+
+
+def compile_query(spec, max_limit):
+    """Validate a query spec (parsed JSON) into an OrderQuery; raises ValueError"""
+    if not isinstance(spec, dict):
+        raise ValueError("查询必须是 JSON 对象")
+    unknown = set(spec) - {"fields", "filters", "sort", "limit", "offset", "total"}
+    if unknown:
+        raise ValueError(f"未知参数: {', '.join(sorted(unknown))}")
+
+    fields = spec.get("fields")
+    if fields is None:
+        columns = list(TABLE_COLUMNS)
+    elif isinstance(fields, list) and fields:
+        # id is always returned so rows can be keyed
+        columns = list(dict.fromkeys(["id"] + [_column(field) for field in fields]))
+    else:
+        raise ValueError("fields 必须是非空数组")
+
+    where, params = compile_filters(spec.get("filters"))
+    order_by = compile_sort(spec.get("sort"))
+
+    limit = spec.get("limit", DEFAULT_LIMIT)
+    if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= max_limit:
+        raise ValueError(f"limit 必须在 1 到 {max_limit} 之间")
+    offset = spec.get("offset", 0)
+    if isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+        raise ValueError("offset 必须是非负整数")
+    if len(params) + 2 > MAX_SQL_PARAMS // (2 if spec.get("total") else 1):
+        raise ValueError("查询条件过多")
+    return OrderQuery(columns, where, params, order_by, limit, offset, bool(spec.get("total")))
@@ -0,0 +1,295 @@
+import os
+import time
+import decimal
+import datetime
+import logging
+import threading
+
+from db_pool import ConnectionPool, PoolError, POOL_MAX_SIZE
+from order_cache import FileLock
+from schema import TABLE_NAME, TABLE_COLUMNS
+import statements
+import app_logging
+
+# Local SQLite copy of shirt_orders kept current from SQL Server so reads do
+# not pay the round trip to the remote database. sqlite3 is imported only
+# by the methods that run with the replica enabled
+REPLICA_ENABLED = os.getenv('REPLICA_ENABLED', 'false').lower() == 'true'
+REPLICA_PATH = os.getenv('REPLICA_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shirt_orders_replica.db'))
+# Seconds between background pulls of changed rows
+REPLICA_SYNC_INTERVAL = float(os.getenv('REPLICA_SYNC_INTERVAL', '2'))
+# Reads fall back to SQL Server once the last successful sync is older than this
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', '30'))
+# Rows fetched from SQL Server per round trip while syncing
+REPLICA_SYNC_BATCH = int(os.getenv('REPLICA_SYNC_BATCH', '1000'))
+
+STATE_TABLE = "replica_state"
+
+logger = app_logging.get_logger("replica")
+# A failing sync repeats every REPLICA_SYNC_INTERVAL seconds: log about once a minute
+log_sync_error = app_logging.Sampler(logger, logging.ERROR, every=max(1, int(60 / max(REPLICA_SYNC_INTERVAL, 0.1))))
+log_read_error = app_logging.Sampler(logger, logging.WARNING)
+
+
+def _sqlite_type(type_def):
+    base = type_def.split('(')[0].split()[0].upper()
+    if base == 'INT':
+        return 'INTEGER'
+    # DECIMAL and DATE are stored as text so values round-trip exactly
+    return 'TEXT'
+
+
+def _decoder(type_def):
+    base = type_def.split('(')[0].split()[0].upper()
+    if base == 'DECIMAL':
+        return decimal.Decimal
+    if base == 'DATE':
+        return datetime.date.fromisoformat
+    return None
+
+
+def _encode(value):
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()[:10]
+    return value
+
+
+_DECODERS = {col: _decoder(type_def) for col, type_def in TABLE_COLUMNS.items()}
+
+_CREATE_SQL = [
+    "CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, {columns})".format(
+        table=TABLE_NAME,
+        columns=", ".join(f"{col} {_sqlite_type(TABLE_COLUMNS[col])}" for col in statements.WRITABLE_COLUMNS),
+    ),
+    f"CREATE INDEX IF NOT EXISTS ix_{TABLE_NAME}_order_date ON {TABLE_NAME} (下单日期, id)",
+    f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} (key TEXT PRIMARY KEY, value)",
+]
+
+_UPSERT_SQL = (
+    f"INSERT OR REPLACE INTO {TABLE_NAME} ({', '.join(statements.ORDER_COLUMNS)}) "
+    f"VALUES ({', '.join(['?'] * len(statements.ORDER_COLUMNS))})"
+)
+
+
+def replica_connection_factory(path):
+    """Return a connect callable for the replica file in WAL mode"""
+    import sqlite3
+
+    def connect():
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+    return connect
+
+
+class ReadReplica:
+    """SQLite replica of shirt_orders synced incrementally by row_version.
+
+    Any worker process may run the background sync; a file lock lets only
+    one of them pull at a time, and the others just read. Each pull applies
+    the rows changed and ids deleted since the stored sync token in a single
+    SQLite transaction, so readers always see a consistent snapshot.
+    """
+
+    def __init__(self, primary, path=REPLICA_PATH, enabled=REPLICA_ENABLED,
+                 max_lag=REPLICA_MAX_LAG, interval=REPLICA_SYNC_INTERVAL):
+        self.primary = primary
+        self.path = path
+        self.enabled = enabled
+        self.max_lag = max_lag
+        self.interval = interval
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.syncs = 0
+        self.sync_errors = 0
+        self.rows_synced = 0
+        self.deletes_synced = 0
+        self.sync_seconds = 0.0
+        self.replica_reads = 0
+        self.primary_fallbacks = 0
+
+    def _get_pool(self):
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            with self._lock:
+                if self._pool is None or self._pool_pid != pid:
+                    self._pool = ConnectionPool(replica_connection_factory(self.path), min_size=0, max_size=POOL_MAX_SIZE)
+                    self._pool_pid = pid
+                    with self._pool.connection() as conn:
+                        for sql in _CREATE_SQL:
+                            conn.execute(sql)
+                        conn.commit()
+        return self._pool
+
+    @staticmethod
+    def _read_state(conn):
+        return dict(conn.execute(f"SELECT key, value FROM {STATE_TABLE}").fetchall())
+
+    # -- sync -----------------------------------------------------------------
+
+    def sync(self, blocking=True):
+        """Pull changes from SQL Server; returns (rows, deletes) or None if skipped or failed"""
+        if not self.enabled:
+            return None
+        import sqlite3
+        try:
+            with FileLock(self.path + ".lock", blocking=blocking) as lock:
+                if not lock.acquired:
+                    return None
+                return self._pull()
+        except Exception as e:
+            with self._lock:
+                self.sync_errors += 1
+            # Expected failures (primary or replica unreachable) without a traceback
+            log_sync_error("Replica sync failed: %s", e, exc_info=not isinstance(e, (PoolError, sqlite3.Error)))
+            return None
+
+    def _pull(self):
+        started = time.perf_counter()
+        with self._get_pool().connection() as local:
+            state = self._read_state(local)
+            since = int(state.get("sync_token") or 0)
+            rows = deletes = 0
+            with self.primary().connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(statements.changes_since(statements.ORDER_COLUMNS), (since,))
+                token, dbts = cursor.fetchone()
+                cursor.nextset()
+                while True:
+                    batch = cursor.fetchmany(REPLICA_SYNC_BATCH)
+                    if not batch:
+                        break
+                    local.executemany(_UPSERT_SQL, [tuple(_encode(value) for value in row) for row in batch])
+                    rows += len(batch)
+                cursor.nextset()
+                deleted_ids = [(row[0],) for row in cursor.fetchall()]
+            if deleted_ids:
+                local.executemany(f"DELETE FROM {TABLE_NAME} WHERE id = ?", deleted_ids)
+                deletes = len(deleted_ids)
+            elapsed = time.perf_counter() - started
+            local.executemany(
+                f"INSERT OR REPLACE INTO {STATE_TABLE} (key, value) VALUES (?, ?)",
+                [("sync_token", token), ("dbts", dbts), ("last_sync_at", time.time()),
+                 ("last_sync_rows", rows), ("last_sync_ms", round(elapsed * 1000, 2))],
+            )
+            local.commit()
+        with self._lock:
+            self.syncs += 1
+            self.rows_synced += rows
+            self.deletes_synced += deletes
+            self.sync_seconds += elapsed
+        return rows, deletes
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sync(blocking=False)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start the background sync thread for this worker process"""
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background sync thread and close replica connections"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+            self._thread = None
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.close()
+            self._pool = None
+
+    # -- reads ----------------------------------------------------------------
+
+    def query(self, columns, where="", params=(), order_by=None, limit=None):
+        """Run a SELECT of ``columns`` on the replica if it is fresh enough.
+
+        Returns ``(rows, version)`` with values decoded back to the types
+        SQL Server returns, or None when the caller should use the primary:
+        replica disabled, never synced, lagging more than ``max_lag`` seconds,
+        or failing.
+        """
+        if not self.enabled:
+            return None
+        import sqlite3
+        sql = f"SELECT {', '.join(columns)} FROM {TABLE_NAME}"
+        if where:
+            sql += f" WHERE {where}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        params = list(params)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        try:
+            with self._get_pool().connection() as conn:
+                # One read transaction: state and rows come from the same snapshot
+                conn.execute("BEGIN")
+                state = self._read_state(conn)
+                last_sync_at = state.get("last_sync_at")
+                if last_sync_at is None or time.time() - last_sync_at > self.max_lag:
+                    rows = None
+                else:
+                    rows = conn.execute(sql, params).fetchall()
+                conn.rollback()
+        except sqlite3.Error as e:
+            log_read_error("Replica read failed, using primary: %s", e)
+            rows = None
+        if rows is None:
+            with self._lock:
+                self.primary_fallbacks += 1
+            return None
+        decoders = [(i, _DECODERS.get(col)) for i, col in enumerate(columns) if _DECODERS.get(col)]
+        if decoders:
+            decoded = []
+            for row in rows:
+                row = list(row)
+                for i, decode in decoders:
+                    if row[i] is not None:
+                        row[i] = decode(row[i])
+                decoded.append(tuple(row))
+            rows = decoded
+        with self._lock:
+            self.replica_reads += 1
+        return rows, (int(state["sync_token"]), int(state["dbts"]))
+
+    def stats(self):
+        """Replica lag, sync throughput and read routing counters"""
+        state = {}
+        if self.enabled:
+            import sqlite3
+            try:
+                with self._get_pool().connection() as conn:
+                    state = self._read_state(conn)
+            except sqlite3.Error as e:
+                logger.warning("Could not read replica state: %s", e)
+        last_sync_at = state.get("last_sync_at")
+        lag = round(time.time() - last_sync_at, 3) if last_sync_at else None
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "path": self.path,
+                "sync_token": state.get("sync_token"),
+                "lag_seconds": lag,
+                "max_lag_seconds": self.max_lag,
+                "fresh": lag is not None and lag <= self.max_lag,
+                "last_sync_rows": state.get("last_sync_rows"),
+                "last_sync_ms": state.get("last_sync_ms"),
+                "syncs": self.syncs,
+                "sync_errors": self.sync_errors,
+                "rows_synced": self.rows_synced,
+                "deletes_synced": self.deletes_synced,
+                "rows_per_second": round(self.rows_synced / self.sync_seconds, 1) if self.sync_seconds else 0.0,
+                "replica_reads": self.replica_reads,
+                "primary_fallbacks": self.primary_fallbacks,
+            }
@@ -0,0 +1,208 @@
+import sys
+import datetime
+import decimal
+
+from schema import TABLE_NAME, parse_date
+from statements import MAX_SQL_PARAMS, PARAM_BUCKETS, bucket_size, pad_to_bucket
+
+# Daily summary of shirt_orders keyed by order day and the staff/source
+# dimensions used by the dashboard and consultant-performance views
+ROLLUP_TABLE = "shirt_orders_daily_rollup"
+ROLLUP_DIMENSIONS = ("定制顾问", "接待人员", "客户来源")
+ROLLUP_QUANTITIES = ("西装数量", "西裤数量", "马甲数量", "衬衫数量")
+ROLLUP_AMOUNT = "定制金额"
+
+# Columns of shirt_orders needed to compute an order's contribution
+ROLLUP_SOURCE_COLUMNS = ("id", "下单日期") + ROLLUP_DIMENSIONS + ROLLUP_QUANTITIES + (ROLLUP_AMOUNT,)
+
+# Column and key definitions, shared with the SQLite backend's schema
+ROLLUP_TABLE_COLUMNS_SQL = f"""
+            day DATE NOT NULL,
+            {', '.join(f"{dim} VARCHAR(50) NOT NULL" for dim in ROLLUP_DIMENSIONS)},
+            order_count INT NOT NULL,
+            {', '.join(f"{qty} INT NOT NULL" for qty in ROLLUP_QUANTITIES)},
+            {ROLLUP_AMOUNT} DECIMAL(18,2) NOT NULL,
+            PRIMARY KEY (day, {', '.join(ROLLUP_DIMENSIONS)})
+"""
+
+CREATE_ROLLUP_TABLE_SQL = f"""
+    IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = '{ROLLUP_TABLE}')
+    BEGIN
+        CREATE TABLE {ROLLUP_TABLE} ({ROLLUP_TABLE_COLUMNS_SQL})
+    END
+"""
+
+
+def ensure_rollup_table(cursor):
+    """Create the rollup table if it does not exist yet"""
+    cursor.execute(CREATE_ROLLUP_TABLE_SQL)
+
+
+def _to_date(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return parse_date(str(value))
+
+
+def _to_int(value):
+    if value is None or value == '':
+        return 0
+    return int(decimal.Decimal(str(value)))
+
+
+def _to_amount(value):
+    if value is None or value == '':
+        return decimal.Decimal(0)
+    return decimal.Decimal(str(value))
+
+
+def contribution(order):
+    """Return (key, counts) for one order dict, or None if it has no 下单日期.
+
+    Orders without an order date cannot be attributed to a day and are left
+    out of the rollup, both here and in rebuild().
+    """
+    day = _to_date(order.get("下单日期"))
+    if day is None:
+        return None
+    key = (day,) + tuple(order.get(dim) or '' for dim in ROLLUP_DIMENSIONS)
+    counts = [1] + [_to_int(order.get(qty)) for qty in ROLLUP_QUANTITIES] + [_to_amount(order.get(ROLLUP_AMOUNT))]
+    return key, counts
+
+
+class RollupDelta:
+    """Accumulates per-key changes to the rollup from a batch of writes"""
+
+    def __init__(self):
+        self._deltas = {}
+
+    def _add(self, order, sign):
+        entry = contribution(order)
+        if entry is None:
+            return
+        key, counts = entry
+        current = self._deltas.get(key)
+        if current is None:
+            current = self._deltas[key] = [0] * len(counts)
+        for i, value in enumerate(counts):
+            current[i] += sign * value
+
+    def add(self, order):
+        """Count an inserted order, or the new state of an edited one"""
+        self._add(order, 1)
+
+    def remove(self, order):
+        """Uncount a deleted order, or the old state of an edited one"""
+        self._add(order, -1)
+
+    def rows(self):
+        """Non-zero deltas as flat parameter tuples in rollup column order"""
+        return [
+            key + tuple(counts)
+            for key, counts in self._deltas.items()
+            if any(counts)
+        ]
+
+    def apply(self, cursor):
+        """MERGE the accumulated deltas into the rollup table on ``cursor``.
+
+        Runs inside the caller's transaction so the rollup commits or rolls
+        back together with the order changes that produced it.
+        """
+        rows = self.rows()
+        if not rows:
+            return 0
+        value_columns = ("day",) + ROLLUP_DIMENSIONS + ("order_count",) + ROLLUP_QUANTITIES + (ROLLUP_AMOUNT,)
+        counter_columns = ("order_count",) + ROLLUP_QUANTITIES + (ROLLUP_AMOUNT,)
+        per_row = len(value_columns)
+        # Row counts are padded to a bucket size so only a few MERGE shapes
+        # exist; padding rows have a NULL day, never match and never insert
+        chunk_size = max(size for size in PARAM_BUCKETS if size * per_row <= MAX_SQL_PARAMS)
+        padding = (None,) + ('',) * len(ROLLUP_DIMENSIONS) + (0,) * (per_row - 1 - len(ROLLUP_DIMENSIONS))
+        key_match = " AND ".join(f"r.{col} = d.{col}" for col in ("day",) + ROLLUP_DIMENSIONS)
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            chunk = chunk + [padding] * (bucket_size(len(chunk)) - len(chunk))
+            values = ", ".join(["(" + ", ".join(["?"] * per_row) + ")"] * len(chunk))
+            # HOLDLOCK keeps the key range locked from the match to the insert,
+            # so two transactions adding the same new key cannot both insert
+            sql = f"""
+                MERGE {ROLLUP_TABLE} WITH (HOLDLOCK) AS r
+                USING (VALUES {values}) AS d ({', '.join(value_columns)})
+                ON {key_match}
+                WHEN MATCHED AND r.order_count + d.order_count <= 0 THEN
+                    DELETE
+                WHEN MATCHED THEN
+                    UPDATE SET {', '.join(f"{col} = r.{col} + d.{col}" for col in counter_columns)}
+                WHEN NOT MATCHED AND d.order_count > 0 THEN
+                    INSERT ({', '.join(value_columns)})
+                    VALUES ({', '.join(f"d.{col}" for col in value_columns)});
+            """
+            params = [value for row in chunk for value in row]
+            cursor.execute(sql, params)
+        return len(rows)
+
+
+def fetch_rollup_sources(cursor, order_ids):
+    """Fetch the rollup-relevant columns of existing orders, keyed by id.
+
+    The rows stay update-locked until the caller's transaction ends, so a
+    concurrent edit of the same order waits instead of subtracting the same
+    old values a second time.
+    """
+    ids = list(dict.fromkeys(int(order_id) for order_id in order_ids))
+    found = {}
+    for start in range(0, len(ids), MAX_SQL_PARAMS):
+        chunk = pad_to_bucket(ids[start:start + MAX_SQL_PARAMS])
+        cursor.execute(
+            f"SELECT {', '.join(ROLLUP_SOURCE_COLUMNS)} FROM {TABLE_NAME} WITH (UPDLOCK, ROWLOCK) "
+            f"WHERE id IN ({', '.join(['?'] * len(chunk))})",
+            chunk,
+        )
+        for row in cursor.fetchall():
+            order = dict(zip(ROLLUP_SOURCE_COLUMNS, row))
+            found[order["id"]] = order
+    return found
+
+
+_REBUILD_DIMS = ", ".join(f"COALESCE({dim}, '')" for dim in ROLLUP_DIMENSIONS)
+
+# Fills an empty rollup table from shirt_orders; plain SQL that SQLite runs too
+REBUILD_ROLLUP_SQL = f"""
+    INSERT INTO {ROLLUP_TABLE} (day, {', '.join(ROLLUP_DIMENSIONS)}, order_count,
+                                {', '.join(ROLLUP_QUANTITIES)}, {ROLLUP_AMOUNT})
+    SELECT 下单日期, {_REBUILD_DIMS}, COUNT(*),
+           {', '.join(f"SUM(COALESCE({qty}, 0))" for qty in ROLLUP_QUANTITIES)},
+           SUM(COALESCE({ROLLUP_AMOUNT}, 0))
+    FROM {TABLE_NAME}
+    WHERE 下单日期 IS NOT NULL
+    GROUP BY 下单日期, {_REBUILD_DIMS}
+"""
+
+
+def rebuild(cursor):
+    """Regenerate the whole rollup table from shirt_orders in one transaction"""
+    ensure_rollup_table(cursor)
+    cursor.execute(f"DELETE FROM {ROLLUP_TABLE}")
+    cursor.execute(REBUILD_ROLLUP_SQL)
+    cursor.execute(f"SELECT COUNT(*) FROM {ROLLUP_TABLE}")
+    return cursor.fetchone()[0]
+
+
+if __name__ == "__main__":
+    # Usage: python rollups.py rebuild
+    if len(sys.argv) != 2 or sys.argv[1] != "rebuild":
+        print("Usage: python rollups.py rebuild", file=sys.stderr)
+        sys.exit(2)
+
+    from main import get_pool
+
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        total = rebuild(cursor)
+        conn.commit()
+    print(f"Rebuilt {ROLLUP_TABLE}: {total} rows")
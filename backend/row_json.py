@@ -0,0 +1,122 @@
+import json
+import decimal
+import datetime
+import functools
+from json.encoder import encode_basestring
+
+from schema import TABLE_COLUMNS
+from columnar import json_default
+
+# Row tuples straight to JSON text. FastAPI's jsonable_encoder walks every
+# value of every row dict; here one function per column list is generated
+# from the TABLE_COLUMNS types, so each value costs a type check and, for
+# the common types, a cached or C-level conversion. The output is the same,
+# byte for byte, as JSONResponse(jsonable_encoder(...)).
+
+# Decimal and date fragments repeat heavily (DECIMAL(5,2) measurements,
+# order dates); memoized up to this many distinct values each
+FRAGMENT_CACHE_SIZE = 65536
+
+_decimal_fragments = {}
+_date_fragments = {}
+
+
+def dumps(value):
+    """json.dumps with the settings JSONResponse renders with"""
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=json_default)
+
+
+def _decimal(value):
+    # str() identifies the value and its exponent, which decides int vs float
+    text = str(value)
+    fragment = _decimal_fragments.get(text)
+    if fragment is None:
+        fragment = dumps(value)
+        if len(_decimal_fragments) < FRAGMENT_CACHE_SIZE:
+            _decimal_fragments[text] = fragment
+    return fragment
+
+
+def _date(value):
+    fragment = _date_fragments.get(value)
+    if fragment is None:
+        fragment = '"' + value.isoformat() + '"'
+        if len(_date_fragments) < FRAGMENT_CACHE_SIZE:
+            _date_fragments[value] = fragment
+    return fragment
+
+
+# Expression per column type; anything unexpected (e.g. a float from SQLite)
+# falls back to dumps()
+_TEMPLATES = {
+    "INT": "'null' if {v} is None else str({v}) if {v}.__class__ is int else dumps({v})",
+    "DECIMAL": "'null' if {v} is None else _decimal({v}) if {v}.__class__ is Decimal else dumps({v})",
+    "DATE": "'null' if {v} is None else _date({v}) if {v}.__class__ is date else dumps({v})",
+    "VARCHAR": "'null' if {v} is None else encode_basestring({v}) if {v}.__class__ is str else dumps({v})",
+}
+_GENERIC = "'null' if {v} is None else dumps({v})"
+
+_NAMESPACE = {
+    "Decimal": decimal.Decimal,
+    "date": datetime.date,
+    "dumps": dumps,
+    "encode_basestring": encode_basestring,
+    "_decimal": _decimal,
+    "_date": _date,
+}
+
+
+def column_kind(column):
+    """Base SQL type of ``column`` (INT, DECIMAL, DATE, VARCHAR), or None if unknown"""
+    type_def = TABLE_COLUMNS.get(column)
+    if type_def is None:
+        return None
+    return type_def.split("(")[0].split()[0].upper()
+
+
+@functools.lru_cache(maxsize=64)
+def _compile(columns, positions):
+    lines = ["def encode_row(row):"]
+    parts = []
+    for n, (column, position) in enumerate(zip(columns, positions)):
+        lines.append(f"    v{n} = row[{position}]")
+        key = encode_basestring(column) + ":"
+        parts.append(repr(("{" if n == 0 else ",") + key))
+        parts.append("(" + _TEMPLATES.get(column_kind(column), _GENERIC).format(v=f"v{n}") + ")")
+    parts.append(repr("}") if columns else repr("{}"))
+    lines.append(f"    return ''.join(({', '.join(parts)},))")
+    namespace = dict(_NAMESPACE)
+    exec("\n".join(lines), namespace)
+    return namespace["encode_row"]
+
+
+def row_encoder(columns, positions=None):
+    """Function turning one row tuple into a JSON object string.
+
+    ``positions`` are the row indexes of ``columns`` when rows hold more
+    (or differently ordered) values; by default column i is row[i].
+    """
+    columns = tuple(columns)
+    positions = tuple(range(len(columns))) if positions is None else tuple(positions)
+    return _compile(columns, positions)
+
+
+def encode_rows(columns, rows, positions=None):
+    """JSON array text of ``rows`` as objects keyed by ``columns``"""
+    return "[" + ",".join(map(row_encoder(columns, positions), rows)) + "]"
+
+
+def render(content, rows_key, columns, rows, positions=None):
+    """JSON body bytes of ``content`` with ``content[rows_key]`` encoded from row tuples.
+
+    Other values go through json.dumps, so key order and formatting match
+    what JSONResponse would send for the same content with dict rows.
+    """
+    parts = []
+    for key, value in content.items():
+        if key == rows_key:
+            text = encode_rows(columns, rows, positions)
+        else:
+            text = dumps(value)
+        parts.append(encode_basestring(key) + ":" + text)
+    return ("{" + ",".join(parts) + "}").encode("utf-8")
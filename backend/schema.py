@@ -0,0 +1,126 @@
+import re
+import datetime
+
+# Define table name and columns to avoid hardcoding.
+# Shared by main.py and the helper modules so the schema lives in one place.
+TABLE_NAME = "shirt_orders"
+TABLE_COLUMNS = {
+    "id": "INT IDENTITY(1,1) PRIMARY KEY",
+    "姓名": "VARCHAR(50) NOT NULL",
+    "身高": "DECIMAL(5,2)",
+    "体重_KG": "DECIMAL(5,2)",
+    "电话": "VARCHAR(20)",
+    "使用时间": "DATE",
+    "下单日期": "DATE",
+    "到店交付日期": "DATE",
+    "实际交付日期": "DATE",
+    "定制工艺": "VARCHAR(20)",
+    "工艺": "VARCHAR(20)",
+    "西装净体领围": "DECIMAL(5,2)",
+    "西装肩宽": "DECIMAL(5,2)",
+    "西装袖长": "DECIMAL(5,2)",
+    "西装袖肥": "DECIMAL(5,2)",
+    "西装袖口": "DECIMAL(5,2)",
+    "西装胸围": "DECIMAL(5,2)",
+    "西装中腰": "DECIMAL(5,2)",
+    "西装下摆臀围": "DECIMAL(5,2)",
+    "西装前衣长": "DECIMAL(5,2)",
+    "西装后衣长": "DECIMAL(5,2)",
+    "西装前腰节": "DECIMAL(5,2)",
+    "西装后腰节": "DECIMAL(5,2)",
+    "西装左肩斜": "DECIMAL(5,2)",
+    "西装右肩斜": "DECIMAL(5,2)",
+    "西装背胸差": "DECIMAL(5,2)",
+    "西装前胸宽": "DECIMAL(5,2)",
+    "西装后背宽": "DECIMAL(5,2)",
+    "西装袖笼差": "DECIMAL(5,2)",
+    "西装袖笼深": "DECIMAL(5,2)",
+    "西装袖笼围": "DECIMAL(5,2)",
+    "西装数量": "INT",
+    "西裤裤腰围": "DECIMAL(5,2)",
+    "西裤臀围": "DECIMAL(5,2)",
+    "西裤大腿圈": "DECIMAL(5,2)",
+    "西裤膝围": "DECIMAL(5,2)",
+    "西裤小腿圈": "DECIMAL(5,2)",
+    "西裤小腿高": "DECIMAL(5,2)",
+    "西裤裤长": "DECIMAL(5,2)",
+    "西裤遮档": "DECIMAL(5,2)",
+    "西裤腰高": "DECIMAL(5,2)",
+    "西裤裤前褶": "VARCHAR(20)",
+    "西裤皮带袢": "VARCHAR(20)",
+    "西裤卷边": "VARCHAR(20)",
+    "西裤调山袢": "VARCHAR(20)",
+    "西装面料": "VARCHAR(20)",
+    "西裤数量": "INT",
+    "马甲肩宽": "DECIMAL(5,2)",
+    "马甲胸围": "DECIMAL(5,2)",
+    "马甲中腰肚围": "DECIMAL(5,2)",
+    "马甲下摆": "DECIMAL(5,2)",
+    "马甲前衣长": "DECIMAL(5,2)",
+    "马甲后衣长": "DECIMAL(5,2)",
+    "马甲袖肥": "DECIMAL(5,2)",
+    "马甲袖口": "DECIMAL(5,2)",
+    "马甲扣数": "INT",
+    "马甲排数": "VARCHAR(20)",
+    "马甲口袋": "VARCHAR(20)",
+    "马甲背面": "VARCHAR(20)",
+    "马甲领子": "VARCHAR(20)",
+    "马甲侧面开叉": "VARCHAR(20)",
+    "马甲数量": "INT",
+    "衬衫领围": "DECIMAL(5,2)",
+    "衬衫肩宽": "DECIMAL(5,2)",
+    "衬衫袖长": "DECIMAL(5,2)",
+    "衬衫领型": "DECIMAL(5,2)",
+    "衬衫袖口": "DECIMAL(5,2)",
+    "衬衫面料": "VARCHAR(50)",
+    "衬衫数量": "INT",
+    "款式备注": "VARCHAR(50)",
+    "体型备注": "VARCHAR(50)",
+    "里布": "VARCHAR(50)",
+    "客户来源": "VARCHAR(50)",
+    "接待人员": "VARCHAR(50)",
+    "定制顾问": "VARCHAR(50)",
+    "定制金额": "DECIMAL(5,2)"
+}
+
+_SIZED_TYPE = re.compile(r"^(DECIMAL|VARCHAR)\((\d+)(?:,(\d+))?\)")
+
+
+def column_limit(type_def):
+    """Bound a column type puts on its values, or None.
+
+    DECIMAL(p,s) holds magnitudes below 10**(p-s); VARCHAR(n) holds at most
+    n characters.
+    """
+    match = _SIZED_TYPE.match(type_def)
+    if match is None:
+        return None
+    if match.group(1) == "VARCHAR":
+        return int(match.group(2))
+    return 10 ** (int(match.group(2)) - int(match.group(3) or 0))
+
+
+COLUMN_LIMITS = {col: column_limit(type_def) for col, type_def in TABLE_COLUMNS.items()
+                 if _SIZED_TYPE.match(type_def)}
+
+DATE_COLUMNS = tuple(col for col, type_def in TABLE_COLUMNS.items() if type_def == "DATE")
+
+# Strings SQL Server converts to DATE: the year-first forms, whatever the
+# language setting, and month/day/year under the default us_english login
+_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d", "%m/%d/%Y")
+
+
+def parse_date(text):
+    """The date of a string SQL Server's DATE accepts, ignoring any time part; raises ValueError"""
+    day = re.split(r"[T ]", text.strip(), maxsplit=1)[0]
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(day, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(f"无效的日期: {text}")
+
+# Change tracking: every insert/update bumps the ROWVERSION column and every
+# delete leaves a tombstone, so clients can fetch only what changed
+ROW_VERSION_COLUMN = "row_version"
+TOMBSTONE_TABLE = "shirt_orders_tombstones"
@@ -0,0 +1,338 @@
+import os
+import sys
+import time
+import errno
+import random
+import select
+import signal
+import socket
+import argparse
+
+import app_logging
+
+# Production server: a master process binds the listening socket once and
+# forks uvicorn workers that all accept on it. Each worker imports the app,
+# runs its startup, warms its DB pool and caches, and only then starts
+# accepting (with SERVE_WARM_BEFORE_READY=false it accepts at once and warms
+# in the background; /readyz tells the load balancer when it can serve).
+# Workers report over a pipe when they are ready and when they have served
+# their SERVE_MAX_REQUESTS (plus jitter) requests. The master replaces those
+# workers, and workers whose memory passes SERVE_MAX_MEMORY_MB, by starting
+# the replacement first and stopping the old worker once it is ready. Only a
+# worker that crashes is replaced after the fact.
+#
+#   python serve.py --workers 4 --port 8889
+#   kill -HUP <master pid>    reload: new workers with fresh code, then old ones stop
+#   kill -TERM <master pid>   graceful shutdown
+
+SERVE_HOST = os.getenv('SERVE_HOST', '0.0.0.0')
+SERVE_PORT = int(os.getenv('SERVE_PORT', '8889'))
+# 0 means one worker per core available to this process
+SERVE_WORKERS = int(os.getenv('SERVE_WORKERS', '0'))
+# Requests after which a worker is replaced (0 disables), plus a random
+# jitter so workers are not all replaced together
+SERVE_MAX_REQUESTS = int(os.getenv('SERVE_MAX_REQUESTS', '20000'))
+SERVE_MAX_REQUESTS_JITTER = int(os.getenv('SERVE_MAX_REQUESTS_JITTER', '2000'))
+# Resident memory after which a worker is replaced (0 disables; Linux only)
+SERVE_MAX_MEMORY_MB = float(os.getenv('SERVE_MAX_MEMORY_MB', '1024'))
+# Seconds a stopping worker gets to finish in-flight requests before SIGKILL
+SERVE_GRACEFUL_TIMEOUT = float(os.getenv('SERVE_GRACEFUL_TIMEOUT', '30'))
+SERVE_BACKLOG = int(os.getenv('SERVE_BACKLOG', '2048'))
+SERVE_ACCESS_LOG = os.getenv('SERVE_ACCESS_LOG', 'false').lower() == 'true'
+SERVE_WARM_BEFORE_READY = os.getenv('SERVE_WARM_BEFORE_READY', 'true').lower() == 'true'
+
+MEMORY_CHECK_INTERVAL = 5.0
+# A worker that dies before it is ready is respawned after this delay, so a
+# broken deploy does not fork in a tight loop
+RESPAWN_BACKOFF = 2.0
+
+# Messages a worker writes to its status pipe
+READY = b"1"
+RETIRE = b"R"
+
+logger = app_logging.get_logger("serve")
+
+
+def available_cores():
+    """Cores this process may run on (respects CPU affinity / container cpusets)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def bind_socket(host, port, backlog=SERVE_BACKLOG):
+    """Listening TCP socket shared by all workers"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def resident_memory_mb(pid):
+    """Resident set size of ``pid`` in MiB, or None where /proc is unavailable"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def run_worker(sock, status_fd, max_requests):
+    """Worker process body: serve main.app on ``sock``, reporting to the master on ``status_fd``"""
+    import asyncio
+    import uvicorn
+    import main
+    from db_executor import run_db
+
+    background = []
+    served = 0
+
+    async def warm_and_announce():
+        if SERVE_WARM_BEFORE_READY:
+            await run_db(main.warm_up)
+        else:
+            background.append(asyncio.create_task(run_db(main.warm_up)))
+        os.write(status_fd, READY)
+
+    async def app(scope, receive, send):
+        # The worker keeps serving until the master has a replacement ready
+        # and stops it, so reaching the limit costs no capacity
+        nonlocal served
+        if scope["type"] == "http" and max_requests:
+            served += 1
+            if served == max_requests:
+                os.write(status_fd, RETIRE)
+        await main.app(scope, receive, send)
+
+    # Startup handlers run before uvicorn accepts on the socket
+    main.app.router.on_startup.append(warm_and_announce)
+    config = uvicorn.Config(
+        app,
+        lifespan="on",
+        log_level=app_logging.LOG_LEVEL.lower(),
+        access_log=SERVE_ACCESS_LOG,
+        timeout_graceful_shutdown=SERVE_GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Worker:
+    __slots__ = ("pid", "status_fd", "ready", "retiring", "stop_sent_at", "started_at")
+
+    def __init__(self, pid, status_fd):
+        self.pid = pid
+        self.status_fd = status_fd
+        self.ready = False
+        self.retiring = False
+        self.stop_sent_at = None
+        self.started_at = time.monotonic()
+
+
+class Master:
+    """Keeps ``workers`` ready workers serving on one socket"""
+
+    def __init__(self, host, port, workers, max_requests, max_requests_jitter, max_memory_mb):
+        self.host = host
+        self.port = port
+        self.target = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_memory_mb = max_memory_mb
+        self.sock = None
+        self.workers = {}
+        self.stopping = False
+        self.reload_requested = False
+        self.next_spawn_at = 0.0
+        self.next_memory_check = 0.0
+
+    # -- signals ----------------------------------------------------------------
+
+    def _on_reload(self, signum, frame):
+        self.reload_requested = True
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    # -- workers ----------------------------------------------------------------
+
+    def spawn(self):
+        read_fd, write_fd = os.pipe()
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            max_requests += random.randint(0, self.max_requests_jitter)
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for worker in self.workers.values():
+                if worker.status_fd is not None:
+                    os.close(worker.status_fd)
+            for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(self.sock, write_fd, max_requests)
+            except BaseException as e:
+                logger.exception("Worker failed: %s", e)
+                code = 1
+            finally:
+                app_logging.shutdown()
+                os._exit(code)
+        os.close(write_fd)
+        self.workers[pid] = Worker(pid, read_fd)
+        logger.info("Started worker %s", pid)
+
+    def stop_worker(self, worker, sig=signal.SIGTERM):
+        if worker.stop_sent_at is None or sig == signal.SIGKILL:
+            worker.stop_sent_at = time.monotonic()
+            try:
+                os.kill(worker.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def _active(self):
+        return [w for w in self.workers.values() if not w.retiring]
+
+    def _check_status(self, timeout):
+        listening = {w.status_fd: w for w in self.workers.values() if w.status_fd is not None}
+        try:
+            readable, _, _ = select.select(list(listening), [], [], timeout)
+        except InterruptedError:
+            return
+        for fd in readable:
+            worker = listening[fd]
+            data = os.read(fd, 16)
+            if not data:
+                # The worker exited; _reap deals with it
+                os.close(fd)
+                worker.status_fd = None
+                continue
+            if READY in data and not worker.ready:
+                worker.ready = True
+                logger.info("Worker %s ready in %.1f s", worker.pid, time.monotonic() - worker.started_at)
+            if RETIRE in data and not worker.retiring:
+                logger.info("Worker %s served its max requests, replacing it", worker.pid)
+                worker.retiring = True
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            if worker.status_fd is not None:
+                os.close(worker.status_fd)
+            code = os.waitstatus_to_exitcode(status)
+            if not worker.retiring and not self.stopping:
+                if worker.ready:
+                    logger.error("Worker %s exited unexpectedly (code %s)", pid, code)
+                else:
+                    logger.error("Worker %s exited before it was ready (code %s)", pid, code)
+                    self.next_spawn_at = time.monotonic() + RESPAWN_BACKOFF
+
+    def _check_memory(self):
+        now = time.monotonic()
+        if not self.max_memory_mb or now < self.next_memory_check:
+            return
+        self.next_memory_check = now + MEMORY_CHECK_INTERVAL
+        for worker in self._active():
+            rss = resident_memory_mb(worker.pid)
+            if worker.ready and rss is not None and rss > self.max_memory_mb:
+                logger.warning("Worker %s uses %.0f MiB (limit %.0f), replacing it",
+                               worker.pid, rss, self.max_memory_mb)
+                worker.retiring = True
+
+    def _maintain(self):
+        active = self._active()
+        if len(active) < self.target and time.monotonic() >= self.next_spawn_at:
+            for _ in range(self.target - len(active)):
+                self.spawn()
+            active = self._active()
+        # Old workers stop only once enough replacements are serving
+        if sum(w.ready for w in active) >= self.target:
+            for worker in self.workers.values():
+                if worker.retiring:
+                    self.stop_worker(worker)
+        now = time.monotonic()
+        for worker in self.workers.values():
+            if worker.stop_sent_at is not None and now - worker.stop_sent_at > SERVE_GRACEFUL_TIMEOUT:
+                logger.warning("Worker %s did not stop in %.0f s, killing it", worker.pid, SERVE_GRACEFUL_TIMEOUT)
+                self.stop_worker(worker, signal.SIGKILL)
+
+    def reload(self):
+        """Start a fresh set of workers; the current ones stop when those are ready"""
+        logger.info("Reloading %s workers", self.target)
+        for worker in self.workers.values():
+            worker.retiring = True
+        self.next_spawn_at = 0.0
+
+    def shutdown(self):
+        logger.info("Shutting down %s workers", len(self.workers))
+        for worker in self.workers.values():
+            self.stop_worker(worker)
+        deadline = time.monotonic() + SERVE_GRACEFUL_TIMEOUT
+        while self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for worker in self.workers.values():
+            self.stop_worker(worker, signal.SIGKILL)
+        while self.workers:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            self.workers.pop(pid, None)
+        self.sock.close()
+
+    def run(self):
+        self.sock = bind_socket(self.host, self.port)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        logger.info("Master %s listening on %s:%s with %s workers", os.getpid(), self.host, self.port, self.target)
+        while not self.stopping:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+            self._maintain()
+            self._check_status(timeout=1.0)
+            self._reap()
+            self._check_memory()
+        self.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the API with pre-forked uvicorn workers")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS or available_cores(),
+                        help="worker processes (default: one per available core)")
+    parser.add_argument("--max-requests", type=int, default=SERVE_MAX_REQUESTS,
+                        help="replace a worker after this many requests, 0 to disable")
+    parser.add_argument("--max-requests-jitter", type=int, default=SERVE_MAX_REQUESTS_JITTER)
+    parser.add_argument("--max-memory-mb", type=float, default=SERVE_MAX_MEMORY_MB,
+                        help="replace a worker whose resident memory exceeds this, 0 to disable")
+    args = parser.parse_args(argv)
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs os.fork; on Windows run: python main.py")
+    try:
+        master = Master(args.host, args.port, max(1, args.workers), args.max_requests,
+                        args.max_requests_jitter, args.max_memory_mb)
+        master.run()
+    except OSError as e:
+        if e.errno == errno.EADDRINUSE:
+            sys.exit(f"Port {args.port} is already in use")
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import asyncio
+
+from db_executor import run_db
+import metrics
+
+# Request coalescing for reads. When several requests in one worker ask for
+# the same data at once (order view and analytics opened together), the
+# first runs the database call and the others await its result instead of
+# sending the same query again. Calls are keyed by the read function and its
+# parsed arguments, so URLs that differ only in spelling (parameter order,
+# defaults) share a call too.
+
+
+def _freeze(value):
+    """Hashable form of a key part: lists and dicts become tuples"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+class SingleFlight:
+    """Shares one in-flight ``run_db`` call among concurrent callers with the same key.
+
+    Runs on the event loop, so no lock is needed. The call runs as its own
+    task: a caller that disconnects does not cancel it for the others. Keys
+    carry a generation that ``invalidate()`` bumps after a write, so a read
+    that starts after this worker's write never joins one that began before.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._generation = 0
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, func, *args, key=None):
+        """``await run_db(func, *args)``, shared with identical calls already in flight"""
+        flight_key = (self._generation, func, _freeze(args) if key is None else _freeze(key))
+        task = self._flights.get(flight_key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(run_db(func, *args))
+            self._flights[flight_key] = task
+            task.add_done_callback(lambda done: self._finish(flight_key, done))
+        else:
+            self.coalesced += 1
+            metrics.record_coalesced()
+        return await asyncio.shield(task)
+
+    def _finish(self, flight_key, task):
+        if self._flights.get(flight_key) is task:
+            del self._flights[flight_key]
+        # Mark the exception retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def invalidate(self):
+        """Make later reads start new calls instead of joining ones already in flight"""
+        self._generation += 1
+
+    def stats(self):
+        return {
+            "in_flight": len(self._flights),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
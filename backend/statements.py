@@ -0,0 +1,196 @@
+import os
+import threading
+from collections import OrderedDict
+
+from schema import TABLE_NAME, TABLE_COLUMNS, ROW_VERSION_COLUMN, TOMBSTONE_TABLE
+
+# Registry of the SQL text used for shirt_orders, generated once at import.
+# Reusing identical statement text lets SQL Server reuse cached plans instead
+# of compiling a new one for every combination of columns or list length.
+
+ORDER_COLUMNS = list(TABLE_COLUMNS.keys())
+WRITABLE_COLUMNS = [col for col in ORDER_COLUMNS if col != 'id']
+COLUMN_BITS = {col: 1 << i for i, col in enumerate(WRITABLE_COLUMNS)}
+
+# SQL Server accepts at most 2100 parameters per statement
+MAX_SQL_PARAMS = 2000
+
+# Variable-length parameter lists are padded up to one of these sizes so only
+# a handful of distinct statement shapes ever reach the server
+PARAM_BUCKETS = (1, 4, 16, 64, 256, 1000, MAX_SQL_PARAMS)
+
+UPDATE_CACHE_SIZE = int(os.getenv('STATEMENT_CACHE_SIZE', '128'))
+
+
+def stage_column_type(type_def):
+    """Reduce a TABLE_COLUMNS definition to its bare type for staging tables"""
+    # "INT IDENTITY(1,1) PRIMARY KEY" -> "INT", "VARCHAR(50) NOT NULL" -> "VARCHAR(50)"
+    return type_def.split()[0]
+
+
+def _placeholders(count):
+    return ', '.join(['?'] * count)
+
+
+def _stage_table_sql(name, key_column):
+    column_defs = [key_column] + [f"{col} {stage_column_type(TABLE_COLUMNS[col])}" for col in WRITABLE_COLUMNS]
+    return f"DROP TABLE IF EXISTS {name}; CREATE TABLE {name} ({', '.join(column_defs)})"
+
+
+SELECT_ALL = f"SELECT {', '.join(ORDER_COLUMNS)} FROM {TABLE_NAME}"
+
+INSERT_ORDER = (
+    f"INSERT INTO {TABLE_NAME} ({', '.join(WRITABLE_COLUMNS)}) "
+    f"VALUES ({_placeholders(len(WRITABLE_COLUMNS))})"
+)
+
+# Deletes record a tombstone for delta sync in the same statement
+DELETE_BY_ID = f"DELETE FROM {TABLE_NAME} OUTPUT DELETED.id INTO {TOMBSTONE_TABLE} (id) WHERE id = ?"
+
+# Current change-tracking position: (sync token, @@DBTS). Rows with a
+# row_version below MIN_ACTIVE_ROWVERSION() are committed, so it is a safe
+# lower bound for the next incremental fetch.
+SYNC_VERSION = "SELECT CONVERT(BIGINT, MIN_ACTIVE_ROWVERSION()), CONVERT(BIGINT, @@DBTS)"
+
+# Staged bulk edits: rows are loaded into a temp table, then applied by one
+# joined UPDATE. NULL staged values keep the current column value.
+EDIT_STAGE = "#shirt_order_edits"
+CREATE_EDIT_STAGE = _stage_table_sql(EDIT_STAGE, "id INT NOT NULL PRIMARY KEY")
+LOAD_EDIT_STAGE = (
+    f"INSERT INTO {EDIT_STAGE} (id, {', '.join(WRITABLE_COLUMNS)}) "
+    f"VALUES ({_placeholders(len(WRITABLE_COLUMNS) + 1)})"
+)
+APPLY_EDIT_STAGE = (
+    f"UPDATE t SET {', '.join(f'{col} = COALESCE(s.{col}, t.{col})' for col in WRITABLE_COLUMNS)} "
+    f"FROM {TABLE_NAME} AS t INNER JOIN {EDIT_STAGE} AS s ON t.id = s.id; "
+    f"DROP TABLE {EDIT_STAGE}"
+)
+
+# Staged bulk inserts: MERGE ... OUTPUT maps each staged row (seq) to its new id
+INSERT_STAGE = "#shirt_order_inserts"
+CREATE_INSERT_STAGE = _stage_table_sql(INSERT_STAGE, "seq INT NOT NULL PRIMARY KEY")
+LOAD_INSERT_STAGE = (
+    f"INSERT INTO {INSERT_STAGE} (seq, {', '.join(WRITABLE_COLUMNS)}) "
+    f"VALUES ({_placeholders(len(WRITABLE_COLUMNS) + 1)})"
+)
+APPLY_INSERT_STAGE = (
+    f"MERGE {TABLE_NAME} AS t USING {INSERT_STAGE} AS s ON 1 = 0 "
+    f"WHEN NOT MATCHED THEN INSERT ({', '.join(WRITABLE_COLUMNS)}) "
+    f"VALUES ({', '.join(f's.{col}' for col in WRITABLE_COLUMNS)}) "
+    f"OUTPUT s.seq, INSERTED.id;"
+)
+DROP_INSERT_STAGE = f"DROP TABLE {INSERT_STAGE}"
+
+
+def bucket_size(count):
+    """Smallest parameter bucket that holds ``count`` values"""
+    for size in PARAM_BUCKETS:
+        if count <= size:
+            return size
+    raise ValueError(f"{count} parameters exceed the limit of {MAX_SQL_PARAMS}")
+
+
+def pad_to_bucket(values):
+    """Pad ``values`` by repeating the last one up to its bucket size"""
+    size = bucket_size(len(values))
+    return list(values) + [values[-1]] * (size - len(values))
+
+
+_DELETE_IN = {
+    size: (
+        f"DELETE FROM {TABLE_NAME} OUTPUT DELETED.id INTO {TOMBSTONE_TABLE} (id) "
+        f"WHERE id IN ({_placeholders(size)})"
+    )
+    for size in PARAM_BUCKETS
+}
+
+
+def delete_in(ids):
+    """Return (sql, params) deleting up to MAX_SQL_PARAMS ids with a bucketed IN list"""
+    params = pad_to_bucket(ids)
+    return _DELETE_IN[len(params)], params
+
+
+def changes_since(columns):
+    """Batch returning the sync version, rows changed and ids deleted since a token.
+
+    Takes one parameter, the previous sync token, and yields three result
+    sets: ``(token, dbts)``, the changed rows, and the tombstoned ids.
+    """
+    return (
+        "DECLARE @hi BINARY(8) = MIN_ACTIVE_ROWVERSION(); "
+        "DECLARE @lo BINARY(8) = CONVERT(BINARY(8), CAST(? AS BIGINT)); "
+        "SELECT CONVERT(BIGINT, @hi), CONVERT(BIGINT, @@DBTS); "
+        f"SELECT {', '.join(columns)} FROM {TABLE_NAME} "
+        f"WHERE {ROW_VERSION_COLUMN} >= @lo AND {ROW_VERSION_COLUMN} < @hi; "
+        f"SELECT id FROM {TOMBSTONE_TABLE} "
+        f"WHERE {ROW_VERSION_COLUMN} >= @lo AND {ROW_VERSION_COLUMN} < @hi"
+    )
+
+
+def column_mask(order):
+    """Bitmask of the writable columns that carry a non-null value in ``order``"""
+    mask = 0
+    for col, bit in COLUMN_BITS.items():
+        if order.get(col) is not None:
+            mask |= bit
+    return mask
+
+
+def mask_columns(mask):
+    """Writable columns selected by ``mask``, in TABLE_COLUMNS order"""
+    return [col for col, bit in COLUMN_BITS.items() if mask & bit]
+
+
+class UpdateStatementCache:
+    """Bounded LRU of single-row ``UPDATE ... SET`` statements keyed by column mask"""
+
+    def __init__(self, max_size=UPDATE_CACHE_SIZE):
+        self.max_size = max_size
+        self._statements = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, mask):
+        """Return the UPDATE statement setting the columns in ``mask``"""
+        with self._lock:
+            sql = self._statements.get(mask)
+            if sql is not None:
+                self._statements.move_to_end(mask)
+                self.hits += 1
+                return sql
+            self.misses += 1
+        columns = mask_columns(mask)
+        if not columns:
+            raise ValueError("UPDATE needs at least one column")
+        sql = f"UPDATE {TABLE_NAME} SET {', '.join(f'{col} = ?' for col in columns)} WHERE id = ?"
+        with self._lock:
+            self._statements[mask] = sql
+            self._statements.move_to_end(mask)
+            while len(self._statements) > self.max_size:
+                self._statements.popitem(last=False)
+        return sql
+
+    def stats(self):
+        """Return hit/miss counters and the number of cached shapes"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "shapes": len(self._statements),
+                "max_shapes": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+update_statements = UpdateStatementCache()
+
+
+def stats():
+    """Registry statistics for monitoring"""
+    return {
+        "update_shapes": update_statements.stats(),
+        "param_buckets": list(PARAM_BUCKETS),
+    }
@@ -0,0 +1,508 @@
+import os
+import re
+import decimal
+import datetime
+import functools
+
+from schema import TABLE_NAME, TABLE_COLUMNS, COLUMN_LIMITS, ROW_VERSION_COLUMN, TOMBSTONE_TABLE
+import migrations
+import rollups
+import statements
+
+# Storage backends for shirt orders. Every query in main.py and its helpers
+# runs on a pooled connection from the configured backend:
+#
+#   sqlserver  SQL Server through pyodbc (DB_HOST, DB_PORT, DB_USER, ...)
+#   sqlite     an embedded SQLite file (SQLITE_PATH), for single-store
+#              deployments and in-process benchmarks
+#
+# STORAGE_BACKEND defaults to sqlserver; SQLite is only used when selected
+# explicitly, so a SQL Server deployment missing a DB_* variable fails to
+# connect instead of quietly writing to a local file. The application's SQL is written for SQL Server; the
+# SQLite connection rewrites the T-SQL it sends (TOP, OFFSET/FETCH, batches,
+# SCOPE_IDENTITY, OUTPUT ... INTO, #temp tables, the MERGEs, change tracking)
+# and emulates ROWVERSION with a counter bumped by triggers.
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlserver').lower()
+SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shirt_orders.db'))
+# Bytes of the database file read through mmap instead of read() calls
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+# Page cache per connection, in KiB
+SQLITE_CACHE_KB = int(os.getenv('SQLITE_CACHE_KB', str(64 * 1024)))
+# Prepared statements kept per connection; the application uses a few dozen shapes
+SQLITE_STATEMENT_CACHE = int(os.getenv('SQLITE_STATEMENT_CACHE', '256'))
+# Converted DECIMAL/DATE values kept per column type (see _ColumnConverter)
+SQLITE_CONVERTER_CACHE = int(os.getenv('SQLITE_CONVERTER_CACHE', '100000'))
+# Seconds a writer waits for another process's write transaction
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '30'))
+
+VERSION_TABLE = "row_version_counter"
+
+
+@functools.lru_cache(maxsize=None)
+def _sqlite3():
+    """The sqlite3 module, imported on first use: SQL Server deployments never load it"""
+    import sqlite3
+
+    sqlite3.register_adapter(decimal.Decimal, str)
+    sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+    return sqlite3
+
+
+_TOP = re.compile(r"^\s*SELECT TOP \(\?\) (.*)$", re.S)
+_OFFSET_FETCH = re.compile(r"OFFSET \? ROWS FETCH NEXT \? ROWS ONLY\s*$")
+_OUTPUT_INTO = re.compile(r" OUTPUT DELETED\.id INTO \w+ \(id\)")
+_TEMP_TABLE = re.compile(r"#(\w+)")
+_TABLE_HINT = re.compile(r" WITH \((?:HOLDLOCK|UPDLOCK|ROWLOCK)(?:, (?:HOLDLOCK|UPDLOCK|ROWLOCK))*\)")
+_CHANGED_COLUMNS = re.compile(rf"SELECT ([^;]*?) FROM {TABLE_NAME} WHERE {ROW_VERSION_COLUMN} >= @lo")
+
+
+# -- SQLite schema ---------------------------------------------------------------
+
+def _column_check(column, type_def):
+    # SQLite stores any value in any column; these hold it to what SQL Server
+    # would accept. STRICT tables would do part of this but only allow
+    # INTEGER/REAL/TEXT, losing the DECIMAL and DATE declared types
+    kind = type_def.split("(")[0].split()[0]
+    if kind == "DECIMAL":
+        return (f"typeof({column}) IN ('integer', 'real') "
+                f"AND abs({column}) < {COLUMN_LIMITS[column]}")
+    if kind == "INT":
+        return f"typeof({column}) = 'integer'"
+    if kind == "DATE":
+        return f"date({column}) IS {column}"
+    if kind == "VARCHAR":
+        return f"length({column}) <= {COLUMN_LIMITS[column]}"
+    return None
+
+
+def _column_sql(column, type_def):
+    if column == "id":
+        return "id INTEGER PRIMARY KEY AUTOINCREMENT"
+    check = _column_check(column, type_def)
+    if check is None:
+        return f"{column} {type_def}"
+    return f"{column} {type_def} CHECK ({column} IS NULL OR ({check}))"
+
+
+def create_schema(conn):
+    """Tables and indexes matching the latest migration, without the change-tracking triggers"""
+    columns = [_column_sql(col, type_def) for col, type_def in TABLE_COLUMNS.items()]
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+            {', '.join(columns)}, {ROW_VERSION_COLUMN} INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS {TOMBSTONE_TABLE} (id INTEGER NOT NULL, {ROW_VERSION_COLUMN} INTEGER NOT NULL DEFAULT 0);
+        CREATE INDEX IF NOT EXISTS ix_{TOMBSTONE_TABLE}_version ON {TOMBSTONE_TABLE} ({ROW_VERSION_COLUMN});
+        CREATE INDEX IF NOT EXISTS ix_{TABLE_NAME}_version ON {TABLE_NAME} ({ROW_VERSION_COLUMN});
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (v INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS {rollups.ROLLUP_TABLE} ({rollups.ROLLUP_TABLE_COLUMNS_SQL});
+    """)
+    # Columns added to TABLE_COLUMNS after the file was created
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({TABLE_NAME})")}
+    for col, type_def in TABLE_COLUMNS.items():
+        if col not in existing:
+            conn.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {_column_sql(col, type_def)}")
+    for migration in migrations.MIGRATIONS:
+        for index in migration.drop_indexes:
+            conn.execute(index.sqlite_drop_sql())
+        for index in migration.create_indexes:
+            conn.execute(index.sqlite_create_sql())
+    if conn.execute(f"SELECT COUNT(*) FROM {VERSION_TABLE}").fetchone()[0] == 0:
+        conn.execute(f"INSERT INTO {VERSION_TABLE} (v) SELECT COALESCE(MAX({ROW_VERSION_COLUMN}), 0) FROM {TABLE_NAME}")
+
+
+def create_triggers(conn):
+    """Bump the version counter and stamp row_version on every change, like ROWVERSION"""
+    bump = f"UPDATE {VERSION_TABLE} SET v = v + 1"
+    current = f"(SELECT v FROM {VERSION_TABLE})"
+    conn.executescript(f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE_NAME}_version_insert AFTER INSERT ON {TABLE_NAME} BEGIN
+            {bump};
+            UPDATE {TABLE_NAME} SET {ROW_VERSION_COLUMN} = {current} WHERE id = NEW.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS {TABLE_NAME}_version_update AFTER UPDATE ON {TABLE_NAME}
+        WHEN NEW.{ROW_VERSION_COLUMN} = OLD.{ROW_VERSION_COLUMN} BEGIN
+            {bump};
+            UPDATE {TABLE_NAME} SET {ROW_VERSION_COLUMN} = {current} WHERE id = NEW.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS {TABLE_NAME}_version_delete AFTER DELETE ON {TABLE_NAME} BEGIN
+            {bump};
+            INSERT INTO {TOMBSTONE_TABLE} (id, {ROW_VERSION_COLUMN}) VALUES (OLD.id, {current});
+        END;
+    """)
+
+
+# -- T-SQL to SQLite -------------------------------------------------------------
+
+def _limit_first(params):
+    # TOP (?) comes first in T-SQL, LIMIT ? last in SQLite
+    return params[1:] + params[:1]
+
+
+def _offset_fetch(params):
+    # OFFSET ? ROWS FETCH NEXT ? ROWS ONLY -> LIMIT ? OFFSET ?
+    return params[:-2] + [params[-1], params[-2]]
+
+
+@functools.lru_cache(maxsize=SQLITE_STATEMENT_CACHE)
+def _split_batch(sql):
+    """Statements of a T-SQL batch as (sqlite sql, parameter count, parameter reorder).
+
+    Memoized: the application sends a small set of statement texts, so after
+    the first call a batch costs one lookup, and the identical rewritten text
+    hits sqlite3's prepared statement cache.
+    """
+    return tuple(_translate(part.strip()) for part in sql.split(";") if part.strip())
+
+
+def _translate(sql):
+    count = sql.count("?")
+    if sql == statements.SYNC_VERSION:
+        return f"SELECT v + 1, v FROM {VERSION_TABLE}", count, None
+    if sql == "SELECT SCOPE_IDENTITY()":
+        return "SELECT last_insert_rowid()", count, None
+    match = _TOP.match(sql)
+    if match:
+        return f"SELECT {match.group(1)} LIMIT ?", count, _limit_first
+    match = _OFFSET_FETCH.search(sql)
+    if match:
+        return f"{sql[:match.start()]}LIMIT ? OFFSET ?", count, _offset_fetch
+    sql = _OUTPUT_INTO.sub("", sql)
+    sql = _TABLE_HINT.sub("", sql)
+    sql = _TEMP_TABLE.sub(r"temp.\1", sql)
+    return sql, count, None
+
+
+def _description(*names):
+    return tuple((name, None, None, None, None, None, None) for name in names)
+
+
+# -- Result values -----------------------------------------------------------------
+
+def _to_decimal(value):
+    # Formatting to two places is about three times cheaper than quantize()
+    try:
+        return decimal.Decimal("%.2f" % value)
+    except TypeError:
+        return None
+
+
+def _to_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _ColumnConverter:
+    """Converts result columns a column at a time through a cache of converted values.
+
+    A DECIMAL(5,2) column has few distinct values and pages are read again
+    and again, so after warm-up a value costs one dict lookup instead of a
+    Decimal construction. The cache is swapped for an empty one when full;
+    a thread still holding the old one keeps using it safely.
+    """
+
+    def __init__(self, convert, max_size=SQLITE_CONVERTER_CACHE):
+        self.convert = convert
+        self.max_size = max_size
+        self._cache = {}
+
+    def __call__(self, values):
+        cache = self._cache
+        missing = set(values).difference(cache)
+        if missing:
+            if len(cache) + len(missing) > self.max_size:
+                cache = self._cache = {}
+            cache.update((value, self.convert(value)) for value in missing)
+        return [cache[value] for value in values]
+
+
+_decimal_column = _ColumnConverter(_to_decimal)
+_date_column = _ColumnConverter(_to_date)
+
+
+# Result columns returned as pyodbc returns them from SQL Server, by name.
+# Rollup sums and aliases (下单日期 AS day) carry the name of the column
+# they stand for
+_COLUMN_CONVERTERS = {
+    col: _decimal_column if type_def.startswith("DECIMAL") else _date_column
+    for col, type_def in TABLE_COLUMNS.items() if type_def.startswith(("DECIMAL", "DATE"))
+}
+_COLUMN_CONVERTERS.update({"day": _date_column, rollups.ROLLUP_AMOUNT: _decimal_column})
+
+
+def _result(description, rows):
+    """A (description, rows) result set with DECIMAL and DATE columns converted.
+
+    Conversion runs a column at a time rather than per value in sqlite3's
+    converter hook. A value that does not parse, written before the CHECK
+    constraints existed, comes back as None instead of failing the read.
+    """
+    converters = [(i, _COLUMN_CONVERTERS[column[0]]) for i, column in enumerate(description)
+                  if column[0] in _COLUMN_CONVERTERS]
+    if not rows or not converters:
+        return description, rows
+    columns = list(zip(*rows))
+    for i, convert in converters:
+        columns[i] = convert(columns[i])
+    return description, list(zip(*columns))
+
+
+def _apply_edit_stage(cursor, sql, params):
+    stage = _TEMP_TABLE.sub(r"temp.\1", statements.EDIT_STAGE)
+    assignments = ", ".join(f"{col} = COALESCE(s.{col}, {TABLE_NAME}.{col})" for col in statements.WRITABLE_COLUMNS)
+    cursor.execute(f"UPDATE {TABLE_NAME} SET {assignments} FROM {stage} AS s WHERE {TABLE_NAME}.id = s.id")
+    cursor.execute(f"DROP TABLE {stage}")
+    return []
+
+
+def _apply_insert_stage(cursor, sql, params):
+    stage = _TEMP_TABLE.sub(r"temp.\1", statements.INSERT_STAGE)
+    columns = ", ".join(statements.WRITABLE_COLUMNS)
+    seqs = [row[0] for row in cursor.execute(f"SELECT seq FROM {stage} ORDER BY seq")]
+    ids = [row[0] for row in cursor.execute(
+        f"INSERT INTO {TABLE_NAME} ({columns}) SELECT {columns} FROM {stage} ORDER BY seq RETURNING id"
+    ).fetchall()]
+    return [(_description("seq", "id"), list(zip(seqs, sorted(ids))))]
+
+
+def _merge_rollup(cursor, sql, params):
+    value_columns = ("day",) + rollups.ROLLUP_DIMENSIONS + ("order_count",) + rollups.ROLLUP_QUANTITIES + \
+        (rollups.ROLLUP_AMOUNT,)
+    counters = ("order_count",) + rollups.ROLLUP_QUANTITIES + (rollups.ROLLUP_AMOUNT,)
+    keys = ("day",) + rollups.ROLLUP_DIMENSIONS
+    width = len(value_columns)
+    rows = [params[i:i + width] for i in range(0, len(params), width)]
+    cursor.executemany(
+        f"INSERT INTO {rollups.ROLLUP_TABLE} ({', '.join(value_columns)}) VALUES ({', '.join('?' * width)}) "
+        f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+        + ", ".join(f"{col} = {col} + excluded.{col}" for col in counters),
+        [row for row in rows if row[0] is not None],
+    )
+    cursor.execute(f"DELETE FROM {rollups.ROLLUP_TABLE} WHERE order_count <= 0")
+    return []
+
+
+def _create_rollup_table(cursor, sql, params):
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {rollups.ROLLUP_TABLE} ({rollups.ROLLUP_TABLE_COLUMNS_SQL})")
+    return []
+
+
+def _changes_since(cursor, sql, params):
+    # Writes are serialized, so every row below the next counter value is committed
+    columns = _CHANGED_COLUMNS.search(sql).group(1)
+    version = cursor.execute(f"SELECT v + 1, v FROM {VERSION_TABLE}").fetchall()
+    low, high = params[0], version[0][0]
+    changed = cursor.execute(
+        f"SELECT {columns} FROM {TABLE_NAME} WHERE {ROW_VERSION_COLUMN} >= ? AND {ROW_VERSION_COLUMN} < ?",
+        (low, high),
+    )
+    results = [(_description("token", "dbts"), version), _result(changed.description, changed.fetchall())]
+    deleted = cursor.execute(
+        f"SELECT id FROM {TOMBSTONE_TABLE} WHERE {ROW_VERSION_COLUMN} >= ? AND {ROW_VERSION_COLUMN} < ?",
+        (low, high),
+    )
+    results.append((deleted.description, deleted.fetchall()))
+    return results
+
+
+_HANDLERS = {
+    statements.APPLY_EDIT_STAGE: _apply_edit_stage,
+    statements.APPLY_INSERT_STAGE: _apply_insert_stage,
+    rollups.CREATE_ROLLUP_TABLE_SQL: _create_rollup_table,
+}
+
+
+def _handler(sql):
+    handler = _HANDLERS.get(sql)
+    if handler is not None:
+        return handler
+    head = sql.lstrip()
+    if head.startswith(f"MERGE {rollups.ROLLUP_TABLE}"):
+        return _merge_rollup
+    if head.startswith("DECLARE @hi"):
+        return _changes_since
+    return None
+
+
+class SqliteCursor:
+    """The subset of a pyodbc cursor the application uses, over a sqlite3 cursor"""
+
+    def __init__(self, conn):
+        self._cursor = conn.cursor()
+        self._results = []
+        self._rows = []
+        self.description = None
+        self.fast_executemany = False
+
+    def execute(self, sql, params=()):
+        params = list(params)
+        if "UPDLOCK" in sql and not self._cursor.connection.in_transaction:
+            # SQLite has no row locks: take the write lock before reading rows
+            # the transaction is about to change, like UPDLOCK on SQL Server
+            self._cursor.execute("BEGIN IMMEDIATE")
+        handler = _handler(sql)
+        if handler is not None:
+            results = handler(self._cursor, sql, params)
+        else:
+            results = []
+            for statement, count, reorder in _split_batch(sql):
+                statement_params, params = params[:count], params[count:]
+                if reorder is not None:
+                    statement_params = reorder(statement_params)
+                self._cursor.execute(statement, statement_params)
+                if self._cursor.description is not None:
+                    results.append(_result(self._cursor.description, self._cursor.fetchall()))
+        self._results = results
+        self.nextset()
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        (statement, _, _), = _split_batch(sql)
+        self._cursor.executemany(statement, seq_of_params)
+
+    def nextset(self):
+        if not self._results:
+            self.description = None
+            self._rows = []
+            return False
+        self.description, self._rows = self._results.pop(0)
+        return True
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        self._cursor.close()
+
+
+class SqliteConnection:
+    """pyodbc-like connection to a SQLite database file, tuned for a local disk.
+
+    WAL lets readers run while one process writes; synchronous=NORMAL syncs
+    at checkpoints rather than on every commit (a power loss can drop the last
+    transactions but never corrupts the file); reads go through mmap and a
+    large page cache.
+    """
+
+    def __init__(self, path, mmap_size=SQLITE_MMAP_SIZE, cache_kb=SQLITE_CACHE_KB):
+        self.raw = _sqlite3().connect(path, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT,
+                                   cached_statements=SQLITE_STATEMENT_CACHE)
+        self.raw.execute("PRAGMA journal_mode = WAL")
+        self.raw.execute("PRAGMA synchronous = NORMAL")
+        self.raw.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+        self.raw.execute(f"PRAGMA cache_size = {-int(cache_kb)}")
+        self.raw.execute("PRAGMA temp_store = MEMORY")
+
+    def cursor(self):
+        return SqliteCursor(self.raw)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+
+# -- Backends --------------------------------------------------------------------
+
+_CREATE_MIGRATIONS_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {migrations.MIGRATIONS_TABLE} (
+        version INTEGER NOT NULL PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        duration_ms INTEGER NOT NULL
+    )
+"""
+
+class SqlServerBackend:
+    """SQL Server through pyodbc"""
+
+    name = "sqlserver"
+
+    def __init__(self, connection_string, location):
+        self.connection_string = connection_string
+        # host:port/database, without credentials
+        self.location = location
+
+    def connect(self):
+        # Imported on first connect: loading the ODBC driver manager slows startup
+        import pyodbc
+
+        return pyodbc.connect(self.connection_string)
+
+    def migrate(self, conn, target=migrations.LATEST_VERSION):
+        """Apply pending migrations; returns the migrations applied"""
+        return migrations.migrate(conn, target)
+
+    def status(self, conn):
+        """Rows of (version, name, applied_at or None) for every known migration"""
+        return migrations.status(conn.cursor())
+
+
+class SqliteBackend:
+    """Embedded SQLite database file"""
+
+    name = "sqlite"
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = os.path.abspath(path)
+        self.location = self.path
+
+    def connect(self):
+        return SqliteConnection(self.path)
+
+    def migrate(self, conn, target=migrations.LATEST_VERSION):
+        """Create or update the schema to the latest migration; returns the versions brought in"""
+        if target != migrations.LATEST_VERSION:
+            raise ValueError("SQLite databases can only be migrated to the latest version")
+        current = conn.raw.execute("PRAGMA user_version").fetchone()[0]
+        if current == migrations.LATEST_VERSION:
+            return []
+        create_schema(conn.raw)
+        create_triggers(conn.raw)
+        brought_in = [m for m in migrations.MIGRATIONS if m.version > current]
+        conn.raw.execute(_CREATE_MIGRATIONS_TABLE)
+        conn.raw.executemany(
+            f"INSERT OR IGNORE INTO {migrations.MIGRATIONS_TABLE} (version, name, duration_ms) VALUES (?, ?, 0)",
+            [(m.version, m.name) for m in brought_in],
+        )
+        conn.raw.execute(f"PRAGMA user_version = {migrations.LATEST_VERSION}")
+        conn.raw.commit()
+        return [m.version for m in brought_in]
+
+    def status(self, conn):
+        """Rows of (version, name, applied_at or None) for every known migration.
+
+        The schema is at PRAGMA user_version; versions applied before the
+        migrations table was kept show as applied without a time.
+        """
+        current = conn.raw.execute("PRAGMA user_version").fetchone()[0]
+        conn.raw.execute(_CREATE_MIGRATIONS_TABLE)
+        applied = dict(conn.raw.execute(f"SELECT version, applied_at FROM {migrations.MIGRATIONS_TABLE}"))
+        return [
+            (m.version, m.name, applied.get(m.version) or ("applied" if m.version <= current else None))
+            for m in migrations.MIGRATIONS
+        ]
+
+
+def from_env(sqlserver_connection_string, sqlserver_location, backend=STORAGE_BACKEND):
+    """The backend selected by STORAGE_BACKEND, or None when it is not configured"""
+    if backend == "sqlite":
+        return SqliteBackend()
+    if backend == "sqlserver" and sqlserver_connection_string:
+        return SqlServerBackend(sqlserver_connection_string, sqlserver_location)
+    return None
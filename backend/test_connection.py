@@ -3,6 +3,10 @@
 import sys
 import database_handler
 import sqlite3
+import threading
+import asyncio
+from db_pool import ConnectionPool, PoolTimeout, sqlite_connection_factory
+from db_executor import run_db, DB_EXECUTOR_WORKERS
 import os
 import json
 from dotenv import load_dotenv
@@ -148,17 +152,129 @@ def test_order_insertion():
         print(f"❌ Order insertion test failed: {str(e)}")
         return False
 
+def test_connection_pool():
+    """Exercise the connection pool against a local SQLite stand-in"""
+    try:
+        print("\n===== Testing Connection Pool =====")
+        pool = ConnectionPool(sqlite_connection_factory(DB_PATH), min_size=1, max_size=2,
+                              timeout=0.5, validate_after=0)
+        pool.open()
+        
+        # Borrow concurrently from several threads; connections must be reused
+        def borrow():
+            for _ in range(20):
+                with pool.connection() as conn:
+                    conn.execute("SELECT 1").fetchone()
+        threads = [threading.Thread(target=borrow) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        stats = pool.stats()
+        if stats["created"] > pool.max_size:
+            print(f"❌ Pool opened {stats['created']} connections, more than max_size={pool.max_size}")
+            return False
+        print(f"✅ {stats['borrows']} borrows served by {stats['created']} connections "
+              f"(avg wait {stats['wait_ms_avg']} ms, max wait {stats['wait_ms_max']} ms)")
+        
+        # An exhausted pool must time out instead of opening more connections
+        held = [pool.acquire(), pool.acquire()]
+        try:
+            pool.acquire()
+            print("❌ Exhausted pool handed out a third connection")
+            return False
+        except PoolTimeout:
+            print("✅ Exhausted pool timed out as expected")
+        finally:
+            for entry in held:
+                pool.release(entry)
+        
+        # Connections past their max lifetime are replaced on borrow
+        pool.max_lifetime = 0.01
+        time.sleep(0.02)
+        with pool.connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+        if pool.stats()["recycled"] < 1:
+            print("❌ Expired connection was not recycled")
+            return False
+        print("✅ Expired connection was recycled")
+        
+        pool.close()
+        return True
+    except Exception as e:
+        print(f"❌ Connection pool test failed: {str(e)}")
+        return False
+
+def test_concurrent_queries():
+    """Check that parallel slow queries overlap and do not block the event loop"""
+    try:
+        print("\n===== Testing Concurrent Queries =====")
+        delay = 0.3
+        parallel = min(4, DB_EXECUTOR_WORKERS)
+        
+        # SQLite stand-in with a sleep() SQL function to simulate a slow RDS query
+        def connect():
+            conn = sqlite3.connect(":memory:", check_same_thread=False)
+            conn.create_function("sleep", 1, lambda seconds: time.sleep(seconds) or 0)
+            return conn
+        pool = ConnectionPool(connect, min_size=0, max_size=parallel, timeout=5)
+        
+        def slow_query():
+            with pool.connection() as conn:
+                return conn.execute("SELECT sleep(?)", (delay,)).fetchone()[0]
+        
+        async def heartbeat(stop, lags):
+            # Measure how late the event loop wakes up while queries run
+            while not stop.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lags.append(time.perf_counter() - start - 0.01)
+        
+        async def run():
+            stop = asyncio.Event()
+            lags = []
+            beat = asyncio.create_task(heartbeat(stop, lags))
+            start = time.perf_counter()
+            await asyncio.gather(*(run_db(slow_query) for _ in range(parallel)))
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await beat
+            return elapsed, max(lags) if lags else 0.0
+        
+        elapsed, max_lag = asyncio.run(run())
+        pool.close()
+        
+        serial = delay * parallel
+        print(f"{parallel} queries of {delay}s took {elapsed:.2f}s (serial would be {serial:.2f}s), "
+              f"max event loop lag {max_lag * 1000:.1f} ms")
+        if elapsed >= serial * 0.75:
+            print("❌ Slow queries were serialized")
+            return False
+        if max_lag >= delay:
+            print("❌ Event loop was blocked by a database call")
+            return False
+        print("✅ Slow queries ran in parallel without blocking the event loop")
+        return True
+    except Exception as e:
+        print(f"❌ Concurrent query test failed: {str(e)}")
+        return False
+
 if __name__ == "__main__":
     # Run all tests
     sqlite_success = test_sqlite_connection()
     sqlserver_success = test_sqlserver_connection()
     insertion_success = test_order_insertion()
+    pool_success = test_connection_pool()
+    concurrency_success = test_concurrent_queries()
     
     # Summary
     print("\n===== Test Summary =====")
     print(f"SQLite Connection: {'✅ Success' if sqlite_success else '❌ Failed'}")
     print(f"SQL Server Connection: {'✅ Success' if sqlserver_success else '❌ Failed or Disabled'}")
     print(f"Order Insertion: {'✅ Success' if insertion_success else '❌ Failed'}")
+    print(f"Connection Pool: {'✅ Success' if pool_success else '❌ Failed'}")
+    print(f"Concurrent Queries: {'✅ Success' if concurrency_success else '❌ Failed'}")
     
     if sqlite_success:
         print("\n✅ Your application should be able to store orders in the SQLite database")
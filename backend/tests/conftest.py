@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+import tempfile
+
+import pytest
+
+# The API reads its configuration at import: point it at a throwaway SQLite
+# database and cache directory before any test imports main
+_TMP = tempfile.mkdtemp(prefix="suit_crm_tests_")
+os.environ["STORAGE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(_TMP, "orders.db")
+os.environ["ORDER_CACHE_DIR"] = os.path.join(_TMP, "cache")
+os.environ["REPLICA_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def client():
+    """A TestClient over the app, started once and ready to serve"""
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as test_client:
+        for _ in range(200):
+            if test_client.get("/readyz").status_code == 200:
+                break
+            time.sleep(0.05)
+        yield test_client
+
+
+@pytest.fixture
+def create_order(client):
+    """Create an order through the API and return its id"""
+    def create(**fields):
+        response = client.post("/api/shirt-orders", json={"姓名": "测试", **fields}).json()
+        assert response["success"], response
+        return response["order_id"]
+    return create
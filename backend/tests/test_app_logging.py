@@ -0,0 +1,46 @@
+import logging
+
+import app_logging
+
+
+class Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def capture(name):
+    logger = app_logging.get_logger(name)
+    handler = Capture()
+    logger.addHandler(handler)
+    return logger, handler
+
+
+def test_sampler_logs_one_in_every():
+    logger, handler = capture("test_sampler")
+    sample = app_logging.Sampler(logger, logging.WARNING, every=3)
+    for i in range(7):
+        sample("call %s", i)
+    assert [record.getMessage() for record in handler.records] == ["call 0", "call 3", "call 6"]
+    assert handler.records[0].sample_every == 3
+
+
+def test_sampler_passes_exc_info():
+    logger, handler = capture("test_sampler_exc")
+    sample = app_logging.Sampler(logger, logging.ERROR, every=1)
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError as e:
+        sample("failed: %s", e, exc_info=True)
+    assert handler.records[0].exc_info[0] is RuntimeError
+
+
+def test_sampler_skips_disabled_level():
+    logger, handler = capture("test_sampler_debug")
+    logger.setLevel(logging.INFO)
+    sample = app_logging.Sampler(logger, logging.DEBUG, every=1)
+    sample("hidden")
+    assert handler.records == []
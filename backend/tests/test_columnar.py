@@ -0,0 +1,93 @@
+import json
+import base64
+import decimal
+import datetime
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+import columnar
+
+
+def decode(payload):
+    """Python twin of decodeColumnar in frontend/src/utils/columnar.ts"""
+    length = payload["length"]
+    rows = [{} for _ in range(length)]
+    for name, column in zip(payload["columns"], payload["data"]):
+        mask = [False] * length
+        runs = column.get("null_runs", [])
+        for start, count in zip(runs[::2], runs[1::2]):
+            mask[start:start + count] = [True] * count
+        if "null_bitmap" in column:
+            bitmap = base64.b64decode(column["null_bitmap"])
+            mask = [bool(bitmap[i >> 3] >> (i & 7) & 1) for i in range(length)]
+        dictionary = column.get("dict")
+        source = iter(column["codes"] if dictionary else column["values"])
+        for i, row in enumerate(rows):
+            if mask[i]:
+                row[name] = None
+            else:
+                value = next(source)
+                row[name] = dictionary[value] if dictionary else value
+    return rows
+
+
+def round_trip(columns, rows):
+    return decode(columnar.encode_columnar(columns, rows))
+
+
+def test_round_trip_plain_values():
+    rows = [
+        (1, "张三", decimal.Decimal("599.50"), datetime.date(2025, 3, 1), decimal.Decimal("2")),
+        (2, None, None, None, None),
+    ]
+    assert round_trip(["id", "姓名", "定制金额", "下单日期", "西装数量"], rows) == [
+        {"id": 1, "姓名": "张三", "定制金额": 599.5, "下单日期": "2025-03-01", "西装数量": 2},
+        {"id": 2, "姓名": None, "定制金额": None, "下单日期": None, "西装数量": None},
+    ]
+
+
+def test_repeated_strings_use_a_dictionary():
+    values = ["网店", "门店", "网店", None, "网店", "门店"]
+    column = columnar.encode_column(values)
+    assert column["dict"] == ["网店", "门店"]
+    assert column["codes"] == [0, 1, 0, 0, 1]
+    assert round_trip(["客户来源"], [(value,) for value in values]) == [{"客户来源": value} for value in values]
+
+
+def test_nulls_as_runs_or_bitmap():
+    clustered = [None] * 40 + list(range(40))
+    assert "null_runs" in columnar.encode_column(clustered)
+    scattered = [None if i % 3 else i for i in range(90)]
+    assert "null_bitmap" in columnar.encode_column(scattered)
+    for values in (clustered, scattered, [None] * 9, [1, 2, 3], []):
+        assert round_trip(["v"], [(value,) for value in values]) == [{"v": value} for value in values]
+
+
+def test_positions_project_wider_rows():
+    rows = [(1, "a", "x"), (2, "b", "y")]
+    payload = columnar.encode_columnar(["id", "c"], rows, positions=[0, 2])
+    assert decode(payload) == [{"id": 1, "c": "x"}, {"id": 2, "c": "y"}]
+
+
+def test_api_columnar_matches_json(client, create_order):
+    create_order(定制金额=599.5, 下单日期="2025-03-01", 客户来源="网店")
+    create_order(客户来源="网店")
+    plain = client.get("/api/shirt-orders").json()
+    packed = client.get("/api/shirt-orders", params={"format": "columnar"}).json()
+    assert "orders" not in packed
+    assert decode(packed["columnar"]) == plain["orders"]
+
+
+@pytest.mark.parametrize("value", [
+    decimal.Decimal("599.50"), decimal.Decimal("2"), decimal.Decimal("1E+2"),
+    datetime.date(2025, 3, 1), datetime.datetime(2025, 3, 1, 8, 30), datetime.time(8, 30),
+])
+def test_plain_value_matches_jsonable_encoder(value):
+    assert columnar.plain_value(value) == jsonable_encoder(value)
+    assert json.loads(json.dumps([value], default=columnar.json_default)) == [jsonable_encoder(value)]
+
+
+def test_json_default_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        json.dumps(object(), default=columnar.json_default)
@@ -0,0 +1,75 @@
+import gzip
+import zlib
+
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from compression import CompressionMiddleware, GzipCompressor, negotiate
+
+BODY = b'{"orders": [' + b", ".join(b'{"id": %d}' % i for i in range(200)) + b"]}"
+
+
+def test_negotiate_prefers_highest_q():
+    available = {"zstd": None, "br": None, "gzip": None}
+    assert negotiate("gzip, br", available) == "br"
+    assert negotiate("gzip;q=1.0, br;q=0.5", available) == "gzip"
+    assert negotiate("br;q=0, gzip", available) == "gzip"
+    assert negotiate("*", available) == "zstd"
+    assert negotiate("*;q=0.5, zstd;q=0", available) == "br"
+
+
+def test_negotiate_without_acceptable_encoding():
+    assert negotiate("identity", {"gzip": None}) is None
+    assert negotiate("gzip;q=0", {"gzip": None}) is None
+    assert negotiate("gzip;q=bad", {"gzip": None}) is None
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024, encodings={"gzip": GzipCompressor}, enabled=True)
+
+    @app.get("/large")
+    def large():
+        return Response(BODY, media_type="application/json", headers={"Vary": "Origin"})
+
+    @app.get("/small")
+    def small():
+        return Response(b'{"ok": true}', media_type="application/json")
+
+    @app.get("/image")
+    def image():
+        return Response(BODY, media_type="image/png")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"line %d\n" % i for i in range(50)]), media_type="text/plain")
+
+    return TestClient(app)
+
+
+def test_large_json_is_gzipped_with_vary():
+    response = make_client().get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Origin, Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(BODY)
+    assert response.content == BODY
+
+
+def test_passthrough_cases():
+    client = make_client()
+    for path, accept in (("/large", "identity"), ("/small", "gzip"), ("/image", "gzip")):
+        response = client.get(path, headers={"Accept-Encoding": accept})
+        assert "content-encoding" not in response.headers, path
+        assert "Accept-Encoding" not in response.headers.get("vary", ""), path
+
+
+def test_streaming_chunks_are_flushed_independently():
+    with make_client().stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        chunks = list(response.iter_raw())
+    # Every chunk ends on a sync flush, so the rows decode as they arrive
+    decompressor = zlib.decompressobj(31)
+    assert decompressor.decompress(chunks[0]).startswith(b"line 0\n")
+    assert gzip.decompress(b"".join(chunks)) == b"".join(b"line %d\n" % i for i in range(50))
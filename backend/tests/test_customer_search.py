@@ -0,0 +1,178 @@
+import pytest
+
+import storage
+import statements
+from customer_search import CustomerIndex, EXACT, PREFIX, SUBSTRING
+
+
+class Store:
+    """A migrated SQLite orders file read the way main.py feeds the index"""
+
+    def __init__(self, path):
+        backend = storage.SqliteBackend(path)
+        self.conn = backend.connect()
+        backend.migrate(self.conn)
+
+    def insert(self, name, phone=None, date=None):
+        cursor = self.conn.cursor()
+        cursor.execute(statements.INSERT_ORDER, self._values(name, phone, date))
+        cursor.execute("SELECT SCOPE_IDENTITY()")
+        order_id = int(cursor.fetchone()[0])
+        self.conn.commit()
+        return order_id
+
+    def update(self, order_id, **fields):
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        self.conn.cursor().execute(f"UPDATE shirt_orders SET {assignments} WHERE id = ?", [*fields.values(), order_id])
+        self.conn.commit()
+
+    def delete(self, order_id):
+        self.conn.cursor().execute("DELETE FROM shirt_orders WHERE id = ?", (order_id,))
+        self.conn.commit()
+
+    @staticmethod
+    def _values(name, phone, date):
+        values = dict.fromkeys(statements.WRITABLE_COLUMNS)
+        values.update({"姓名": name, "电话": phone, "下单日期": date})
+        return list(values.values())
+
+    def load(self, index):
+        cursor = self.conn.cursor()
+        cursor.execute(statements.SYNC_VERSION)
+        token = cursor.fetchone()[0]
+        cursor.execute(f"SELECT {', '.join(statements.ORDER_COLUMNS)} FROM shirt_orders")
+        index.load([tuple(row) for row in cursor.fetchall()], token)
+
+    def sync(self, index):
+        cursor = self.conn.cursor()
+        cursor.execute(statements.changes_since(statements.ORDER_COLUMNS), (index.sync_token,))
+        token = cursor.fetchone()[0]
+        cursor.nextset()
+        rows = [tuple(row) for row in cursor.fetchall()]
+        cursor.nextset()
+        index.apply(rows, [row[0] for row in cursor.fetchall()], token)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = Store(str(tmp_path / "orders.db"))
+    yield store
+    store.conn.close()
+
+
+def field(customer, column):
+    value = customer.latest[statements.ORDER_COLUMNS.index(column)]
+    return None if value is None else str(value)
+
+
+def found(index, query):
+    return [(field(customer, "姓名"), field(customer, "下单日期"), match) for customer, match in index.search(query)]
+
+
+def test_load_groups_orders_by_phone_then_name(store):
+    store.insert("王伟", "138-0013-8000", "2025-01-01")
+    store.insert("王伟", "13800138000", "2025-02-01")
+    store.insert("王伟", None, "2025-03-01")
+    store.insert("王 伟", None, "2025-04-01")
+    store.insert("李娜", "13900139000")
+    index = CustomerIndex()
+    store.load(index)
+    assert len(index) == 3
+    assert index.stats()["orders"] == 5
+    by_phone, = [customer for customer, _ in index.search("13800138000")]
+    assert len(by_phone.order_ids) == 2
+    assert field(by_phone, "下单日期") == "2025-02-01"
+
+
+def test_exact_then_prefix_then_substring_by_recency(store):
+    store.insert("王伟", "1", "2024-01-01")
+    store.insert("王伟明", "2", "2025-01-01")
+    store.insert("王伟东", "3", "2023-01-01")
+    store.insert("小王伟", "4", "2025-06-01")
+    store.insert("张三", "5", "2025-07-01")
+    index = CustomerIndex()
+    store.load(index)
+    assert found(index, "王伟") == [
+        ("王伟", "2024-01-01", EXACT),
+        ("王伟明", "2025-01-01", PREFIX),
+        ("王伟东", "2023-01-01", PREFIX),
+        ("小王伟", "2025-06-01", SUBSTRING),
+    ]
+    assert [name for name, _, _ in found(index, "王")] == ["王伟明", "王伟", "王伟东", "小王伟"]
+
+
+def test_phone_search_needs_three_digits(store):
+    store.insert("王伟", "13800138000")
+    store.insert("李娜", "13900138000")
+    index = CustomerIndex()
+    store.load(index)
+    assert found(index, "13") == []
+    assert [(name, match) for name, _, match in found(index, "138")] == [("王伟", PREFIX), ("李娜", SUBSTRING)]
+    assert sorted(name for name, _, _ in found(index, "0138000")) == ["李娜", "王伟"]
+    assert [match for _, _, match in found(index, "138 0013 8000")] == [EXACT]
+
+
+def test_edit_and_delete_recompute_latest_order(store):
+    older = store.insert("王伟", "13800138000", "2025-01-01")
+    newer = store.insert("王大伟", "13800138000", "2025-02-01")
+    index = CustomerIndex()
+    store.load(index)
+    # The name searched for is the one on the customer's latest order
+    assert found(index, "王大伟") == [("王大伟", "2025-02-01", EXACT)]
+
+    store.update(newer, 下单日期="2024-01-01")
+    store.sync(index)
+    assert found(index, "王伟") == [("王伟", "2025-01-01", EXACT)]
+    assert found(index, "王大伟") == []
+
+    store.update(newer, 下单日期="2026-01-01")
+    store.sync(index)
+    store.delete(newer)
+    store.sync(index)
+    assert found(index, "王伟") == [("王伟", "2025-01-01", EXACT)]
+    customer, _ = index.search("王伟")[0]
+    assert customer.order_ids == {older}
+
+
+def test_removed_customers_free_their_slot(store):
+    first = store.insert("王伟", "13800138000")
+    store.insert("李娜", "13900139000")
+    index = CustomerIndex()
+    store.load(index)
+    slot = index.search("王伟")[0][0].slot
+
+    store.delete(first)
+    store.sync(index)
+    assert len(index) == 1
+    assert found(index, "王伟") == [] and found(index, "13800138000") == []
+
+    store.insert("赵敏", "13700137000")
+    store.sync(index)
+    customer, _ = index.search("赵敏")[0]
+    assert customer.slot == slot
+    assert len(index) == 2
+    assert found(index, "李娜") == [("李娜", None, EXACT)]
+
+
+def test_phone_change_moves_order_between_customers(store):
+    moving = store.insert("王伟", "13800138000", "2025-03-01")
+    store.insert("王伟", "13800138000", "2025-01-01")
+    index = CustomerIndex()
+    store.load(index)
+    store.update(moving, 电话="13900139000")
+    store.sync(index)
+    assert len(index) == 2
+    old, = index.search("13800138000")
+    new, = index.search("13900139000")
+    assert field(old[0], "下单日期") == "2025-01-01"
+    assert new[0].order_ids == {moving}
+
+
+def test_search_endpoint_sees_new_orders(client, create_order):
+    create_order(姓名="欧阳娜娜", 电话="13611112222", 下单日期="2025-05-01")
+    response = client.get("/api/customers/search", params={"q": "欧阳"}).json()
+    assert response["success"]
+    customer = next(c for c in response["customers"] if c["电话"] == "13611112222")
+    assert customer["match"] == PREFIX
+    assert customer["latest_order"]["下单日期"] == "2025-05-01"
+    assert client.get("/api/customers/search", params={"q": " "}).json()["success"] is False
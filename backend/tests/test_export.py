@@ -0,0 +1,43 @@
+import json
+import asyncio
+
+import main
+
+
+async def body(response):
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+def test_full_export_slots_answer_503_without_waiting(client, create_order, monkeypatch):
+    create_order(姓名="导出甲")
+
+    async def scenario():
+        monkeypatch.setattr(main, "_export_slots", asyncio.Semaphore(1))
+        held = await main.export_shirt_orders(fields="姓名")
+        # The slot is taken before the first batch is read
+        refused = await asyncio.wait_for(main.export_shirt_orders(fields="姓名"), 1)
+        lines = (await body(held)).decode("utf-8").splitlines()
+        again = await main.export_shirt_orders(fields="姓名")
+        await again.background()  # the client left before the stream started
+        return refused, lines, main.export_slots().locked()
+
+    refused, lines, locked = asyncio.run(scenario())
+    assert refused.status_code == 503
+    assert json.loads(refused.body)["success"] is False
+    assert any(json.loads(line)["姓名"] == "导出甲" for line in lines)
+    assert not locked
+
+
+def test_csv_export_over_http(client, create_order):
+    create_order(姓名="导出乙", 下单日期="2025-05-01")
+    response = client.get("/api/shirt-orders/export", params={
+        "format": "csv", "fields": "姓名,下单日期", "start": "2025-05-01", "end": "2025-05-01",
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    text = response.content.decode("utf-8-sig")
+    header, *rows = text.splitlines()
+    assert header == "id,姓名,下单日期"
+    assert "导出乙,2025-05-01" in [row.split(",", 1)[1] for row in rows]
+    assert all(row.endswith(",2025-05-01") for row in rows)
+    assert client.get("/api/shirt-orders/export", params={"format": "xml"}).status_code == 400
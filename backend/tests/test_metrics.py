@@ -0,0 +1,59 @@
+import os
+
+import metrics
+
+LABELS = (("method", "GET"), ("route", "/api/shirt-orders"), ("status", "200"))
+
+
+def record(registry, count=1):
+    for _ in range(count):
+        registry.record_request("GET", "/api/shirt-orders", 200, 0.01, 100, metrics.RequestStats())
+
+
+def test_file_round_trip(tmp_path):
+    path = str(tmp_path / "1-2.json")
+    counters = {("http_requests_total", LABELS): 3}
+    histograms = {("http_request_duration_seconds", LABELS[:2]): [1, 0, 0.01]}
+    metrics._write(path, (counters, histograms))
+    assert metrics._read(path) == (counters, histograms)
+
+
+def test_collect_sums_live_workers(tmp_path):
+    registry = metrics.Registry(str(tmp_path))
+    record(registry, 2)
+    # The parent process stands in for another live worker
+    other = tmp_path / f"{os.getppid()}-{metrics._process_start(os.getppid())}.json"
+    metrics._write(str(other), ({("http_requests_total", LABELS): 5}, {}))
+    counters, _ = registry.collect()
+    assert counters[("http_requests_total", LABELS)] == 7
+    assert other.exists()
+
+
+def test_reused_pid_is_folded_as_exited(tmp_path):
+    pid = os.getpid()
+    stale = tmp_path / f"{pid}-1.json"
+    metrics._write(str(stale), ({("http_requests_total", LABELS): 4}, {}))
+    registry = metrics.Registry(str(tmp_path))
+    record(registry)
+    registry.flush()
+    counters, _ = registry.collect()
+    assert counters[("http_requests_total", LABELS)] == 5
+    assert not stale.exists()
+    assert metrics._read(str(tmp_path / "exited.json"))[0] == {("http_requests_total", LABELS): 4}
+
+
+def test_retire_folds_and_removes_own_file(tmp_path):
+    registry = metrics.Registry(str(tmp_path))
+    record(registry, 3)
+    registry.flush()
+    assert len(os.listdir(tmp_path)) == 1
+    registry.retire()
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith(".json")) == ["exited.json"]
+    assert metrics._read(str(tmp_path / "exited.json"))[0][("http_requests_total", LABELS)] == 3
+
+
+def test_writable_file_is_ignored(tmp_path):
+    path = tmp_path / "1-2.json"
+    metrics._write(str(path), ({("http_requests_total", LABELS): 3}, {}))
+    os.chmod(path, 0o666)
+    assert metrics._read(str(path)) == ({}, {})
@@ -0,0 +1,120 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+import storage
+import migrations
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def schema(conn):
+    rows = conn.raw.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+    return rows, conn.raw.execute("PRAGMA user_version").fetchone()[0]
+
+
+def test_sqlite_migrate_twice_is_idempotent(tmp_path):
+    backend = storage.SqliteBackend(str(tmp_path / "orders.db"))
+    conn = backend.connect()
+    assert backend.migrate(conn) == [m.version for m in migrations.MIGRATIONS]
+    conn.raw.execute("INSERT INTO shirt_orders (姓名, 下单日期) VALUES ('张三', '2025-03-01')")
+    conn.commit()
+    first = schema(conn)
+    assert backend.migrate(conn) == []
+    assert schema(conn) == first
+    assert first[1] == migrations.LATEST_VERSION
+    indexes = {name for kind, name, _ in first[0] if kind == "index"}
+    assert "IX_shirt_orders_list_by_order_date" in indexes
+    assert "IX_shirt_orders_order_date" not in indexes  # dropped by migration 7
+    assert conn.raw.execute("SELECT COUNT(*) FROM shirt_orders").fetchone()[0] == 1
+    conn.close()
+
+
+def test_sqlite_older_file_catches_up(tmp_path):
+    backend = storage.SqliteBackend(str(tmp_path / "orders.db"))
+    conn = backend.connect()
+    backend.migrate(conn)
+    conn.raw.execute("DROP INDEX IX_shirt_orders_phone")
+    conn.raw.execute("PRAGMA user_version = 5")
+    assert backend.migrate(conn) == [6, 7]
+    assert conn.raw.execute("SELECT name FROM sqlite_master WHERE name = 'IX_shirt_orders_phone'").fetchone()
+    conn.close()
+
+
+def test_fingerprint_is_stable_and_scoped():
+    fingerprint = migrations.schema_fingerprint("sqlite:/data/orders.db")
+    assert fingerprint == migrations.schema_fingerprint("sqlite:/data/orders.db")
+    assert fingerprint != migrations.schema_fingerprint("sqlite:/other/orders.db")
+    # Workers compare fingerprints saved by other processes
+    code = "import migrations; print(migrations.schema_fingerprint('sqlite:/data/orders.db'))"
+    other = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    assert other.stdout.strip() == fingerprint
+
+
+def test_fingerprint_follows_schema_changes(monkeypatch):
+    before = migrations.schema_fingerprint()
+    monkeypatch.setitem(migrations.TABLE_COLUMNS, "新列", "VARCHAR(10)")
+    assert migrations.schema_fingerprint() != before
+    monkeypatch.delitem(migrations.TABLE_COLUMNS, "新列")
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [migrations.Migration(8, "extra", ["SELECT 1"])])
+    assert migrations.schema_fingerprint() != before
+
+
+class RecordingConnection:
+    """Records the SQL a SQL Server migrate() sends; versions 1-3 are already applied"""
+
+    def __init__(self, fail_on=None):
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.fail_on = fail_on
+        self._rows = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=()):
+        self.statements.append(" ".join(sql.split()))
+        if self.fail_on and self.fail_on in sql:
+            raise RuntimeError("DDL failed")
+        if sql.startswith("SELECT version FROM"):
+            self._rows = [(1,), (2,), (3,)]
+        elif sql.startswith("SELECT OBJECT_ID"):
+            self._rows = [(1,)]
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0]
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def recorded(self, prefix):
+        return [sql for sql in self.statements if sql.startswith(prefix)]
+
+
+def test_sqlserver_migrate_holds_applock_and_skips_applied():
+    conn = RecordingConnection()
+    applied = migrations.migrate(conn)
+    assert [version for version, _, _ in applied] == [4, 5, 6, 7]
+    assert conn.statements[0].startswith("EXEC sp_getapplock")
+    assert conn.statements[-1].startswith("EXEC sp_releaseapplock")
+    assert len(conn.recorded(f"INSERT INTO {migrations.MIGRATIONS_TABLE}")) == 4
+    assert not conn.recorded("IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'shirt_orders')")
+
+
+def test_sqlserver_migrate_releases_applock_on_failure():
+    conn = RecordingConnection(fail_on="IX_shirt_orders_phone")
+    with pytest.raises(RuntimeError):
+        migrations.migrate(conn)
+    assert conn.rollbacks == 1
+    assert conn.statements[-1].startswith("EXEC sp_releaseapplock")
+    # Migrations 4 and 5 committed before 6 failed
+    assert len(conn.recorded(f"INSERT INTO {migrations.MIGRATIONS_TABLE}")) == 2
@@ -0,0 +1,83 @@
+import os
+import decimal
+import datetime
+
+import pytest
+
+from order_cache import (SharedOrderCache, OrderSnapshot, encode_snapshot, decode_snapshot,
+                         ensure_private_directory, read_private_file)
+
+COLUMNS = ["id", "姓名", "定制金额", "下单日期"]
+ROWS = [
+    (1, "张三", decimal.Decimal("599.50"), datetime.date(2025, 3, 1)),
+    (2, "李四", None, None),
+]
+
+
+def loader(rows=ROWS):
+    calls = []
+
+    def load():
+        calls.append(1)
+        return COLUMNS, rows, (7, 6)
+    load.calls = calls
+    return load
+
+
+def test_snapshot_round_trip_keeps_types():
+    snapshot = OrderSnapshot(3, (7, 6), 1700000000.0, COLUMNS, ROWS)
+    decoded = decode_snapshot(encode_snapshot(snapshot))
+    assert decoded.rows == ROWS
+    assert decoded.columns == COLUMNS
+    assert decoded.db_version == (7, 6)
+    assert decoded.cache_version == 3
+
+
+def test_snapshot_file_shared_between_caches(tmp_path):
+    first, second = SharedOrderCache(str(tmp_path)), SharedOrderCache(str(tmp_path))
+    load = loader()
+    assert first.get(load).rows == ROWS
+    assert second.get(load).rows == ROWS
+    assert len(load.calls) == 1
+    assert second.snapshot_loads == 1
+
+
+def test_invalidate_forces_reload(tmp_path):
+    cache = SharedOrderCache(str(tmp_path))
+    load = loader()
+    cache.get(load)
+    cache.invalidate()
+    assert cache.peek() is None
+    cache.get(load)
+    assert len(load.calls) == 2
+
+
+def test_directory_created_private(tmp_path):
+    directory = tmp_path / "cache"
+    ensure_private_directory(str(directory))
+    assert directory.stat().st_mode & 0o777 == 0o700
+    os.chmod(directory, 0o777)
+    ensure_private_directory(str(directory))
+    assert directory.stat().st_mode & 0o777 == 0o700
+
+
+def test_writable_snapshot_file_is_ignored(tmp_path):
+    cache = SharedOrderCache(str(tmp_path))
+    cache.get(loader())
+    os.chmod(cache._snapshot_path, 0o666)
+    with pytest.raises(PermissionError):
+        read_private_file(cache._snapshot_path)
+    assert SharedOrderCache(str(tmp_path))._read_snapshot_file() is None
+
+
+@pytest.mark.skipif(not hasattr(os, "geteuid") or os.geteuid() != 0, reason="needs root to chown")
+def test_directory_of_another_user_bypasses_cache(tmp_path):
+    directory = tmp_path / "cache"
+    directory.mkdir()
+    os.chown(directory, 12345, 12345)
+    cache = SharedOrderCache(str(directory))
+    load = loader()
+    assert cache.get(load).rows == ROWS
+    assert cache.get(load).rows == ROWS
+    assert len(load.calls) == 2
+    assert not os.listdir(directory)
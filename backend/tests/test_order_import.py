@@ -0,0 +1,102 @@
+import io
+import datetime
+from typing import Any, Optional
+
+import pytest
+from pydantic import create_model
+
+import main
+import order_import
+import statements
+
+# Row 3 has a quoted two-line remark and row 6 is blank
+MIXED_CSV = (
+    "﻿姓名,电话,下单日期,定制金额,西装数量,款式备注\n"
+    "导入甲,13800000001,2025/03/01,599.5,1,\n"
+    "导入乙,13800000002,2025-03-02,100,2,\"第一行\n第二行\"\n"
+    "导入丙,13800000003,2025-03-03,abc,1,\n"
+    ",13800000004,2025-03-04,10,1,\n"
+    "\n"
+    "导入丁,13800000005,not a date,10,1.5,\n"
+    "导入戊,13800000006,2025-03-06,5000,1,\n"
+    "导入己,13800000007,2025-03-07,20,1,\n"
+)
+
+
+def names_in_database(prefix):
+    rows = main.fetch_shirt_orders(["id", "姓名", "下单日期"])[0]
+    return sorted((row[1], str(row[2])) for row in rows if row[1] and row[1].startswith(prefix))
+
+
+def upload(client, body, **params):
+    return client.post("/api/shirt-orders/import", content=body, params=params).json()
+
+
+def test_read_csv_numbers_rows_like_a_spreadsheet():
+    records = list(order_import.read_orders(io.BytesIO(MIXED_CSV.encode("utf-8"))))
+    assert [row for row, _ in records] == [2, 3, 4, 5, 7, 8, 9]
+    assert records[1][1]["款式备注"] == "第一行\n第二行"
+    assert records[3][1] == {"电话": "13800000004", "下单日期": "2025-03-04", "定制金额": "10", "西装数量": "1"}
+
+
+def test_bad_header_is_rejected(client):
+    response = client.post("/api/shirt-orders/import", content="姓名,不存在的列\n张三,1\n".encode("utf-8"))
+    assert response.status_code == 400
+    assert "不存在的列" in response.json()["message"]
+    assert upload(client, "电话\n123\n".encode("utf-8"))["message"].endswith("缺少必填列: 姓名")
+
+
+def test_dry_run_inserts_nothing(client):
+    result = upload(client, MIXED_CSV.replace("导入", "试算").encode("utf-8"), dry_run="true")
+    assert result["success"] and result["inserted"] == 0
+    assert result["total"] == 7 and result["failed"] == 4
+    assert names_in_database("试算") == []
+
+
+def test_mixed_csv_in_chunks_reports_rows_and_keeps_valid_ones():
+    with main.get_pool().connection() as conn:
+        result = order_import.import_file(io.BytesIO(MIXED_CSV.encode("utf-8")), main.ShirtOrder, conn, chunk_size=2)
+    assert result["total"] == 7
+    assert result["chunks"] == 4
+    assert result["inserted"] == 3 and result["failed"] == 4
+    assert not result["errors_truncated"]
+    assert sorted((error["row"], error["field"]) for error in result["errors"]) == [
+        (4, "定制金额"), (5, "姓名"), (7, "下单日期"), (7, "西装数量"), (8, "定制金额"),
+    ]
+    assert names_in_database("导入") == [
+        ("导入乙", "2025-03-02"), ("导入己", "2025-03-07"), ("导入甲", "2025-03-01"),
+    ]
+
+
+def test_chunk_rejected_by_database_is_retried_row_by_row():
+    # A model looser than the table lets a bad value reach the database
+    loose = create_model("LooseOrder", **{column: (Optional[Any], None) for column in statements.WRITABLE_COLUMNS})
+    csv_text = "姓名,定制金额\n重试甲,10\n重试乙,abc\n重试丙,20\n"
+    with main.get_pool().connection() as conn:
+        result = order_import.import_file(io.BytesIO(csv_text.encode("utf-8")), loose, conn)
+    assert result["chunks"] == 1
+    assert result["inserted"] == 2 and result["failed"] == 1
+    assert [error["row"] for error in result["errors"]] == [3]
+    assert [name for name, _ in names_in_database("重试")] == ["重试丙", "重试甲"]
+
+
+def test_xlsx_upload(client):
+    openpyxl = pytest.importorskip("openpyxl")
+
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["姓名", "电话", "下单日期", "定制金额"])
+    sheet.append(["表格甲", 13800000011, datetime.datetime(2025, 4, 1), 300])
+    sheet.append(["表格乙", 13800000012, "2025-04-02", "abc"])
+    sheet.append([None, None, None, None])
+    sheet.append(["表格丙", None, datetime.date(2025, 4, 3), 12.5])
+    body = io.BytesIO()
+    workbook.save(body)
+
+    result = upload(client, body.getvalue())
+    assert result["success"]
+    assert result["total"] == 3 and result["inserted"] == 2
+    assert [(error["row"], error["field"]) for error in result["errors"]] == [(3, "定制金额")]
+    assert names_in_database("表格") == [("表格丙", "2025-04-03"), ("表格甲", "2025-04-01")]
+    phones = {row["姓名"]: row["电话"] for row in client.get("/api/shirt-orders").json()["orders"]}
+    assert phones["表格甲"] == "13800000011"
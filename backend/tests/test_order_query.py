@@ -0,0 +1,90 @@
+import decimal
+import datetime
+
+import pytest
+
+from order_query import compile_query, compile_filters, compile_sort, escape_like
+from statements import pad_to_bucket
+
+
+def test_filters_compile_to_parameters():
+    where, params = compile_filters({
+        "定制顾问": "王顾问",
+        "下单日期": {"gte": "2024-01-01", "lt": "2024-07-01"},
+        "西装胸围": {"between": [90, "110.5"]},
+        "实际交付日期": None,
+        "电话": {"ne": None},
+    })
+    assert where == ("定制顾问 = ? AND 下单日期 >= ? AND 下单日期 < ? AND 西装胸围 BETWEEN ? AND ? "
+                     "AND 实际交付日期 IS NULL AND 电话 IS NOT NULL")
+    assert params == ["王顾问", datetime.date(2024, 1, 1), datetime.date(2024, 7, 1),
+                      decimal.Decimal("90"), decimal.Decimal("110.5")]
+
+
+def test_in_list_is_padded_to_a_bucket():
+    where, params = compile_filters({"客户来源": {"in": ["门店", "小红书", "网店"]}})
+    assert params == pad_to_bucket(["门店", "小红书", "网店"])
+    assert where == f"客户来源 IN ({', '.join('?' * len(params))})"
+
+
+def test_like_escaping():
+    assert escape_like("100%_[a]\\") == "100\\%\\_\\[a]\\\\"
+    where, params = compile_filters({"姓名": {"prefix": "王_"}})
+    assert where == "姓名 LIKE ? ESCAPE '\\'"
+    assert params == ["王\\_%"]
+
+
+def test_sort_always_ends_on_id():
+    assert compile_sort(None) == "id ASC"
+    assert compile_sort([{"field": "下单日期", "order": "desc"}, "姓名"]) == "下单日期 DESC, 姓名 ASC, id ASC"
+    assert compile_sort([{"field": "id", "order": "desc"}, "姓名"]) == "id DESC"
+
+
+def test_query_sql_with_total():
+    query = compile_query({"fields": ["姓名"], "filters": {"姓名": "张三"}, "limit": 10, "offset": 20,
+                           "total": True}, max_limit=100)
+    sql, params = query.sql("shirt_orders")
+    assert query.columns == ["id", "姓名"]
+    assert sql == ("SELECT COUNT(*) FROM shirt_orders WHERE 姓名 = ?; "
+                   "SELECT id, 姓名 FROM shirt_orders WHERE 姓名 = ? ORDER BY id ASC OFFSET ? ROWS FETCH NEXT ? ROWS ONLY")
+    assert params == ["张三", "张三", 20, 11]
+
+
+@pytest.mark.parametrize("spec", [
+    {"filters": {"姓名; DROP TABLE shirt_orders": "x"}},
+    {"fields": ["id", "1=1"]},
+    {"sort": [{"field": "姓名", "order": "sideways"}]},
+    {"filters": {"姓名": {"gt": "a"}}},
+    {"filters": {"定制金额": {"prefix": "1"}}},
+    {"filters": {"西装数量": "two"}},
+    {"filters": {"西装数量": True}},
+    {"filters": {"定制金额": "NaN"}},
+    {"filters": {"下单日期": {"between": ["2024-01-01"]}}},
+    {"filters": {"客户来源": {"in": []}}},
+    {"filters": {"姓名": {"like": "%"}}},
+    {"limit": 0},
+    {"offset": -1},
+    {"where": "1=1"},
+])
+def test_invalid_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        compile_query(spec, max_limit=100)
+
+
+def test_prefix_matches_wildcards_literally(client, create_order):
+    names = ["Q_1", "Qx1", "Q%1", "Qyy1", "Q[1]", "Q1]", "Q\\1"]
+    for name in names:
+        create_order(姓名=name)
+
+    def matching(prefix):
+        response = client.post("/api/shirt-orders/query", json={
+            "fields": ["姓名"], "filters": {"姓名": {"prefix": prefix}}, "limit": 100,
+        }).json()
+        assert response["success"], response
+        return sorted(row["姓名"] for row in response["orders"])
+
+    assert matching("Q_") == ["Q_1"]
+    assert matching("Q%") == ["Q%1"]
+    assert matching("Q[") == ["Q[1]"]
+    assert matching("Q\\") == ["Q\\1"]
+    assert matching("Q") == sorted(names)
@@ -0,0 +1,68 @@
+import pytest
+
+import main
+
+
+def all_pages(client, **params):
+    """Walk every keyset page and return the rows in page order"""
+    rows, cursor = [], None
+    while True:
+        query = dict(params, limit=2, fields="下单日期")
+        if cursor:
+            query["cursor"] = cursor
+        page = client.get("/api/shirt-orders", params=query).json()
+        assert page["success"], page
+        rows += page["orders"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            assert not page["has_more"]
+            return rows
+
+
+def test_keyset_predicate_by_id():
+    assert main.keyset_predicate("id", False, 5, 5) == ("id > ?", [5])
+    assert main.keyset_predicate("id", True, 5, 5) == ("id < ?", [5])
+
+
+def test_keyset_predicate_breaks_ties_on_id():
+    where, params = main.keyset_predicate("下单日期", False, "2025-03-01", 7)
+    assert where == "(下单日期 >= ? AND (下单日期 > ? OR id > ?))"
+    assert params == ["2025-03-01", "2025-03-01", 7]
+
+
+def test_keyset_predicate_null_sort_value():
+    # NULLs sort first ascending: after a NULL row come later NULLs, then every dated row
+    assert main.keyset_predicate("下单日期", False, None, 7) == (
+        "((下单日期 IS NULL AND id > ?) OR 下单日期 IS NOT NULL)", [7])
+    # ...and last descending, where only later-id NULL rows remain
+    assert main.keyset_predicate("下单日期", True, None, 7) == ("(下单日期 IS NULL AND id < ?)", [7])
+    where, _ = main.keyset_predicate("下单日期", True, "2025-03-01", 7)
+    assert where.endswith("OR 下单日期 IS NULL)")
+
+
+def test_cursor_round_trip_and_mismatch():
+    cursor = main.encode_cursor("下单日期", main.datetime.date(2025, 3, 1), 7)
+    assert main.decode_cursor(cursor, "下单日期") == ("2025-03-01", 7)
+    with pytest.raises(ValueError):
+        main.decode_cursor(cursor, "id")
+    with pytest.raises(ValueError):
+        main.decode_cursor("not-a-cursor", "id")
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_pages_cover_ties_and_nulls_in_order(client, create_order, order):
+    for date in ("2025-03-01", "2025-03-01", "2025-03-01", None, None, "2025-02-01"):
+        create_order(下单日期=date)
+    full = client.get("/api/shirt-orders", params={"fields": "下单日期"}).json()["orders"]
+    # NULL dates first ascending, ties broken on id in the same direction
+    expected = sorted(full, key=lambda row: (row["下单日期"] is not None, row["下单日期"] or "", row["id"]),
+                      reverse=order == "desc")
+    assert all_pages(client, order_by="下单日期", order=order) == expected
+
+
+def test_pages_by_id(client, create_order):
+    for _ in range(3):
+        create_order()
+    ids = [row["id"] for row in all_pages(client, order="desc")]
+    assert ids == sorted(ids, reverse=True)
+    assert len(ids) == client.get("/api/shirt-orders").json()["count"]
@@ -0,0 +1,121 @@
+import decimal
+import datetime
+
+import pytest
+
+import main
+import storage
+import statements
+from db_pool import ConnectionPool, PoolError
+from replica import ReadReplica, STATE_TABLE
+
+COLUMNS = ["id", "姓名", "定制金额", "下单日期"]
+
+
+@pytest.fixture
+def primary(tmp_path):
+    backend = storage.SqliteBackend(str(tmp_path / "primary.db"))
+    pool = ConnectionPool(backend.connect, min_size=0, max_size=2)
+    with pool.connection() as conn:
+        backend.migrate(conn)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def replica(tmp_path, primary):
+    replica = ReadReplica(lambda: primary, path=str(tmp_path / "replica.db"), enabled=True, max_lag=30)
+    yield replica
+    replica.stop()
+
+
+def write(pool, sql, params=()):
+    with pool.connection() as conn:
+        conn.cursor().execute(sql, params)
+        conn.commit()
+
+
+def insert(pool, name, amount=None, date=None):
+    values = dict.fromkeys(statements.WRITABLE_COLUMNS)
+    values.update({"姓名": name, "定制金额": amount, "下单日期": date})
+    write(pool, statements.INSERT_ORDER, list(values.values()))
+
+
+def age_last_sync(replica, seconds):
+    with replica._get_pool().connection() as conn:
+        conn.execute(f"UPDATE {STATE_TABLE} SET value = value - ? WHERE key = 'last_sync_at'", (seconds,))
+        conn.commit()
+
+
+def test_refresh_copies_changes_and_deletes(primary, replica):
+    insert(primary, "张三", 599.5, "2025-03-01")
+    insert(primary, "李四")
+    assert replica.sync() == (2, 0)
+    rows, version = replica.query(COLUMNS, order_by="id")
+    assert rows == [(1, "张三", decimal.Decimal("599.50"), datetime.date(2025, 3, 1)), (2, "李四", None, None)]
+
+    write(primary, "UPDATE shirt_orders SET 定制金额 = 10 WHERE id = 2")
+    write(primary, "DELETE FROM shirt_orders WHERE id = 1")
+    insert(primary, "王五")
+    assert replica.sync() == (2, 1)
+    rows, newer = replica.query(["id", "姓名", "定制金额"], order_by="id")
+    assert rows == [(2, "李四", decimal.Decimal("10.00")), (3, "王五", None)]
+    assert newer[0] > version[0]
+    assert replica.sync() == (0, 0)
+
+    stats = replica.stats()
+    assert stats["fresh"] and stats["syncs"] == 3
+    assert (stats["rows_synced"], stats["deletes_synced"], stats["replica_reads"]) == (4, 1, 2)
+
+
+def test_falls_back_when_never_synced_or_stale(primary, replica):
+    insert(primary, "张三")
+    assert replica.query(COLUMNS) is None
+    replica.sync()
+    assert replica.query(COLUMNS) is not None
+    age_last_sync(replica, 60)
+    assert replica.query(COLUMNS) is None
+    assert replica.stats()["primary_fallbacks"] == 2
+    assert not replica.stats()["fresh"]
+
+
+def test_failed_refresh_keeps_serving_until_lag_runs_out(tmp_path, primary):
+    healthy = [True]
+
+    def primary_pool():
+        if not healthy[0]:
+            raise PoolError("primary unreachable")
+        return primary
+
+    replica = ReadReplica(primary_pool, path=str(tmp_path / "replica.db"), enabled=True, max_lag=30)
+    insert(primary, "张三")
+    replica.sync()
+    healthy[0] = False
+    assert replica.sync() is None
+    assert replica.stats()["sync_errors"] == 1
+    assert replica.query(COLUMNS)[0][0][1] == "张三"
+    age_last_sync(replica, 60)
+    assert replica.query(COLUMNS) is None
+    replica.stop()
+
+
+def test_disabled_replica_never_answers(tmp_path, primary):
+    replica = ReadReplica(lambda: primary, path=str(tmp_path / "replica.db"), enabled=False)
+    assert replica.sync() is None
+    assert replica.query(COLUMNS) is None
+
+
+def test_api_reads_use_replica_then_primary(client, create_order, tmp_path, monkeypatch):
+    replica = ReadReplica(main.get_pool, path=str(tmp_path / "replica.db"), enabled=True, max_lag=30)
+    monkeypatch.setattr(main, "read_replica", replica)
+    order_id = create_order(姓名="副本甲")
+    replica.sync()
+    page = client.get("/api/shirt-orders", params={"limit": 1000, "fields": "姓名"}).json()
+    assert any(row["id"] == order_id for row in page["orders"])
+    assert replica.stats()["replica_reads"] == 1
+
+    age_last_sync(replica, 60)
+    page = client.get("/api/shirt-orders", params={"limit": 1000, "fields": "姓名"}).json()
+    assert page["success"] and any(row["id"] == order_id for row in page["orders"])
+    assert replica.stats()["primary_fallbacks"] == 1
+    replica.stop()
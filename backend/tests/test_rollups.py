@@ -0,0 +1,106 @@
+import decimal
+import datetime
+
+import main
+import rollups
+
+DAY = datetime.date(2025, 3, 1)
+ORDER = {"下单日期": "2025-03-01", "定制顾问": "王顾问", "西装数量": 2, "衬衫数量": "1", "定制金额": "599.50"}
+
+
+def key(day=DAY, consultant="王顾问"):
+    return (day, consultant, "", "")
+
+
+def test_contribution_defaults_missing_values():
+    assert rollups.contribution(ORDER) == (key(), [1, 2, 0, 0, 1, decimal.Decimal("599.50")])
+    assert rollups.contribution({"定制顾问": "王顾问"}) is None
+
+
+def test_insert_and_delete_cancel_out():
+    delta = rollups.RollupDelta()
+    delta.add(ORDER)
+    assert delta.rows() == [key() + (1, 2, 0, 0, 1, decimal.Decimal("599.50"))]
+    delta.remove(ORDER)
+    assert delta.rows() == []
+
+
+def test_edit_moves_counts_between_keys():
+    delta = rollups.RollupDelta()
+    delta.remove(ORDER)
+    delta.add(dict(ORDER, 定制顾问="李顾问", 定制金额="100"))
+    assert sorted(delta.rows()) == sorted([
+        key() + (-1, -2, 0, 0, -1, decimal.Decimal("-599.50")),
+        key(consultant="李顾问") + (1, 2, 0, 0, 1, decimal.Decimal("100")),
+    ])
+
+
+def test_edit_within_key_nets_the_difference():
+    delta = rollups.RollupDelta()
+    delta.remove(ORDER)
+    delta.add(dict(ORDER, 西装数量=3, 定制金额="650"))
+    assert delta.rows() == [key() + (0, 1, 0, 0, 0, decimal.Decimal("50.50"))]
+
+
+def rollup_table():
+    with main.get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM {rollups.ROLLUP_TABLE} ORDER BY day, 定制顾问, 接待人员, 客户来源")
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def rebuilt_table():
+    with main.get_pool().connection() as conn:
+        cursor = conn.cursor()
+        rollups.rebuild(cursor)
+        cursor.execute(f"SELECT * FROM {rollups.ROLLUP_TABLE} ORDER BY day, 定制顾问, 接待人员, 客户来源")
+        rows = [tuple(row) for row in cursor.fetchall()]
+        conn.rollback()
+    return rows
+
+
+def bulk_update(client, edited=(), new=(), deleted=()):
+    response = client.post("/api/shirt-orders/bulk-update", json={
+        "editedOrders": list(edited), "newOrders": list(new), "deletedOrders": list(deleted),
+    }).json()
+    assert response["success"], response
+    return response
+
+
+def test_writes_keep_rollup_equal_to_rebuild(client, create_order):
+    first = create_order(下单日期="2025-04-01", 定制顾问="赵顾问", 西装数量=1, 定制金额=300)
+    second = create_order(下单日期="2025-04-01", 定制顾问="赵顾问", 西裤数量=2, 定制金额=200)
+    assert rollup_table() == rebuilt_table()
+
+    inserted = bulk_update(client, new=[{"姓名": "测试", "下单日期": "2025-04-02", "定制金额": 50}])["inserted_ids"]
+    assert rollup_table() == rebuilt_table()
+
+    bulk_update(client, edited=[{"id": first, "定制顾问": "钱顾问", "定制金额": 350},
+                                {"id": inserted[0], "下单日期": "2025-04-01"}])
+    assert rollup_table() == rebuilt_table()
+
+    bulk_update(client, deleted=[second, inserted[0]])
+    assert rollup_table() == rebuilt_table()
+    assert not any(row[0] == datetime.date(2025, 4, 2) for row in rollup_table())
+
+
+def test_contribution_accepts_sql_server_date_forms():
+    for text in ("2025/03/01", "2025-03-01T10:00:00", "20250301", "03/01/2025"):
+        assert rollups.contribution(dict(ORDER, 下单日期=text))[0] == key()
+
+
+def test_writes_accept_and_normalize_non_iso_dates(client, create_order):
+    order_id = create_order(下单日期="2026/10/01", 定制金额=10)
+    bulk_update(client, new=[{"姓名": "测试", "下单日期": "2026/10/02"}],
+                edited=[{"id": order_id, "实际交付日期": "2026/10/05"}])
+    rows = client.get("/api/shirt-orders", params={"fields": "下单日期,实际交付日期"}).json()["orders"]
+    stored = next(row for row in rows if row["id"] == order_id)
+    assert stored == {"id": order_id, "下单日期": "2026-10-01", "实际交付日期": "2026-10-05"}
+    assert any(row["下单日期"] == "2026-10-02" for row in rows)
+    assert rollup_table() == rebuilt_table()
+
+    response = client.post("/api/shirt-orders/bulk-update", json={
+        "editedOrders": [{"id": order_id, "下单日期": "someday"}], "newOrders": [], "deletedOrders": [],
+    }).json()
+    assert response["success"] is False
+    assert response["message"].startswith("订单数据无效")
@@ -0,0 +1,48 @@
+import decimal
+import datetime
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import row_json
+
+COLUMNS = ["id", "姓名", "定制金额", "下单日期", "西装数量", "款式备注"]
+ROWS = [
+    (1, "张三", decimal.Decimal("599.50"), datetime.date(2025, 3, 1), 2, 'say "hi"\n\t\\ </script>'),
+    (2, None, None, None, None, None),
+    (3, "😀 \x01", decimal.Decimal("2"), datetime.date(1999, 12, 31), 0, ""),
+    # SQLite can hand back floats, and values of another type than the column's
+    (4, 123, 12.5, "2025-01-02", 1.0, True),
+    (5, "李四", decimal.Decimal("1E+2"), datetime.datetime(2025, 3, 1, 8, 30), -1, "x"),
+]
+
+
+def expected(content):
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def test_rows_match_json_response_byte_for_byte():
+    content = {"success": True, "orders": ROWS, "count": len(ROWS), "next_cursor": None}
+    as_dicts = dict(content, orders=[dict(zip(COLUMNS, row)) for row in ROWS])
+    assert row_json.render(content, "orders", COLUMNS, ROWS) == expected(as_dicts)
+
+
+@pytest.mark.parametrize("row", ROWS)
+def test_each_row_matches_json_dumps(row):
+    encode = row_json.row_encoder(COLUMNS)
+    assert encode(row) == row_json.dumps(jsonable_encoder(dict(zip(COLUMNS, row))))
+
+
+def test_positions_and_unknown_columns():
+    columns = ["定制金额", "not_a_column", "id"]
+    row = (7, {"nested": [1, 2]}, decimal.Decimal("3.10"))
+    encode = row_json.row_encoder(columns, positions=[2, 1, 0])
+    assert encode(row) == '{"定制金额":3.1,"not_a_column":{"nested":[1,2]},"id":7}'
+
+
+def test_empty_rows_and_columns():
+    assert row_json.encode_rows(COLUMNS, []) == "[]"
+    assert row_json.row_encoder([])(()) == "{}"
+    content = {"success": True, "orders": [], "count": 0}
+    assert row_json.render(content, "orders", COLUMNS, []) == expected(content)
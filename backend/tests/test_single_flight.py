@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+class BlockingRead:
+    """A database read that stays in flight until ``release`` is set"""
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.error = error
+
+    def __call__(self, *args):
+        self.calls.append(args)
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return list(args)
+
+
+async def started(read):
+    await asyncio.get_running_loop().run_in_executor(None, read.started.wait, 5)
+
+
+def test_concurrent_identical_calls_share_one_read():
+    async def scenario():
+        flights, read = SingleFlight(), BlockingRead()
+        first = asyncio.ensure_future(flights.run(read, "orders", [1, 2]))
+        await started(read)
+        others = [asyncio.ensure_future(flights.run(read, "orders", [1, 2])) for _ in range(3)]
+        await asyncio.sleep(0)
+        read.release.set()
+        results = await asyncio.gather(first, *others)
+        return flights, read, results
+
+    flights, read, results = asyncio.run(scenario())
+    assert read.calls == [("orders", [1, 2])]
+    assert results == [["orders", [1, 2]]] * 4
+    assert flights.stats() == {"in_flight": 0, "calls": 1, "coalesced": 3}
+
+
+def test_different_arguments_run_separately():
+    async def scenario():
+        flights, read = SingleFlight(), BlockingRead()
+        read.release.set()
+        return read, await asyncio.gather(flights.run(read, 1), flights.run(read, 2),
+                                          flights.run(read, 9, key=("page", 1)))
+
+    read, results = asyncio.run(scenario())
+    assert results == [[1], [2], [9]]
+    assert len(read.calls) == 3
+
+
+def test_error_reaches_every_caller_and_is_not_cached():
+    async def scenario():
+        flights, read = SingleFlight(), BlockingRead(error=RuntimeError("db down"))
+        callers = [asyncio.ensure_future(flights.run(read, "orders")) for _ in range(3)]
+        await started(read)
+        read.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        read.error = None
+        return flights, read, results, await flights.run(read, "orders")
+
+    flights, read, results, retry = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) and str(result) == "db down" for result in results)
+    assert retry == ["orders"]
+    assert len(read.calls) == 2
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_cancelled_caller_does_not_cancel_the_read():
+    async def scenario():
+        flights, read = SingleFlight(), BlockingRead()
+        leaving = asyncio.ensure_future(flights.run(read, "orders"))
+        await started(read)
+        staying = asyncio.ensure_future(flights.run(read, "orders"))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        read.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying
+
+    assert asyncio.run(scenario()) == ["orders"]
+
+
+def test_invalidate_starts_a_new_read():
+    async def scenario():
+        flights, read = SingleFlight(), BlockingRead()
+        before = asyncio.ensure_future(flights.run(read, "orders"))
+        await started(read)
+        flights.invalidate()
+        after = asyncio.ensure_future(flights.run(read, "orders"))
+        read.release.set()
+        await asyncio.gather(before, after)
+        return read
+
+    assert len(asyncio.run(scenario()).calls) == 2
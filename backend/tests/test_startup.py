@@ -0,0 +1,21 @@
+import os
+import sys
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def imported_after_main(*modules):
+    code = f"import sys, main; print(' '.join(m for m in {modules!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True,
+                            check=True)
+    return result.stdout.split()
+
+
+def test_import_main_defers_drivers_and_server():
+    assert imported_after_main("pyodbc", "sqlite3", "uvicorn") == []
+
+
+def test_livez_and_readyz(client):
+    assert client.get("/livez").status_code == 200
+    assert client.get("/readyz").status_code == 200
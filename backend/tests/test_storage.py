@@ -0,0 +1,136 @@
+import sqlite3
+import decimal
+import datetime
+
+import pytest
+
+import storage
+import rollups
+import migrations
+import statements
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = storage.SqliteConnection(str(tmp_path / "orders.db"))
+    storage.create_schema(conn.raw)
+    storage.create_triggers(conn.raw)
+    yield conn
+    conn.close()
+
+
+def test_translate_top_moves_limit_last():
+    (sql, count, reorder), = storage._split_batch("SELECT TOP (?) id FROM shirt_orders WHERE id > ? ORDER BY id")
+    assert sql == "SELECT id FROM shirt_orders WHERE id > ? ORDER BY id LIMIT ?"
+    assert count == 2
+    assert reorder([10, 5]) == [5, 10]
+
+
+def test_translate_offset_fetch():
+    (sql, _, reorder), = storage._split_batch(
+        "SELECT id FROM shirt_orders ORDER BY id OFFSET ? ROWS FETCH NEXT ? ROWS ONLY")
+    assert sql == "SELECT id FROM shirt_orders ORDER BY id LIMIT ? OFFSET ?"
+    assert reorder([20, 10]) == [10, 20]
+
+
+def test_translate_strips_table_hints_and_temp_tables():
+    (sql, _, _), = storage._split_batch("SELECT id FROM shirt_orders WITH (UPDLOCK, ROWLOCK) WHERE id IN (?)")
+    assert sql == "SELECT id FROM shirt_orders WHERE id IN (?)"
+    (sql, _, _), = storage._split_batch("INSERT INTO #edit_stage (id) VALUES (?)")
+    assert sql == "INSERT INTO temp.edit_stage (id) VALUES (?)"
+
+
+def test_translate_batch_and_scope_identity(conn):
+    statements_ = storage._split_batch(f"{statements.INSERT_ORDER}; SELECT SCOPE_IDENTITY()")
+    assert len(statements_) == 2
+    assert statements_[1][0] == "SELECT last_insert_rowid()"
+
+
+def test_insert_and_read_back_decimal_and_date(conn):
+    cursor = conn.cursor()
+    values = [None] * len(statements.WRITABLE_COLUMNS)
+    values[statements.WRITABLE_COLUMNS.index("姓名")] = "张三"
+    values[statements.WRITABLE_COLUMNS.index("定制金额")] = 599.5
+    values[statements.WRITABLE_COLUMNS.index("下单日期")] = "2025-03-01"
+    cursor.execute(statements.INSERT_ORDER, values)
+    cursor.execute("SELECT 定制金额, 下单日期 FROM shirt_orders")
+    assert cursor.fetchone() == (decimal.Decimal("599.50"), datetime.date(2025, 3, 1))
+
+
+@pytest.mark.parametrize("column, value", [
+    ("定制金额", "abc"),
+    ("定制金额", 5000),
+    ("西装数量", 1.5),
+    ("下单日期", "not a date"),
+    ("电话", "1" * 21),
+])
+def test_check_constraints_reject_values_sql_server_would(conn, column, value):
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.raw.execute(f"INSERT INTO shirt_orders (姓名, {column}) VALUES (?, ?)", ("张三", value))
+
+
+def test_bad_stored_values_read_as_none():
+    # Rows written before the CHECK constraints existed must not fail the read
+    description = storage._description("id", "定制金额", "下单日期")
+    _, rows = storage._result(description, [(1, "abc", "2025-13-45"), (2, 12.5, "2025-01-02")])
+    assert rows == [(1, None, None), (2, decimal.Decimal("12.50"), datetime.date(2025, 1, 2))]
+
+
+def test_bulk_update_rejects_bad_values_before_storing(client):
+    before = client.get("/api/shirt-orders").json()["count"]
+    for bad in ({"姓名": "王五", "定制金额": "abc"}, {"姓名": "王五", "定制金额": 5000}):
+        response = client.post("/api/shirt-orders/bulk-update",
+                               json={"editedOrders": [], "newOrders": [bad], "deletedOrders": []}).json()
+        assert response["success"] is False
+        assert response["message"].startswith("订单数据无效")
+    listing = client.get("/api/shirt-orders").json()
+    assert listing["success"] and listing["count"] == before
+
+
+def test_bulk_update_rejects_bad_edit(client, create_order):
+    order_id = create_order(定制金额=100)
+    response = client.post("/api/shirt-orders/bulk-update", json={
+        "editedOrders": [{"id": order_id, "西装数量": "two"}], "newOrders": [], "deletedOrders": [],
+    }).json()
+    assert response["success"] is False
+    assert client.get("/api/shirt-orders").json()["success"]
+
+
+def test_bulk_update_rejects_malformed_body(client, create_order):
+    order_id = create_order(姓名="保留")
+    for body in ([{"deletedOrders": [order_id]}], {"deletedOrders": ["x"]}, {"deletedOrders": order_id},
+                 {"editedOrders": {"id": order_id}}, {"newOrders": "王五"}):
+        response = client.post("/api/shirt-orders/bulk-update", json=body)
+        assert response.status_code == 400
+        assert response.json()["message"].startswith("订单数据无效")
+    response = client.post("/api/shirt-orders/bulk-update", content=b"{not json")
+    assert response.status_code == 400
+    assert any(row["id"] == order_id for row in client.get("/api/shirt-orders").json()["orders"])
+
+
+def test_rollup_rebuild_runs_on_sqlite(conn):
+    cursor = conn.cursor()
+    conn.raw.execute("INSERT INTO shirt_orders (姓名, 下单日期, 定制金额) VALUES ('张三', '2025-03-01', 10)")
+    assert rollups.rebuild(cursor) == 1
+    cursor.execute(f"SELECT day, order_count, 定制金额 FROM {rollups.ROLLUP_TABLE}")
+    assert cursor.fetchall() == [(datetime.date(2025, 3, 1), 1, decimal.Decimal("10.00"))]
+
+
+def test_sqlite_only_when_selected():
+    assert storage.from_env(None, "host:1433/db", backend="sqlserver") is None
+    assert isinstance(storage.from_env("DRIVER=x", "host:1433/db", backend="sqlserver"), storage.SqlServerBackend)
+    assert isinstance(storage.from_env(None, "host:1433/db", backend="sqlite"), storage.SqliteBackend)
+    assert storage.from_env("DRIVER=x", "host:1433/db", backend="auto") is None
+
+
+def test_sqlite_status_follows_migrate(tmp_path):
+    backend = storage.SqliteBackend(str(tmp_path / "orders.db"))
+    conn = backend.connect()
+    assert all(applied_at is None for _, _, applied_at in backend.status(conn))
+    assert backend.migrate(conn) == [m.version for m in migrations.MIGRATIONS]
+    status = backend.status(conn)
+    assert [version for version, _, _ in status] == [m.version for m in migrations.MIGRATIONS]
+    assert all(applied_at for _, _, applied_at in status)
+    with pytest.raises(ValueError):
+        backend.migrate(conn, target=1)
+    conn.close()
@@ -0,0 +1,51 @@
+def bulk_update(client, edited=(), deleted=()):
+    response = client.post("/api/shirt-orders/bulk-update", json={
+        "editedOrders": list(edited), "newOrders": [], "deletedOrders": list(deleted),
+    }).json()
+    assert response["success"], response
+
+
+def test_etag_answers_304_until_the_table_changes(client, create_order):
+    first = client.get("/api/shirt-orders")
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    cached = client.get("/api/shirt-orders", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    create_order()
+    changed = client.get("/api/shirt-orders", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_etag_depends_on_the_query(client):
+    plain = client.get("/api/shirt-orders").headers["etag"]
+    projected = client.get("/api/shirt-orders", params={"fields": "姓名"}).headers["etag"]
+    assert plain != projected
+    # The uncached path probes the version before reading any rows
+    assert client.get("/api/shirt-orders", params={"fields": "姓名"},
+                      headers={"If-None-Match": projected}).status_code == 304
+    assert client.get("/api/shirt-orders", params={"fields": "姓名"},
+                      headers={"If-None-Match": plain}).status_code == 200
+
+
+def test_since_returns_changes_and_tombstones(client, create_order):
+    edited, deleted = create_order(), create_order()
+    token = client.get("/api/shirt-orders").json()["sync_token"]
+
+    created = create_order(电话="123")
+    bulk_update(client, edited=[{"id": edited, "电话": "456"}], deleted=[deleted])
+
+    delta = client.get("/api/shirt-orders", params={"since": token, "fields": "电话"}).json()
+    assert delta["success"] and delta["incremental"]
+    assert sorted((row["id"], row["电话"]) for row in delta["orders"]) == [(edited, "456"), (created, "123")]
+    assert delta["deleted"] == [deleted]
+
+    later = client.get("/api/shirt-orders", params={"since": delta["sync_token"]}).json()
+    assert later["orders"] == [] and later["deleted"] == []
+
+
+def test_since_rejects_bad_tokens_and_paging(client):
+    for params in ({"since": "abc"}, {"since": "-1"}, {"since": "0", "limit": 10}):
+        response = client.get("/api/shirt-orders", params=params).json()
+        assert response["success"] is False
@@ -0,0 +1,54 @@
+import time
+import threading
+
+
+class TTLCache:
+    """Small thread-safe key/value cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, ttl, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value for ``key``, or None if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        """Store ``value`` under ``key`` for the configured TTL"""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Drop expired entries first, then the oldest if still full
+                for stale in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                    del self._entries[stale]
+                if len(self._entries) >= self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+            self._entries[key] = (now + self.ttl, value)
+
+    def clear(self):
+        """Drop every entry, e.g. after a write changes the underlying data"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "ttl_seconds": self.ttl,
+            }
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useMemo, useCallback } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import { 
   Container, Typography, Paper, Box,
   Table, TableBody, TableCell, TableContainer, 
@@ -32,14 +32,33 @@ interface DailyCount {
   finishCount: number;
 }
 
-// Interface for the server response format
-interface ShirtOrdersResponse {
-  orders: ShirtOrder[];
+// Interface for the server response formats
+interface OrdersByDayResponse {
+  days: DailyCount[];
+  message?: string;
+  success: boolean;
+}
+
+interface UpcomingDueResponse {
+  orders: Array<{
+    id: number;
+    姓名: string;
+    电话?: string;
+    到店交付日期?: string;
+  }>;
   count: number;
   message?: string;
   success: boolean;
 }
 
+// Fields shown in the upcoming-due table
+interface DueOrder {
+  id: number;
+  customer_name: string;
+  phone?: string;
+  planned_date?: string;
+}
+
 // Helper to format date as YYYY-MM-DD
 const formatDate = (date: Date): string => {
   const year = date.getFullYear();
@@ -48,45 +67,100 @@ const formatDate = (date: Date): string => {
   return `${year}-${month}-${day}`;
 };
 
+// 快到期订单: 计划交期在7天内 (only used for the offline sample data;
+// live data is filtered by /api/analytics/upcoming-due)
+const filterUpcomingDue = (orders: ShirtOrder[]): DueOrder[] => {
+  const today = new Date();
+  return orders.filter(order => {
+    if (!order.planned_date) return false;
+    
+    const plannedDate = new Date(order.planned_date);
+    const diffTime = plannedDate.getTime() - today.getTime();
+    const diffDays = Math.ceil(diffTime / (1000 * 60 * 60 * 24));
+    
+    return diffDays >= 0 && diffDays <= 7; // Due within next 7 days
+  });
+};
+
+// 历史订单: 按日期的录入数量和完成数量 (only used for the offline sample data;
+// live data is aggregated by /api/analytics/orders-by-day)
+const summarizeByDay = (orders: ShirtOrder[]): DailyCount[] => {
+  // Get date range for last 30 days
+  const endDate = new Date();
+  const startDate = new Date();
+  startDate.setDate(endDate.getDate() - 30);
+  
+  // Create a map to store counts by date
+  const dayMap = new Map<string, {inputCount: number, finishCount: number}>();
+  
+  // Initialize all days with zero count
+  const currentDate = new Date(startDate);
+  while (currentDate <= endDate) {
+    dayMap.set(formatDate(currentDate), {inputCount: 0, finishCount: 0});
+    currentDate.setDate(currentDate.getDate() + 1);
+  }
+  
+  orders.forEach(order => {
+    if (order.input_date) {
+      const dateStr = order.input_date.split('T')[0]; // Handle ISO format
+      const current = dayMap.get(dateStr);
+      if (current) {
+        dayMap.set(dateStr, {...current, inputCount: current.inputCount + 1});
+      }
+    }
+    
+    if (order.finish_date) {
+      const dateStr = order.finish_date.split('T')[0]; // Handle ISO format
+      const current = dayMap.get(dateStr);
+      if (current) {
+        dayMap.set(dateStr, {...current, finishCount: current.finishCount + 1});
+      }
+    }
+  });
+  
+  // Convert map to array of objects for charting
+  return Array.from(dayMap).map(([date, counts]) => ({ 
+    date, 
+    inputCount: counts.inputCount,
+    finishCount: counts.finishCount
+  })).sort((a, b) => a.date.localeCompare(b.date));
+};
+
 const Analytics: React.FC = () => {
   const { t } = useTranslation();
-  const [orders, setOrders] = useState<ShirtOrder[]>([]);
+  const [ordersByDay, setOrdersByDay] = useState<DailyCount[]>([]);
+  const [upcomingDueOrders, setUpcomingDueOrders] = useState<DueOrder[]>([]);
   const [loading, setLoading] = useState<boolean>(true);
   const [error, setError] = useState<string | null>(null);
-  
-  // Use window.location.origin for API requests
-  const origin = window.location.origin;
 
   // Fetch data on component mount
   useEffect(() => {
-    fetchOrders();
+    fetchAnalytics();
   }, []);
 
-  const fetchOrders = useCallback(async () => {
+  const fetchAnalytics = useCallback(async () => {
     try {
       setLoading(true);
       
-      // Use relative API path
-      try {
-        console.log(`Attempting to fetch shirt orders from /api/shirt-orders`);
-        const response = await axios.get<ShirtOrdersResponse>(`/api/shirt-orders`, { 
-          timeout: 8000,
-          headers: {
-            'Cache-Control': 'no-cache',
-            'Pragma': 'no-cache'
-          }
-        });
-        
-        handleSuccessfulResponse(response);
-      } catch (error) {
-        console.error('Error fetching shirt orders:', error);
-          throw error;
-      }
+      // The server aggregates in SQL, so only the small result sets are
+      // transferred no matter how many orders exist
+      const requestConfig = {
+        timeout: 8000,
+        headers: {
+          'Cache-Control': 'no-cache',
+          'Pragma': 'no-cache'
+        }
+      };
+      const [byDayResponse, upcomingResponse] = await Promise.all([
+        axios.get<OrdersByDayResponse>(`/api/analytics/orders-by-day`, { ...requestConfig, params: { days: 30 } }),
+        axios.get<UpcomingDueResponse>(`/api/analytics/upcoming-due`, { ...requestConfig, params: { days: 7 } })
+      ]);
+      
+      handleSuccessfulResponse(byDayResponse.data, upcomingResponse.data);
     } catch (error: any) {
-      console.error('Error fetching shirt orders:', error);
+      console.error('Error fetching analytics:', error);
       // Create sample data for testing when API fails
-      const sampleData: ShirtOrder[] = generateSampleData();
-      setOrders(sampleData);
+      showSampleData();
       
       if (error.message) {
         setError(t('analytics.fetchError', { error: error.message }));
@@ -98,36 +172,45 @@ const Analytics: React.FC = () => {
     }
   }, [t]);
 
-  const handleSuccessfulResponse = (response: any) => {
-    console.log('Shirt orders data received:', response.data);
-    
-    if (!response.data || !response.data.success) {
-      console.log('No shirt orders found or API returned an error');
+  const handleSuccessfulResponse = (byDay: OrdersByDayResponse, upcoming: UpcomingDueResponse) => {
+    const failed = [byDay, upcoming].find(response => !response || !response.success);
+    if (failed) {
+      console.log('Analytics API returned an error');
       
-      if (response.data?.message) {
-        setError(t('analytics.apiError', { message: response.data.message }));
+      if (failed?.message) {
+        setError(t('analytics.apiError', { message: failed.message }));
       } else {
         setError(t('analytics.invalidDataFormat'));
       }
       
       // Use sample data for testing
-      const sampleData: ShirtOrder[] = generateSampleData();
-      setOrders(sampleData);
+      showSampleData();
       return;
     }
     
-    const orders = response.data.orders || [];
-    console.log('Number of shirt orders received:', orders.length);
+    const days = byDay.days || [];
+    const dueOrders = (upcoming.orders || []).map(order => ({
+      id: order.id,
+      customer_name: order.姓名,
+      phone: order.电话,
+      planned_date: order.到店交付日期
+    }));
     
-    if (orders.length === 0) {
+    const hasActivity = days.some(day => day.inputCount > 0 || day.finishCount > 0);
+    if (!hasActivity && dueOrders.length === 0) {
       setError(t('analytics.noOrdersFound'));
-      setOrders([]);
-      return;
+    } else {
+      // Successfully got analytics data
+      setError(null);
     }
-    
-    // Successfully got order data
-    setError(null);
-    setOrders(orders);
+    setOrdersByDay(days);
+    setUpcomingDueOrders(dueOrders);
+  };
+
+  const showSampleData = () => {
+    const sampleData = generateSampleData();
+    setOrdersByDay(summarizeByDay(sampleData));
+    setUpcomingDueOrders(filterUpcomingDue(sampleData));
   };
 
   // Generate sample data for testing when API fails
@@ -186,82 +269,6 @@ const Analytics: React.FC = () => {
     return result;
   };
 
-  // 快到期订单: 计划交期在7天内
-  const upcomingDueOrders = useMemo(() => {
-    const today = new Date();
-    return orders.filter(order => {
-      if (!order.planned_date) return false;
-      
-      const plannedDate = new Date(order.planned_date);
-      const diffTime = plannedDate.getTime() - today.getTime();
-      const diffDays = Math.ceil(diffTime / (1000 * 60 * 60 * 24));
-      
-      return diffDays >= 0 && diffDays <= 7; // Due within next 7 days
-    });
-  }, [orders]);
-
-  // 历史订单: 按日期的录入数量和完成数量
-  const ordersByDay = useMemo(() => {
-    if (orders.length === 0) {
-      console.log('No orders available for ordersByDay calculation');
-      return [];
-    }
-    
-    console.log(`Calculating ordersByDay from ${orders.length} orders`);
-    
-    // Get date range for last 30 days
-    const endDate = new Date();
-    const startDate = new Date();
-    startDate.setDate(endDate.getDate() - 30);
-    
-    console.log(`Date range: ${formatDate(startDate)} to ${formatDate(endDate)}`);
-    
-    // Create a map to store counts by date
-    const dayMap = new Map<string, {inputCount: number, finishCount: number}>();
-    
-    // Initialize all days with zero count
-    const currentDate = new Date(startDate);
-    while (currentDate <= endDate) {
-      const dateStr = formatDate(currentDate);
-      dayMap.set(dateStr, {inputCount: 0, finishCount: 0});
-      currentDate.setDate(currentDate.getDate() + 1);
-    }
-    
-    // Count input orders per day
-    orders.forEach(order => {
-      // Process input dates
-      if (order.input_date) {
-        // Handle various date formats
-        const dateStr = order.input_date.split('T')[0]; // Handle ISO format
-        
-        if (dayMap.has(dateStr)) {
-          const current = dayMap.get(dateStr)!;
-          dayMap.set(dateStr, {...current, inputCount: current.inputCount + 1});
-          console.log(`Counted input date: ${dateStr}`);
-        }
-      }
-      
-      // Process finish dates
-      if (order.finish_date) {
-        // Handle various date formats
-        const dateStr = order.finish_date.split('T')[0]; // Handle ISO format
-        
-        if (dayMap.has(dateStr)) {
-          const current = dayMap.get(dateStr)!;
-          dayMap.set(dateStr, {...current, finishCount: current.finishCount + 1});
-          console.log(`Counted finish date: ${dateStr}`);
-        }
-      }
-    });
-    
-    // Convert map to array of objects for charting
-    return Array.from(dayMap).map(([date, counts]) => ({ 
-      date, 
-      inputCount: counts.inputCount,
-      finishCount: counts.finishCount
-    })).sort((a, b) => a.date.localeCompare(b.date));
-  }, [orders]);
-
   if (loading) {
     return (
       <Container sx={{ display: 'flex', justifyContent: 'center', alignItems: 'center', height: '50vh' }}>
@@ -14,6 +14,7 @@ import { DownOutlined, SettingOutlined, CopyOutlined, TableOutlined } from '@ant
 import { useTranslation } from 'react-i18next';
 import { generateAndDownloadTable } from '../../utils/tableGenerator';
 import { generateDynamicText, DEFAULT_CONFIG } from '../../utils/textGenerator';
+import { decodeColumnar, ColumnarPayload } from '../../utils/columnar';
 
 // Updated for Production schema
 interface ShirtOrder {
@@ -127,10 +128,13 @@ interface ColumnType {
 
 // Interface for the server response format
 interface ShirtOrdersResponse {
-  orders: ShirtOrder[];
+  orders?: ShirtOrder[];
+  columnar?: ColumnarPayload;  // Present instead of orders when requested with format=columnar
   count: number;
   message?: string;
   success: boolean;
+  sync_token?: string;  // Pass back as ?since= to fetch only later changes
+  deleted?: number[];   // Ids deleted since the token (incremental responses only)
 }
 
 const OrderViewPage: React.FC = () => {
@@ -141,6 +145,7 @@ const OrderViewPage: React.FC = () => {
   const [editedRows, setEditedRows] = useState<Record<number, ShirtOrder>>({});
   const [deletedRows, setDeletedRows] = useState<number[]>([]);
   const [newRows, setNewRows] = useState<ShirtOrder[]>([]);
+  const syncTokenRef = useRef<string | null>(null);
   
   const [visibleColumns, setVisibleColumns] = useState<string[]>([
     // Customer info - Section 1
@@ -230,6 +235,7 @@ const OrderViewPage: React.FC = () => {
         console.log(`Attempting to fetch shirt orders from /api/shirt-orders`);
         const response = await axios.get<ShirtOrdersResponse>(`/api/shirt-orders`, { 
           timeout: 8000,
+          params: { format: 'columnar' },
           headers: {
             'Cache-Control': 'no-cache',
             'Pragma': 'no-cache'
@@ -431,7 +437,10 @@ const OrderViewPage: React.FC = () => {
       return;
     }
     
-    const orders = response.data.orders || [];
+    syncTokenRef.current = response.data.sync_token ?? null;
+    const orders = response.data.columnar
+      ? decodeColumnar(response.data.columnar)
+      : response.data.orders || [];
     console.log('Number of shirt orders received:', orders.length);
     
     if (orders.length === 0) {
@@ -457,6 +466,58 @@ const OrderViewPage: React.FC = () => {
     setData(processedData);
   };
 
+  // Pull only the rows changed since the last sync and merge them into the
+  // grid; falls back to a full reload when there is no sync token yet.
+  // ``persistedIds`` are the temporary (negative) ids of unsaved rows the
+  // server just stored - they come back as changed rows with real ids
+  const fetchChanges = async (persistedIds: number[] = []) => {
+    const since = syncTokenRef.current;
+    if (!since) {
+      fetchOrders();
+      return;
+    }
+    
+    try {
+      const response = await axios.get<ShirtOrdersResponse>(`/api/shirt-orders`, {
+        timeout: 8000,
+        params: { since, format: 'columnar' },
+        headers: {
+          'Cache-Control': 'no-cache',
+          'Pragma': 'no-cache'
+        }
+      });
+      if (!response.data?.success) {
+        throw new Error(response.data?.message || t('general.noData'));
+      }
+      
+      const orders = response.data.columnar
+        ? decodeColumnar(response.data.columnar)
+        : response.data.orders || [];
+      const changed = new Map<number, ShirtOrder>();
+      orders.forEach((order: any, index: number) => {
+        const mappedOrder = mapFromBackendFields(order);
+        changed.set(mappedOrder.id, {
+          ...mappedOrder,
+          key: `${mappedOrder.id || 0}-${Date.now()}-${index}-${Math.random().toString(36).substring(2, 7)}`
+        });
+      });
+      const deleted = new Set<number>(response.data.deleted || []);
+      const persisted = new Set<number>(persistedIds);
+      
+      setData(prev => {
+        // Rows added while the save was in flight keep their temporary ids
+        const kept = prev.filter(order => !deleted.has(order.id) && !persisted.has(order.id));
+        const keptIds = new Set(kept.map(order => order.id));
+        const added = Array.from(changed.values()).filter(order => !keptIds.has(order.id));
+        return [...kept.map(order => changed.get(order.id) ?? order), ...added];
+      });
+      syncTokenRef.current = response.data.sync_token ?? since;
+    } catch (error) {
+      console.error('Error fetching order changes, reloading all orders:', error);
+      fetchOrders();
+    }
+  };
+
   const handleAdd = (record: ShirtOrder) => {
     const newId = -Math.floor(Math.random() * 1000000) - 1; // Negative ID to avoid conflicts with server IDs
     const newKey = `new-${Date.now()}-${Math.random().toString(36).substring(2, 9)}`;
@@ -728,8 +789,9 @@ const OrderViewPage: React.FC = () => {
         });
       
       // Get new orders that haven't been saved yet - map field names
-      const newOrders = currentData
-        .filter(order => order.source === 'web' && (order.id < 0 || !order.id)) // Include orders with negative IDs or no ID
+      const unsavedOrders = currentData
+        .filter(order => order.source === 'web' && (order.id < 0 || !order.id)); // Include orders with negative IDs or no ID
+      const newOrders = unsavedOrders
         .map(order => {
           return mapToBackendFields(order);
         });
@@ -781,8 +843,8 @@ const OrderViewPage: React.FC = () => {
             setEditedRows({});
             setDeletedRows([]);
             setNewRows([]);
-            // Refresh data from server
-            fetchOrders();
+            // Refresh only the rows that changed on the server
+            fetchChanges(unsavedOrders.map(order => order.id));
             break; // Successfully got a response, exit the loop
           } else {
             throw new Error(response?.data?.message || t('general.saveError'));
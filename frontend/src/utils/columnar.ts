@@ -0,0 +1,62 @@
+// Decoder for the columnar order-list format (GET /api/shirt-orders?format=columnar).
+// See backend/columnar.py for the encoding.
+
+export interface ColumnarColumn {
+  values?: any[];
+  dict?: any[];
+  codes?: number[];
+  null_runs?: number[];
+  null_bitmap?: string;
+}
+
+export interface ColumnarPayload {
+  columns: string[];
+  length: number;
+  data: ColumnarColumn[];
+}
+
+const nullMask = (column: ColumnarColumn, length: number): Uint8Array | null => {
+  if (column.null_runs) {
+    const mask = new Uint8Array(length);
+    const runs = column.null_runs;
+    for (let i = 0; i < runs.length; i += 2) {
+      mask.fill(1, runs[i], runs[i] + runs[i + 1]);
+    }
+    return mask;
+  }
+  if (column.null_bitmap) {
+    const bytes = atob(column.null_bitmap);
+    const mask = new Uint8Array(length);
+    for (let i = 0; i < length; i++) {
+      mask[i] = (bytes.charCodeAt(i >> 3) >> (i & 7)) & 1;
+    }
+    return mask;
+  }
+  return null;
+};
+
+// Expand a columnar payload into row objects keyed by column name
+export const decodeColumnar = (payload: ColumnarPayload): Record<string, any>[] => {
+  const { columns, length, data } = payload;
+  const rows: Record<string, any>[] = new Array(length);
+  for (let i = 0; i < length; i++) {
+    rows[i] = {};
+  }
+
+  columns.forEach((name, c) => {
+    const column = data[c];
+    const mask = nullMask(column, length);
+    const dict = column.dict;
+    const source = dict ? column.codes || [] : column.values || [];
+    let next = 0;
+    for (let i = 0; i < length; i++) {
+      if (mask && mask[i]) {
+        rows[i][name] = null;
+      } else {
+        const value = source[next++];
+        rows[i][name] = dict ? dict[value] : value;
+      }
+    }
+  });
+  return rows;
+};